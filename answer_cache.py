@@ -0,0 +1,210 @@
+"""
+Shared cache of chatbot answers to general (no market data) questions.
+
+Financial-literacy questions repeat across users with small variations in
+wording ("What is PPF?", "what's ppf", "Explain PPF please"). Queries are
+normalized for an exact lookup first. Failing that, near-duplicates are
+found by cosine similarity of character n-gram vectors over the content
+words, so typos, filler and reordered phrasing still match. A similarity
+match is only accepted when the two questions share the same content words
+(allowing a typo in longer words), so "What is PPF?" never answers
+"What is EPF?".
+
+Only answers that needed no live market data are stored, and follow-up
+questions that lean on earlier turns ("explain that again") are never
+cached. Entries expire after a TTL and the least recently used are
+evicted beyond the entry cap.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from symbols import edit_distance
+
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 24 * 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 2000))
+ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', 0.5))  # minimum cosine; content words must also agree
+
+_CONTRACTIONS = {"what's": 'what is', "how's": 'how is', "it's": 'it is', "i'm": 'i am', "whats": 'what is'}
+_FILLER = {'please', 'pls', 'plz', 'kindly', 'hey', 'hi', 'hello', 'thanks', 'thank', 'you', 'can', 'could',
+           'would', 'me', 'tell', 'explain', 'describe', 'briefly', 'simple', 'simply', 'terms'}
+_STOPWORDS = {'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'what', 'how', 'why', 'when', 'which', 'who',
+              'do', 'does', 'did', 'of', 'in', 'on', 'for', 'to', 'and', 'or', 'i', 'my', 'about', 'with', 'by',
+              'should', 'much', 'many', 'there', 'any', 'some', 'its', 'as', 'at', 'from', 'into', 'work', 'works',
+              'mean', 'means', 'meaning', 'definition', 'define'}
+# Words that point back at earlier turns; such questions depend on the conversation
+_FOLLOW_UP = {'it', 'this', 'that', 'these', 'those', 'them', 'they', 'he', 'she', 'above', 'previous',
+              'earlier', 'again', 'more', 'elaborate', 'continue', 'same', 'last', 'your', 'yes', 'no', 'ok', 'okay'}
+
+_vectorizer = HashingVectorizer(analyzer='char_wb', ngram_range=(3, 5), n_features=2 ** 18,
+                                alternate_sign=False, norm='l2')
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, accents and punctuation stripped, contractions expanded, spaces collapsed"""
+    text = unicodedata.normalize('NFKD', str(query)).encode('ascii', 'ignore').decode().lower()
+    text = text.replace('’', "'")
+    for contraction, expanded in _CONTRACTIONS.items():
+        text = re.sub(rf"\b{re.escape(contraction)}", expanded, text)
+    return ' '.join(re.sub(r"[^a-z0-9]+", ' ', text).split())
+
+
+def content_terms(normalized: str) -> Set[str]:
+    """Words that carry the question's meaning, with a plural 's' dropped"""
+    terms = set()
+    for word in normalized.split():
+        if word in _STOPWORDS or word in _FILLER:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.add(word)
+    return terms
+
+
+def _term_vector(terms: Set[str]):
+    """Character n-gram vector of the content words, so filler wording does not dilute similarity"""
+    return _vectorizer.transform([' '.join(sorted(terms))])
+
+
+def _typo_of(word: str, others: Set[str]) -> bool:
+    """A long word within one or two edits of some word in others; short words must match exactly"""
+    if len(word) <= 4:
+        return False
+    limit = 1 if len(word) < 8 else 2
+    return any(edit_distance(word, other, limit=limit) <= limit for other in others if len(other) > 4)
+
+
+def same_terms(a: Set[str], b: Set[str]) -> bool:
+    """Every content word of each question appears in the other, up to typos"""
+    return all(w in b or _typo_of(w, b) for w in a) and all(w in a or _typo_of(w, a) for w in b)
+
+
+class AnswerCache:
+    """
+    Thread-safe TTL + LRU cache of answers keyed by normalized question,
+    with a similarity lookup for near-duplicate wording.
+    """
+
+    def __init__(self, ttl: int = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = OrderedDict()  # normalized query -> (answer, expires_at, terms, vector)
+        self._matrix = None  # rows of entry vectors, rebuilt after inserts and removals
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def cacheable(self, query: str) -> bool:
+        """Whether a query stands on its own; follow-ups and one-word queries are never cached"""
+        normalized = normalize_query(query)
+        words = set(normalized.split())
+        ok = bool(content_terms(normalized)) and len(words) >= 2 and not words & _FOLLOW_UP
+        if not ok:
+            with self._lock:
+                self.bypassed += 1
+        return ok
+
+    def bypass(self) -> None:
+        """Count a query skipped because it needs live market data"""
+        with self._lock:
+            self.bypassed += 1
+
+    def get(self, query: str) -> Optional[str]:
+        """The cached answer for this question or a near-duplicate of it, or None"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            match = self._most_similar(key)
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.similar_hits += 1
+                return self._entries[match][0]
+            self.misses += 1
+            return None
+
+    def _most_similar(self, key: str) -> Optional[str]:
+        if not self._entries:
+            return None
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = sp.vstack([self._entries[k][3] for k in self._matrix_keys]).tocsr()
+        terms = content_terms(key)
+        # Rows and the query are L2-normalized, so the dot product is the cosine
+        scores = (self._matrix @ _term_vector(terms).T).toarray().ravel()
+        for i in np.argsort(-scores)[:5]:
+            if scores[i] < self.similarity:
+                break
+            candidate = self._matrix_keys[i]
+            if same_terms(terms, self._entries[candidate][2]):
+                return candidate
+        return None
+
+    def set(self, query: str, answer: str) -> None:
+        if not answer:
+            return
+        key = normalize_query(query)
+        terms = content_terms(key)
+        vector = _term_vector(terms)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (answer, time.time() + self.ttl, terms, vector)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, entry in self._entries.items() if entry[1] <= now]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self.expirations += len(expired)
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# Global instance
+answer_cache = AnswerCache()
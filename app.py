@@ -1,6 +1,6 @@
 from flask import Flask, request, render_template, flash, redirect, url_for, Response, send_from_directory, jsonify, session
 from google.oauth2 import id_token  # Import id_token for Google OAuth2
-import os, uuid, time
+import os, uuid, time, hmac
 from functools import wraps
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 import re
@@ -13,8 +13,9 @@ from subjective import SubjectiveTest
 # import cv2
 # import mediapipe as mp
 import numpy as np
-from collections import Counter
+from collections import Counter, deque
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import random
 import shutil
 from datetime import datetime
@@ -42,7 +43,21 @@ load_dotenv()
 
 from google import genai
 from google.genai import types
-from market_data_fallback import get_fallback_quote, get_fallback_trending, get_fallback_historical
+from market_data_fallback import FALLBACK_PERIOD_CONFIG, MAX_BULK_SYMBOLS, get_fallback_quote, get_fallback_trending, get_fallback_historical, get_cache_stats, get_refresher_stats, fetch_indian_api, market_data_generator, simulate_market
+from candles import ohlcv_to_candles, to_columnar, downsample_lttb, downsample_ohlc
+from market_data import get_bulk_market_data_endpoint
+from movers import market_movers
+from symbols import symbol_index
+from intent_router import intent_classifier
+from answer_cache import answer_cache
+from conversation_store import conversation_store
+from upstream import http_client, upstream_flight, upstream_breakers
+from quote_stream import quote_hub
+from replay import replay_manager
+from order_book import order_engine, OrderError, RestingBook
+from backtest import run_backtest, BacktestError
+from indicators import compute_indicators, select_indicators, indicators_to_json, indicator_tracker
+from portfolio import revalue_positions, SIM_STARTING_CASH
 
 # import firebase_admin
 # from firebase_admin import credentials, auth
@@ -159,21 +174,17 @@ def call_indian_api(endpoint, params=None):
     Returns:
         JSON response from the API or fallback data
     """
-    url = f"{INDIAN_API_BASE_URL}{endpoint}"
-    headers = {"X-Api-Key": INDIAN_API_KEY}
-    
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(f"API returned status code: {response.status_code}")
+        # Shares the market data cache, and concurrent identical requests
+        # wait on a single upstream call instead of each hitting the API
+        return fetch_indian_api(endpoint, params)
     except Exception as e:
         print(f"API call failed: {e}, using fallback data")
         
         # Use fallback data based on endpoint
         if endpoint == '/stock' and params and 'name' in params:
-            return get_fallback_quote(params['name'])
+            # fetch_indian_api already counted this lookup
+            return get_fallback_quote(params['name'], count_access=False)
         elif endpoint == '/trending':
             return get_fallback_trending()
         elif endpoint == '/historical_data' and params and 'stock_name' in params:
@@ -318,15 +329,234 @@ def orchestrator(query):
             except json.JSONDecodeError as json_error:
                 print(f"Error parsing JSON from orchestrator: {json_error}")
                 print(f"Raw response: {decision_text}")
-                return {"needs_api": False}
+                return {"needs_api": False, "fallback": True}
         
         except Exception as model_error:
             print(f"Error in orchestrator model call: {model_error}")
-            return {"needs_api": False}
+            return {"needs_api": False, "fallback": True}
     
     except Exception as e:
         print(f"Error in orchestrator: {e}")
-        return {"needs_api": False}
+        return {"needs_api": False, "fallback": True}
+
+def llm_decision(query):
+    """
+    Ask the LLM orchestrator for a routing decision and log successful
+    decisions so the local intent classifier learns from them.
+    """
+    decision = orchestrator(query)
+    if not decision.get("fallback"):
+        intent_classifier.record(query, decision)
+    return decision
+
+def market_context(decision, prefetched=None):
+    """
+    Fetch the market data a routing decision asks for and phrase it as context for the model.
+    prefetched maps resolved symbols to futures of speculative get_stock_details calls.
+    """
+    api_context = ""
+    if not decision.get("needs_api", False):
+        return api_context
+    function_name = decision.get("function", "")
+    params = decision.get("params", {})
+
+    if function_name in API_ENDPOINTS and params.get('stock_name'):
+        # Names the master knows become tickers; a name known not to exist never reaches the API
+        symbol = symbol_index.canonical(params['stock_name'])
+        if symbol:
+            params = dict(params, stock_name=symbol)
+        else:
+            suggestions = symbol_index.suggestions(params['stock_name'])
+            api_context = f"\nNo listed stock matches '{params['stock_name']}'."
+            if suggestions:
+                api_context += f" Did the user mean one of: {', '.join(suggestions)}?"
+            function_name = None
+
+    if function_name in API_ENDPOINTS:
+        try:
+            if function_name == 'get_stock_details' and params['stock_name'] in (prefetched or {}):
+                ASK_STATS['prefetch_used'] += 1
+                api_result = prefetched[params['stock_name']].result()
+            else:
+                api_result = call_api_by_name(function_name, **params)
+            if "error" in api_result:
+                api_context = f"\nI attempted to fetch market data but encountered an error: {api_result['error']}"
+            else:
+                api_context = f"\nHere is the real-time market data from the Indian Stock Market API:\n{json.dumps(api_result, indent=2)}\n\nPlease use this data to provide an informative response to the user's query."
+        except Exception as api_error:
+            api_context = f"\nI attempted to fetch market data but encountered an error: {str(api_error)}"
+    return api_context
+
+def answer_request(user_query, conversation_history="", api_context=""):
+    """Contents and generation config for the final Gemini answer"""
+    # Prepare the user query with API context if available
+    query_with_context = user_query
+    if api_context:
+        query_with_context = f"{user_query}\n\n[SYSTEM NOTE: {api_context}]"
+    
+    # Prepare the system message
+    system_message = SYSTEM_PROMPT
+    if conversation_history:
+        system_message += f"\n\nPrevious conversation:\n{conversation_history}"
+    
+    # Create content for the LLM
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=system_message)
+            ],
+        ),
+        types.Content(
+            role="model",
+            parts=[
+                types.Part.from_text(text="I understand my role as FinBuddy, a financial assistant for Indian users. I'll provide helpful information about investing and financial planning in simple language.")
+            ],
+        ),
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=query_with_context)
+            ],
+        ),
+    ]
+    
+    # Configure generation parameters
+    generate_content_config = types.GenerateContentConfig(
+        temperature=0.7,
+        top_p=0.95,
+        top_k=40,
+        max_output_tokens=8192,
+        response_mime_type="text/plain",
+    )
+    return contents, generate_content_config
+
+MODEL_ERROR_MESSAGES = {
+    'rate_limit': "I'm sorry, we've hit the rate limit for our AI service. Please try again in a moment.",
+    'quota': "I'm sorry, we've exceeded our quota for the AI service. Please try again later.",
+    'auth': "I'm sorry, there's an authentication issue with our AI service. Please contact support.",
+    'other': "I apologize, but I encountered an error while generating a response. Please try again later.",
+}
+
+def model_error_message(model_error):
+    """User-facing message for a failed Gemini generation"""
+    print(f"Error generating content: {model_error}")
+    # Check for specific error types
+    error_message = str(model_error).lower()
+    if "rate limit" in error_message:
+        return MODEL_ERROR_MESSAGES['rate_limit']
+    elif "quota" in error_message:
+        return MODEL_ERROR_MESSAGES['quota']
+    elif "permission" in error_message or "credential" in error_message:
+        return MODEL_ERROR_MESSAGES['auth']
+    else:
+        return MODEL_ERROR_MESSAGES['other']
+
+def generate_answer(user_query, conversation_history="", api_context=""):
+    """Generate the final answer with Gemini, given any market data context"""
+    contents, generate_content_config = answer_request(user_query, conversation_history, api_context)
+    
+    # Generate the response
+    try:
+        response = client.models.generate_content(
+            model="gemini-1.5-flash",
+            contents=contents[0] if contents else [],
+            config=generate_content_config,
+        )
+        return response.text if response.text else ""
+    except Exception as model_error:
+        return model_error_message(model_error)
+
+def generate_answer_stream(user_query, conversation_history="", api_context=""):
+    """Yield the final Gemini answer in chunks as the model produces them"""
+    contents, generate_content_config = answer_request(user_query, conversation_history, api_context)
+    started = False
+    try:
+        for chunk in client.models.generate_content_stream(
+            model="gemini-1.5-flash",
+            contents=contents[0] if contents else [],
+            config=generate_content_config,
+        ):
+            if chunk.text:
+                started = True
+                yield chunk.text
+    except Exception as model_error:
+        message = model_error_message(model_error)
+        # Mid-stream failures keep the partial answer and append the notice
+        yield f"\n\n{message}" if started else message
+
+# Speculative /ask: when the orchestrator LLM has to decide, run it alongside
+# a market-data prefetch for stocks named in the query and, optionally, a
+# draft answer without market context, then keep what the decision confirms.
+# A draft is a full generation that is wasted whenever the query needs market
+# data, so it is off by default and, when enabled, only started for queries
+# the local classifier already leans towards answering without the API.
+ASK_SPECULATIVE = os.environ.get('ASK_SPECULATIVE', '1') == '1'
+ASK_SPECULATIVE_DRAFT = os.environ.get('ASK_SPECULATIVE_DRAFT', '0') == '1'
+ASK_PREFETCH_SYMBOLS = 3
+# Request threads per gunicorn worker (start.sh passes the same value to --threads).
+# A speculative query submits at most 2 + ASK_PREFETCH_SYMBOLS tasks and its request
+# thread blocks on them, so the pool is bounded by the request threads: one pool
+# thread per request thread by default. Queries beyond that queue for a pool thread
+# instead of growing the worker past 2 * GUNICORN_THREADS threads.
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 32))
+ask_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('ASK_SPECULATIVE_WORKERS', GUNICORN_THREADS)),
+                              thread_name_prefix='ask-speculative')
+ASK_STATS = {'cached': 0, 'local': 0, 'sequential': 0, 'speculative': 0, 'draft_used': 0, 'draft_discarded': 0,
+             'prefetched': 0, 'prefetch_used': 0}
+
+def prefetch_market_data(user_query):
+    """Start get_stock_details calls for stocks named in the query; returns {symbol: future}"""
+    prefetched = {
+        symbol: ask_pool.submit(call_api_by_name, 'get_stock_details', stock_name=symbol)
+        for symbol in symbol_index.find_in_text(user_query)[:ASK_PREFETCH_SYMBOLS]
+    }
+    ASK_STATS['prefetched'] += len(prefetched)
+    return prefetched
+
+def speculative_response(user_query, conversation_history=""):
+    """
+    Answer a query the local classifier could not route, overlapping the
+    orchestrator call with the work its decision might need. Latency is
+    about max(orchestrator, prefetch, draft) plus a generation only when
+    market data turns out to be needed.
+    """
+    ASK_STATS['speculative'] += 1
+    decision_future = ask_pool.submit(llm_decision, user_query)
+    prefetched = prefetch_market_data(user_query)
+    draft_future = None
+    if ASK_SPECULATIVE_DRAFT and intent_classifier.leans_no_api(user_query):
+        draft_future = ask_pool.submit(generate_answer, user_query, conversation_history)
+
+    decision = decision_future.result()
+    if not decision.get("needs_api", False):
+        if draft_future is not None:
+            ASK_STATS['draft_used'] += 1
+            return draft_future.result(), decision
+        return generate_answer(user_query, conversation_history), decision
+
+    if draft_future is not None:
+        # Market data changes the answer; the draft is dropped. cancel() only stops a
+        # draft still queued; one already generating runs to completion and is discarded
+        draft_future.cancel()
+        ASK_STATS['draft_discarded'] += 1
+    return generate_answer(user_query, conversation_history, market_context(decision, prefetched)), decision
+
+def answer_cacheable(user_query, decision):
+    """Whether the answer cache may serve this query; anything needing live market data bypasses it"""
+    if decision is not None and decision.get("needs_api", False):
+        answer_cache.bypass()
+        return False
+    return answer_cache.cacheable(user_query)
+
+def remember_answer(user_query, decision, response):
+    """Cache an answer that used no live market data and is not an error notice"""
+    if decision.get("needs_api", False):
+        answer_cache.bypass()
+        return
+    if decision.get("fallback") or response in MODEL_ERROR_MESSAGES.values():
+        return
+    answer_cache.set(user_query, response)
 
 def get_gemini_response(user_query, conversation_history=""):
     """
@@ -341,88 +571,31 @@ def get_gemini_response(user_query, conversation_history=""):
     """
     
     try:
-        # Check if the Gemini API key is set
-            
-        # First, use the orchestrator to determine if we need to call an API
-        decision = orchestrator(user_query)
-        
-        # If we need to call an API, do so and add the result to the context
-        api_context = ""
-        if decision.get("needs_api", False):
-            function_name = decision.get("function", "")
-            params = decision.get("params", {})
-            
-            if function_name in API_ENDPOINTS:
-                try:
-                    api_result = call_api_by_name(function_name, **params)
-                    if "error" in api_result:
-                        api_context = f"\nI attempted to fetch market data but encountered an error: {api_result['error']}"
-                    else:
-                        api_context = f"\nHere is the real-time market data from the Indian Stock Market API:\n{json.dumps(api_result, indent=2)}\n\nPlease use this data to provide an informative response to the user's query."
-                except Exception as api_error:
-                    api_context = f"\nI attempted to fetch market data but encountered an error: {str(api_error)}"
-        
-        # Prepare the user query with API context if available
-        query_with_context = user_query
-        if api_context:
-            query_with_context = f"{user_query}\n\n[SYSTEM NOTE: {api_context}]"
-        
-        # Prepare the system message
-        system_message = SYSTEM_PROMPT
-        if conversation_history:
-            system_message += f"\n\nPrevious conversation:\n{conversation_history}"
-        
-        # Create content for the LLM
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_text(text=system_message)
-                ],
-            ),
-            types.Content(
-                role="model",
-                parts=[
-                    types.Part.from_text(text="I understand my role as FinBuddy, a financial assistant for Indian users. I'll provide helpful information about investing and financial planning in simple language.")
-                ],
-            ),
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_text(text=query_with_context)
-                ],
-            ),
-        ]
-        
-        # Configure generation parameters
-        generate_content_config = types.GenerateContentConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=8192,
-            response_mime_type="text/plain",
-        )
-        
-        # Generate the response
-        try:
-            response = client.models.generate_content(
-                model="gemini-1.5-flash",
-                contents=contents[0] if contents else [],
-                config=generate_content_config,
-            )
-            return response.text if response.text else ""
-        except Exception as model_error:
-            print(f"Error generating content: {model_error}")
-            # Check for specific error types
-            error_message = str(model_error).lower()
-            if "rate limit" in error_message:
-                return "I'm sorry, we've hit the rate limit for our AI service. Please try again in a moment."
-            elif "quota" in error_message:
-                return "I'm sorry, we've exceeded our quota for the AI service. Please try again later."
-            elif "permission" in error_message or "credential" in error_message:
-                return "I'm sorry, there's an authentication issue with our AI service. Please contact support."
-            else:
-                return "I apologize, but I encountered an error while generating a response. Please try again later."
+        # First, decide if we need to call an API: locally when confident, else via the orchestrator
+        decision = intent_classifier.classify(user_query)
+
+        # General questions repeat across users; answer them from the cache when possible
+        cacheable = answer_cacheable(user_query, decision)
+        if cacheable:
+            cached = answer_cache.get(user_query)
+            if cached is not None:
+                ASK_STATS['cached'] += 1
+                return cached
+
+        if decision is not None:
+            ASK_STATS['local'] += 1
+            # If we need to call an API, do so and add the result to the context
+            response = generate_answer(user_query, conversation_history, market_context(decision))
+        elif ASK_SPECULATIVE:
+            response, decision = speculative_response(user_query, conversation_history)
+        else:
+            ASK_STATS['sequential'] += 1
+            decision = llm_decision(user_query)
+            response = generate_answer(user_query, conversation_history, market_context(decision))
+
+        if cacheable:
+            remember_answer(user_query, decision, response)
+        return response
                 
     except Exception as e:
         print(f"Error in Gemini response: {e}")
@@ -432,19 +605,118 @@ def get_gemini_response(user_query, conversation_history=""):
         except:
             return "I apologize, but I encountered an error while processing your request. Please try again later."
 
-# Fallback to Gemma if Gemini is not available
-def get_gemma_response_fallback(query):
-    """Fallback to use Groq's Gemma model when Gemini is not available"""
+# Recent streamed answers, for time-to-first-token and total latency in /health
+ASK_STREAM_TIMINGS = deque(maxlen=200)
+
+def get_gemini_response_stream(user_query, conversation_history=""):
+    """
+    Streaming variant of get_gemini_response: yields answer chunks as the
+    model produces them. Routing and market data work as in the blocking
+    path, except there is no draft answer; a query that needs the
+    orchestrator only overlaps it with the market data prefetch.
+    """
+    started = False
     try:
-        system_prompt = """
+        decision = intent_classifier.classify(user_query)
+        cacheable = answer_cacheable(user_query, decision)
+        if cacheable:
+            cached = answer_cache.get(user_query)
+            if cached is not None:
+                ASK_STATS['cached'] += 1
+                yield cached
+                return
+
+        prefetched = None
+        if decision is not None:
+            ASK_STATS['local'] += 1
+        else:
+            ASK_STATS['sequential' if not ASK_SPECULATIVE else 'speculative'] += 1
+            prefetched = prefetch_market_data(user_query) if ASK_SPECULATIVE else None
+            decision = llm_decision(user_query)
+        parts = []
+        for chunk in generate_answer_stream(user_query, conversation_history, market_context(decision, prefetched)):
+            started = True
+            parts.append(chunk)
+            yield chunk
+        if cacheable:
+            remember_answer(user_query, decision, ''.join(parts))
+    except Exception as e:
+        print(f"Error in Gemini response stream: {e}")
+        if started:
+            yield "\n\nI apologize, but I encountered an error while processing your request. Please try again later."
+            return
+        # Fallback to Gemma, streamed the same way
+        try:
+            yield from get_gemma_response_stream(user_query)
+        except Exception:
+            yield "I apologize, but I encountered an error while processing your request. Please try again later."
+
+def timed_stream(chunks, label):
+    """
+    Pass chunks through while timing them; logs time to first token separately
+    from total latency and keeps both for /health.
+    """
+    started = time.perf_counter()
+    first = None
+    count = 0
+    try:
+        for chunk in chunks:
+            if first is None:
+                first = time.perf_counter() - started
+            count += 1
+            yield chunk
+    finally:
+        total = time.perf_counter() - started
+        ttft_ms = round(first * 1000) if first is not None else None
+        ASK_STREAM_TIMINGS.append((ttft_ms, round(total * 1000)))
+        print(f"{label}: first token {ttft_ms} ms, total {round(total * 1000)} ms, {count} chunks")
+
+def stream_timing_stats():
+    timings = list(ASK_STREAM_TIMINGS)
+    ttft = [t for t, _ in timings if t is not None]
+    total = [t for _, t in timings]
+    return {
+        'streams': len(timings),
+        'ttft_ms_p50': round(float(np.percentile(ttft, 50)), 1) if ttft else None,
+        'ttft_ms_p95': round(float(np.percentile(ttft, 95)), 1) if ttft else None,
+        'total_ms_p50': round(float(np.percentile(total, 50)), 1) if total else None,
+        'total_ms_p95': round(float(np.percentile(total, 95)), 1) if total else None,
+    }
+
+# Fallback to Gemma if Gemini is not available
+GEMMA_SYSTEM_PROMPT = """
         You are FinBuddy, a helpful and knowledgeable financial assistant designed specifically for Indian users. 
         Your purpose is to improve financial literacy and provide guidance on investments in the Indian market.
         """
-        
+
+def get_gemma_response_stream(query):
+    """Groq Gemma fallback, yielding chunks as they arrive"""
+    try:
+        stream = groq_client.chat.completions.create(
+            model="gemma2-9b-it",
+            messages=[
+                {"role": "system", "content": GEMMA_SYSTEM_PROMPT},
+                {"role": "user", "content": query}
+            ],
+            temperature=0.7,
+            max_tokens=1024,
+            top_p=1,
+            stream=True,
+        )
+        for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                yield text
+    except Exception as e:
+        yield f"I apologize, but I encountered an error: {str(e)}"
+
+def get_gemma_response_fallback(query):
+    """Fallback to use Groq's Gemma model when Gemini is not available"""
+    try:
         completion = groq_client.chat.completions.create(
             model="gemma2-9b-it",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": GEMMA_SYSTEM_PROMPT},
                 {"role": "user", "content": query}
             ],
             temperature=0.7,
@@ -480,28 +752,132 @@ def ask():
     if not query:
         return jsonify({"error": "No query provided"}), 400
     
-    # Get conversation history from session
-    conversation_history = ""
-    if 'chat_history' in session:
-        history = session.get('chat_history', [])
-        for i, entry in enumerate(history[-10:]):  # Get last 10 entries for context
-            role = "User" if i % 2 == 0 else "Assistant"
-            conversation_history += f"{role}: {entry}\n"
-    
     # Call get_gemini_response function with the query and conversation history
-    response = get_gemini_response(query, conversation_history)
+    response = get_gemini_response(query, session_conversation_history())
     
     # Update session with new conversation entries
-    if 'chat_history' not in session:
-        session['chat_history'] = []
-    
-    chat_history = session['chat_history']
-    chat_history.append(query)
-    chat_history.append(response)
-    session['chat_history'] = chat_history
+    record_chat_turn(query, response)
     
     return jsonify({"response": response})
 
+def conversation_id(create=False):
+    """Id of this session's server-side conversation; the cookie carries nothing else"""
+    # Sessions from before the server-side store kept the whole history in the cookie
+    if 'chat_history' in session:
+        session.pop('chat_history')
+    if create and 'conversation_id' not in session:
+        session['conversation_id'] = uuid.uuid4().hex
+    return session.get('conversation_id')
+
+def session_conversation_history():
+    """Rolling summary plus recent turns of this session's conversation, as context for the model"""
+    try:
+        return conversation_store.history(conversation_id())
+    except Exception as e:
+        print(f"Error loading conversation history: {e}")
+        return ""
+
+def record_chat_turn(query, response, conversation=None):
+    try:
+        conversation_store.record(conversation or conversation_id(create=True), query, response)
+    except Exception as e:
+        print(f"Error recording conversation turn: {e}")
+
+def summarize_conversation(summary, transcript):
+    """Fold older chat turns into the rolling summary with a short Gemini call"""
+    prompt = (
+        "Update the running summary of a conversation between a user and FinBuddy, a financial assistant. "
+        f"Keep the user's goals, stocks and figures discussed, and any advice given, in at most "
+        f"{conversation_store.summary_tokens * 3 // 4} words. Reply with the summary only.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    response = client.models.generate_content(model="gemini-1.5-flash", contents=prompt)
+    return response.text
+
+conversation_store.summarizer = summarize_conversation
+
+# Long-lived responses each hold one gthread thread for as long as they are
+# open. Market SSE streams (quotes, replays) stay open for minutes per tab,
+# chat NDJSON streams for the seconds an answer takes, so each kind has its
+# own per-worker budget: a page full of open charts can't push chat to 503,
+# and neither kind can take the threads ordinary routes need. Both budgets
+# follow the thread count; by default a quarter of the threads stays free.
+MARKET_STREAMS_PER_WORKER = int(os.environ.get('MARKET_STREAMS_PER_WORKER', max(1, GUNICORN_THREADS // 2)))
+CHAT_STREAMS_PER_WORKER = int(os.environ.get('CHAT_STREAMS_PER_WORKER', max(1, GUNICORN_THREADS // 4)))
+
+
+class StreamBudget:
+    """Caps how many streams of one kind a worker holds open at once"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.open = 0
+        self.rejected = 0
+
+    def response(self, chunks, mimetype, headers=None):
+        """Response for a long-lived stream, or 503 with Retry-After when the budget is spent"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            response = jsonify({'error': 'Too many open streams, please retry shortly'})
+            response.headers['Retry-After'] = '10'
+            return response, 503
+        with self._lock:
+            self.open += 1
+
+        def release():
+            with self._lock:
+                self.open -= 1
+            self._slots.release()
+
+        response = Response(chunks, mimetype=mimetype, headers=headers)
+        # Runs when the server closes the response, even if the body never started
+        response.call_on_close(release)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {'open': self.open, 'rejected': self.rejected, 'limit': self.limit}
+
+
+market_streams = StreamBudget(MARKET_STREAMS_PER_WORKER)
+chat_streams = StreamBudget(CHAT_STREAMS_PER_WORKER)
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """
+    Streaming variant of /ask: newline-delimited JSON, one object per line.
+    Example body: {"query": "What is compound interest?"}
+    Lines are {"type": "token", "text": ...} as the model produces text, then
+    {"type": "done", "response": <full answer>}.
+    The finished turn is stored server-side once the stream completes.
+    """
+    payload = request.get_json(silent=True) or {}
+    query = str(payload.get('query', '')).strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    conversation_history = session_conversation_history()
+    # The session cookie goes out before the body, so fix the conversation id now
+    conversation = conversation_id(create=True)
+
+    def generate():
+        parts = []
+        for chunk in timed_stream(get_gemini_response_stream(query, conversation_history), '/ask/stream'):
+            parts.append(chunk)
+            yield json.dumps({'type': 'token', 'text': chunk}) + '\n'
+        response = ''.join(parts)
+        record_chat_turn(query, response, conversation)
+        yield json.dumps({'type': 'done', 'response': response}) + '\n'
+
+    return chat_streams.response(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 #aptitude
 AUDIO_DIR = os.path.join('static', 'audio')
 os.makedirs(AUDIO_DIR, exist_ok=True)
@@ -653,7 +1029,27 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'message': 'FinBuddy is running successfully',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'market_cache': get_cache_stats(),
+        'market_refresh': get_refresher_stats(),
+        'quote_stream': quote_hub.stats(),
+        'streams': {'market': market_streams.stats(), 'chat': chat_streams.stats()},
+        'replay': replay_manager.stats(),
+        'orders': order_engine.stats(),
+        'indicators': indicator_tracker.stats(),
+        'movers': market_movers.stats(),
+        'symbols': symbol_index.stats(),
+        'intent': intent_classifier.stats(),
+        'ask': dict(ASK_STATS, stream=stream_timing_stats()),
+        'answer_cache': answer_cache.stats(),
+        'conversations': conversation_store.stats(),
+        'upstream': {
+            'http': http_client.stats(),
+            'coalescing': upstream_flight.stats(),
+            'circuit_breakers': upstream_breakers.states(),
+            # True while any endpoint is short-circuited to educational fallback data
+            'serving_fallback': upstream_breakers.any_open()
+        }
     }), 200
 
 @app.route('/signin')
@@ -723,7 +1119,13 @@ def simulator():
 
 @app.route('/simulator/sandbox/<symbol>')
 def simulator_sandbox(symbol):
-    return render_template('simulator_sandbox.html', symbol=symbol.upper(), active_page='simulator')
+    resolved = symbol_index.canonical(symbol)
+    if resolved is None:
+        return redirect(url_for('simulator'))
+    if resolved != symbol:
+        # Company names and lower-case tickers land on the canonical URL
+        return redirect(url_for('simulator_sandbox', symbol=resolved))
+    return render_template('simulator_sandbox.html', symbol=resolved, active_page='simulator')
 
 @app.route('/about')
 def about():
@@ -817,6 +1219,285 @@ class UserProgress(db.Model):
     # Create a unique constraint to ensure one entry per user per section
     __table_args__ = (db.UniqueConstraint('user_id', 'section_id'),)
 
+# Trading simulator ledger
+class SimPortfolio(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False, unique=True)
+    cash = db.Column(db.Float, nullable=False, default=SIM_STARTING_CASH)
+    held_cash = db.Column(db.Float, nullable=False, default=0.0)  # reserved by open buy orders
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SimPosition(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False, index=True)
+    symbol = db.Column(db.String(64), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    avg_price = db.Column(db.Float, nullable=False, default=0.0)
+    held_quantity = db.Column(db.Integer, nullable=False, default=0)  # reserved by open sell orders
+
+    # One row per user per symbol
+    __table_args__ = (db.UniqueConstraint('user_id', 'symbol'),)
+
+class SimTrade(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False, index=True)
+    symbol = db.Column(db.String(64), nullable=False)
+    side = db.Column(db.String(4), nullable=False)  # buy, sell
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    order_id = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SimOrder(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False, index=True)
+    symbol = db.Column(db.String(64), nullable=False)
+    side = db.Column(db.String(4), nullable=False)  # buy, sell
+    order_type = db.Column(db.String(6), nullable=False)  # market, limit
+    quantity = db.Column(db.Integer, nullable=False)
+    limit_price = db.Column(db.Float)
+    held_cash = db.Column(db.Float, nullable=False, default=0.0)  # reserved from the wallet while a buy is open
+    status = db.Column(db.String(9), nullable=False, default='open')  # open, filled, cancelled
+    created_at = db.Column(db.Float, nullable=False, default=time.time)
+    fill_price = db.Column(db.Float)
+    filled_at = db.Column(db.Float)
+    fill_id = db.Column(db.Integer, index=True)  # id of the SimTrade that booked the fill
+
+    # Open orders of a symbol by price, for matching and best bid/ask
+    __table_args__ = (db.Index('ix_sim_order_book', 'symbol', 'status', 'limit_price'),)
+
+    def to_dict(self):
+        return {
+            'order_id': self.id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'quantity': self.quantity,
+            'order_type': self.order_type,
+            'limit_price': self.limit_price,
+            'status': self.status,
+            'created_at': self.created_at,
+            'fill_price': self.fill_price,
+            'filled_at': self.filled_at,
+            'fill_id': self.fill_id,
+        }
+
+# Optional shared secret for operator-only simulator endpoints (X-Admin-Token header)
+SIM_ADMIN_TOKEN = os.environ.get('SIM_ADMIN_TOKEN')
+
+def sim_user_id():
+    """
+    Owner of the simulator ledger and orders for this request: the signed-in
+    user, or else a random guest id kept in this browser's signed session
+    cookie. bypass_auth names every visitor 'anonymous', so that is never used.
+    """
+    user_id = session.get('user_id')
+    if user_id and user_id != 'anonymous':
+        return user_id
+    if 'sim_user_id' not in session:
+        session['sim_user_id'] = f"guest-{uuid.uuid4().hex}"
+        session.permanent = True  # keep the wallet across browser restarts
+    return session['sim_user_id']
+
+def is_sim_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(SIM_ADMIN_TOKEN) and hmac.compare_digest(token, SIM_ADMIN_TOKEN)
+
+def get_sim_portfolio(user_id):
+    """Fetch the user's simulator portfolio, opening one with the starting cash if needed"""
+    portfolio = SimPortfolio.query.filter_by(user_id=user_id).with_for_update().first()
+    if portfolio is None:
+        portfolio = SimPortfolio(user_id=user_id, cash=SIM_STARTING_CASH)
+        db.session.add(portfolio)
+        db.session.flush()
+    return portfolio
+
+class SimOrderLedger:
+    """
+    Order ledger for order_engine: orders live in SimOrder, and each fill is
+    booked into cash, position and trade history in the same transaction
+    that marks the order filled.
+
+    Accepting an order reserves what it needs in that same transaction: a
+    buy holds limit price x quantity of cash, a sell holds the shares. The
+    holds are conditional UPDATEs, so concurrent orders from any worker can
+    never commit the same cash or shares twice, and a fill (at or better than
+    the limit) is always covered.
+    """
+
+    MATCH_BATCH = 500  # crossed orders filled per quote
+
+    def place(self, user_id, symbol, side, quantity, order_type, limit_price, fill_price=None):
+        with app.app_context():
+            get_sim_portfolio(user_id)
+            hold = 0.0
+            if side == 'buy':
+                hold = (limit_price if order_type == 'limit' else fill_price) * quantity
+                reserved = db.session.execute(
+                    db.update(SimPortfolio)
+                    .where(SimPortfolio.user_id == user_id, SimPortfolio.cash - SimPortfolio.held_cash >= hold)
+                    .values(held_cash=SimPortfolio.held_cash + hold)
+                ).rowcount
+            else:
+                reserved = db.session.execute(
+                    db.update(SimPosition)
+                    .where(SimPosition.user_id == user_id, SimPosition.symbol == symbol,
+                           SimPosition.quantity - SimPosition.held_quantity >= quantity)
+                    .values(held_quantity=SimPosition.held_quantity + quantity)
+                ).rowcount
+            if not reserved:
+                db.session.rollback()
+                raise OrderError('Insufficient balance' if side == 'buy' else 'Not enough holdings')
+
+            order = SimOrder(user_id=user_id, symbol=symbol, side=side, quantity=quantity,
+                             order_type=order_type, limit_price=limit_price, held_cash=hold, status='open')
+            db.session.add(order)
+            db.session.flush()
+            if fill_price is not None:
+                self._fill(order, fill_price)
+            result = order.to_dict()
+            db.session.commit()
+            return result
+
+    def cancel(self, user_id, order_id):
+        with app.app_context():
+            claimed = db.session.execute(
+                db.update(SimOrder)
+                .where(SimOrder.id == order_id, SimOrder.user_id == user_id, SimOrder.status == 'open')
+                .values(status='cancelled')
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                return None
+            order = db.session.get(SimOrder, order_id)
+            self._release(order)
+            db.session.commit()
+            return order.to_dict()
+
+    def fill_crossing(self, symbol, price):
+        """Fill the symbol's open orders crossed by price, best price then oldest first"""
+        filled = []
+        with app.app_context():
+            crossed = (SimOrder.query
+                       .filter(SimOrder.symbol == symbol, SimOrder.status == 'open',
+                               db.or_(db.and_(SimOrder.side == 'buy', SimOrder.limit_price >= price),
+                                      db.and_(SimOrder.side == 'sell', SimOrder.limit_price <= price)))
+                       .order_by(db.case((SimOrder.side == 'buy', -SimOrder.limit_price),
+                                         else_=SimOrder.limit_price), SimOrder.id)
+                       .limit(self.MATCH_BATCH).all())
+            for order in crossed:
+                try:
+                    if self._fill(order, round(price, 2)):
+                        filled.append(order.to_dict())
+                    db.session.commit()
+                except Exception as e:
+                    # The order stays open and is retried on a later quote
+                    db.session.rollback()
+                    print(f"Could not book fill for order {order.id}: {e}")
+        return filled
+
+    def _fill(self, order, price):
+        """Claim an open order and book it at price; False if another worker filled it first"""
+        filled_at = time.time()
+        claimed = db.session.execute(
+            db.update(SimOrder).where(SimOrder.id == order.id, SimOrder.status == 'open')
+            .values(status='filled', fill_price=price, filled_at=filled_at)
+        ).rowcount
+        if not claimed:
+            return False
+        # The Core UPDATE bypasses the loaded instance; mirror it so to_dict() reports the fill
+        order.status, order.fill_price, order.filled_at = 'filled', price, filled_at
+
+        amount = price * order.quantity
+        position = db.update(SimPosition).where(SimPosition.user_id == order.user_id,
+                                                SimPosition.symbol == order.symbol)
+        if order.side == 'buy':
+            # The hold covers the fill (price <= limit); release it and pay the actual amount
+            db.session.execute(
+                db.update(SimPortfolio).where(SimPortfolio.user_id == order.user_id)
+                .values(cash=SimPortfolio.cash - amount, held_cash=SimPortfolio.held_cash - order.held_cash)
+            )
+            added = db.session.execute(position.values(
+                avg_price=(SimPosition.quantity * SimPosition.avg_price + amount) / (SimPosition.quantity + order.quantity),
+                quantity=SimPosition.quantity + order.quantity,
+            )).rowcount
+            if not added:
+                db.session.add(SimPosition(user_id=order.user_id, symbol=order.symbol,
+                                           quantity=order.quantity, avg_price=price))
+        else:
+            db.session.execute(position.values(quantity=SimPosition.quantity - order.quantity,
+                                               held_quantity=SimPosition.held_quantity - order.quantity))
+            db.session.execute(db.delete(SimPosition).where(
+                SimPosition.user_id == order.user_id, SimPosition.symbol == order.symbol, SimPosition.quantity == 0))
+            db.session.execute(db.update(SimPortfolio).where(SimPortfolio.user_id == order.user_id)
+                               .values(cash=SimPortfolio.cash + amount))
+
+        trade = SimTrade(user_id=order.user_id, symbol=order.symbol, side=order.side,
+                         quantity=order.quantity, price=price, order_id=order.id)
+        db.session.add(trade)
+        db.session.flush()
+        order.fill_id = trade.id
+        return True
+
+    def _release(self, order):
+        """Return a cancelled order's reserved cash or shares"""
+        if order.side == 'buy':
+            db.session.execute(db.update(SimPortfolio).where(SimPortfolio.user_id == order.user_id)
+                               .values(held_cash=SimPortfolio.held_cash - order.held_cash))
+        else:
+            db.session.execute(db.update(SimPosition)
+                               .where(SimPosition.user_id == order.user_id, SimPosition.symbol == order.symbol)
+                               .values(held_quantity=SimPosition.held_quantity - order.quantity))
+
+    def open_orders(self, user_id, symbol=None):
+        with app.app_context():
+            query = SimOrder.query.filter_by(user_id=user_id, status='open')
+            if symbol:
+                query = query.filter_by(symbol=symbol)
+            return [o.to_dict() for o in query.order_by(SimOrder.id).all()]
+
+    def fills(self, user_id, since, limit):
+        with app.app_context():
+            orders = (SimOrder.query.filter(SimOrder.user_id == user_id, SimOrder.status == 'filled',
+                                            SimOrder.fill_id > since)
+                      .order_by(SimOrder.fill_id).limit(limit).all())
+            return [o.to_dict() for o in orders]
+
+    def count_open(self, user_id):
+        with app.app_context():
+            return SimOrder.query.filter_by(user_id=user_id, status='open').count()
+
+    def resting(self, symbol=None):
+        with app.app_context():
+            bid = db.func.max(db.case((SimOrder.side == 'buy', SimOrder.limit_price)))
+            ask = db.func.min(db.case((SimOrder.side == 'sell', SimOrder.limit_price)))
+            query = (db.session.query(SimOrder.symbol, bid, ask, db.func.count(SimOrder.id))
+                     .filter(SimOrder.status == 'open'))
+            if symbol:
+                query = query.filter(SimOrder.symbol == symbol)
+            return {row[0]: RestingBook(row[1], row[2], row[3]) for row in query.group_by(SimOrder.symbol).all()}
+
+    def cancel_all(self, user_id):
+        """Cancel every open order of the user, within the caller's transaction; the caller resets the holds"""
+        db.session.execute(db.update(SimOrder).where(SimOrder.user_id == user_id, SimOrder.status == 'open')
+                           .values(status='cancelled'))
+
+order_engine.attach(SimOrderLedger())
+
+def revalue_sim_portfolios(user_id=None, include_positions=True):
+    """Mark every position of one user (or all users) to market in a single batch"""
+    portfolios = SimPortfolio.query if user_id is None else SimPortfolio.query.filter_by(user_id=user_id)
+    positions = SimPosition.query if user_id is None else SimPosition.query.filter_by(user_id=user_id)
+    cash = {p.user_id: p.cash for p in portfolios.all()}
+    rows = positions.filter(SimPosition.quantity > 0).order_by(SimPosition.user_id, SimPosition.symbol).all()
+    if user_id is not None and user_id not in cash:
+        cash[user_id] = SIM_STARTING_CASH
+    return revalue_positions(
+        [r.user_id for r in rows], [r.symbol for r in rows],
+        [r.quantity for r in rows], [r.avg_price for r in rows],
+        cash, include_positions=include_positions
+    )
+
 @app.route('/notes')
 @app.route('/notes/<path:note_type>')
 def notes(note_type=None):
@@ -2265,7 +2946,7 @@ def search_arxiv(query: str) -> str:
             "max_results": 5
         }
         
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         if response.status_code != 200:
             return f"Error: Received status code {response.status_code} from arXiv"
         
@@ -2304,7 +2985,7 @@ def search_pubmed(query: str) -> str:
             "retmax": 5
         }
         
-        esearch_response = requests.get(esearch_url, params=esearch_params)
+        esearch_response = http_client.get(esearch_url, params=esearch_params)
         esearch_data = json.loads(esearch_response.text)
         
         if "esearchresult" not in esearch_data or "idlist" not in esearch_data["esearchresult"]:
@@ -2323,7 +3004,7 @@ def search_pubmed(query: str) -> str:
             "retmode": "json"
         }
         
-        esummary_response = requests.get(esummary_url, params=esummary_params)
+        esummary_response = http_client.get(esummary_url, params=esummary_params)
         esummary_data = json.loads(esummary_response.text)
         
         results = []
@@ -2342,7 +3023,7 @@ def search_pubmed(query: str) -> str:
                     "retmode": "xml"
                 }
                 
-                efetch_response = requests.get(efetch_url, params=efetch_params)
+                efetch_response = http_client.get(efetch_url, params=efetch_params)
                 
                 # Parse XML to extract abstract
                 root = ET.fromstring(efetch_response.text)
@@ -2912,6 +3593,33 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def unknown_symbol_response(query):
+    """404 for a symbol known not to exist, with close matches"""
+    return jsonify({
+        'error': f"Unknown symbol '{query}'",
+        'suggestions': symbol_index.search(query, limit=5)
+    }), 404
+
+@app.route('/api/symbols/search')
+def api_symbols_search():
+    """
+    Autocomplete over tickers and company names, served from the local symbol master.
+    Example: /api/symbols/search?q=tata&limit=5
+    Falls back to typo-tolerant matches when nothing starts with the query.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    limit = request.args.get('limit', 10, type=int)
+    if not 1 <= limit <= 10:
+        return jsonify({'error': 'limit must be between 1 and 10'}), 400
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'resolved': symbol_index.resolve(query),
+        'results': symbol_index.search(query, limit)
+    })
+
 # Public API passthroughs for simulator UI
 @app.route('/api/market/quote')
 def api_market_quote():
@@ -2922,7 +3630,10 @@ def api_market_quote():
     stock_name = request.args.get('stock_name', '').strip()
     if not stock_name:
         return jsonify({'error': 'stock_name is required'}), 400
-    data = call_api_by_name('get_stock_details', stock_name=stock_name)
+    symbol = symbol_index.canonical(stock_name)
+    if symbol is None:
+        return unknown_symbol_response(stock_name)
+    data = call_api_by_name('get_stock_details', stock_name=symbol)
     return jsonify(data)
 
 @app.route('/api/market/trending')
@@ -2933,5 +3644,475 @@ def api_market_trending():
     data = call_api_by_name('get_trending_stocks')
     return jsonify(data)
 
+# Cap on symbols per quote stream subscription
+MAX_STREAM_SYMBOLS = 20
+
+@app.route('/api/market/movers')
+def api_market_movers():
+    """
+    Returns the top gainers and losers across the tracked symbol universe.
+    Example: /api/market/movers?count=10
+    Served from arrays kept current in the background; never fetches quotes per request.
+    """
+    count = request.args.get('count', 5, type=int)
+    if not 1 <= count <= 100:
+        return jsonify({'error': 'count must be between 1 and 100'}), 400
+    result = market_movers.top(count)
+    result['status'] = 'success'
+    return jsonify(result)
+
+@app.route('/api/market/stream')
+def api_market_stream():
+    """
+    Server-Sent Events stream of quote updates for a set of symbols.
+    Example: /api/market/stream?symbols=RELIANCE,TCS
+    Every open stream is fed by one shared refresh loop per worker, so
+    upstream load does not grow with the number of open tabs.
+    """
+    symbols = list(dict.fromkeys(s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()))
+    if not symbols:
+        return jsonify({'error': 'symbols is required'}), 400
+    if len(symbols) > MAX_STREAM_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_STREAM_SYMBOLS} symbols per stream'}), 400
+    resolved = {s: symbol_index.canonical(s) for s in symbols}
+    unknown = [s for s, symbol in resolved.items() if symbol is None]
+    if unknown:
+        return jsonify({'error': f"Unknown symbols: {', '.join(unknown)}"}), 404
+
+    # Subscribe by ticker so tabs asking for a name and its ticker share one feed,
+    # but label each event with the name this client asked for
+    labels = {}
+    for s, symbol in resolved.items():
+        labels.setdefault(symbol, []).append(s)
+
+    return market_streams.response(
+        quote_hub.stream(list(labels), labels),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Canonical chart periods and the aliases the sandbox may send
+HISTORICAL_PERIODS = {
+    '1d': '1d', 'day': '1d', '1day': '1d', 'daily': '1d',
+    '1w': '1w', '5d': '1w', 'week': '1w', '1week': '1w', 'weekly': '1w',
+    '1m': '1m', '30d': '1m', 'month': '1m', '1month': '1m',
+    '3m': '3m', '90d': '3m', 'quarter': '3m',
+    '1y': '1y', '365d': '1y', 'year': '1y', '1year': '1y'
+}
+MAX_HISTORICAL_POINTS = 5000
+
+@app.route('/api/market/historical')
+def api_market_historical():
+    """
+    Returns historical candles for a stock_name, optionally downsampled server-side.
+    Example: /api/market/historical?stock_name=RELIANCE&period=1y&max_points=500
+
+    Query params:
+        period: 1d, 1w, 1m, 3m or 1y (default 1d)
+        max_points: downsample to at most this many points
+        method: 'ohlc' (bucket candles, default) or 'lttb' (largest-triangle-three-buckets on close)
+        format: 'rows' (default) or 'columnar'; float32=1 lowers columnar precision
+        indicators: comma-separated specs, e.g. sma:20,rsi:14,macd,bollinger:20:2,atr,vwap;
+            computed over the full history, then aligned with the returned candles
+    """
+    stock_name = request.args.get('stock_name', '').strip()
+    if not stock_name:
+        return jsonify({'error': 'stock_name is required'}), 400
+    symbol = symbol_index.canonical(stock_name)
+    if symbol is None:
+        return unknown_symbol_response(stock_name)
+
+    period = HISTORICAL_PERIODS.get(request.args.get('period', '1d').strip().lower())
+    if not period:
+        return jsonify({'error': 'period must be one of 1d, 1w, 1m, 3m, 1y'}), 400
+
+    method = request.args.get('method', 'ohlc').strip().lower()
+    if method not in ('ohlc', 'lttb'):
+        return jsonify({'error': 'method must be ohlc or lttb'}), 400
+
+    max_points = request.args.get('max_points', type=int)
+    if max_points is not None and not 3 <= max_points <= MAX_HISTORICAL_POINTS:
+        return jsonify({'error': f'max_points must be between 3 and {MAX_HISTORICAL_POINTS}'}), 400
+
+    indicators = None
+    ohlcv = market_data_generator.generate_historical_ohlcv(symbol, period)
+    if request.args.get('indicators'):
+        try:
+            indicators = compute_indicators(ohlcv, request.args['indicators'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    full_times = np.asarray(ohlcv['time'])
+    total = len(full_times)
+    if max_points:
+        ohlcv = downsample_ohlc(ohlcv, max_points) if method == 'ohlc' else downsample_lttb(ohlcv, max_points)
+
+    result = {
+        'status': 'success',
+        'symbol': symbol,
+        'period': period,
+        'total_candles': total,
+        'count': len(ohlcv['time']),
+        'downsampled': len(ohlcv['time']) < total
+    }
+    if request.args.get('format') == 'columnar':
+        result['data'] = to_columnar(ohlcv, float32=request.args.get('float32') in ('1', 'true'))
+    else:
+        result['data'] = ohlcv_to_candles(ohlcv)
+
+    if indicators is not None:
+        if len(ohlcv['time']) < total:
+            # Bucketed candles end just before the next bucket; LTTB keeps original candles
+            shown = np.asarray(ohlcv['time'])
+            if method == 'ohlc':
+                indices = np.append(np.searchsorted(full_times, shown[1:]) - 1, total - 1)
+            else:
+                indices = np.searchsorted(full_times, shown)
+            indicators = select_indicators(indicators, indices)
+        result['indicators'] = indicators_to_json(indicators)
+    return jsonify(result)
+
+@app.route('/api/market/indicators')
+def api_market_indicators():
+    """
+    Returns the latest indicator values for a stock_name, kept up to date
+    incrementally as quotes arrive rather than recomputed over the history.
+    Example: /api/market/indicators?stock_name=RELIANCE
+    """
+    stock_name = request.args.get('stock_name', '').strip()
+    if not stock_name:
+        return jsonify({'error': 'stock_name is required'}), 400
+    symbol = symbol_index.canonical(stock_name)
+    if symbol is None:
+        return unknown_symbol_response(stock_name)
+
+    indicator_tracker.track(symbol)
+    # A fresh (usually cached) quote folds into the forming bar before we read it
+    market_data_generator.get_current_price(symbol)
+    result = indicator_tracker.track(symbol)
+    result['status'] = 'success'
+    return jsonify(result)
+
+@app.route('/api/market/bulk', methods=['POST'])
+def api_market_bulk():
+    """
+    Returns quotes for a list of symbols plus trending and news in one round trip.
+    Example body: {"symbols": ["NIFTY 50", "Reliance Industries"]}
+    """
+    payload = request.get_json(silent=True) or {}
+    symbols = payload.get('symbols')
+    if not isinstance(symbols, list) or not symbols:
+        return jsonify({'error': 'symbols must be a non-empty list'}), 400
+
+    symbols = [str(s).strip() for s in symbols if str(s).strip()]
+    if not symbols:
+        return jsonify({'error': 'symbols must be a non-empty list'}), 400
+    if len(symbols) > MAX_BULK_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_BULK_SYMBOLS} symbols per request'}), 400
+
+    resolved = {s: symbol_index.canonical(s) for s in symbols}
+    unknown = [s for s, symbol in resolved.items() if symbol is None]
+    if unknown:
+        return jsonify({'error': f"Unknown symbols: {', '.join(unknown)}"}), 404
+
+    data = get_bulk_market_data_endpoint(list(dict.fromkeys(resolved.values())))
+    # Quotes are fetched per ticker but keyed by the names the client sent
+    quotes = data.get('quotes') or {}
+    data['quotes'] = {s: quotes.get(symbol) for s, symbol in resolved.items()}
+    return jsonify(data)
+
+@app.route('/api/replay', methods=['POST'])
+def api_replay_open():
+    """
+    Starts a server-side replay of historical candles, or joins the live one for the same scenario.
+    Example body: {"symbol": "RELIANCE", "period": "3m", "start": "2024-01-15", "speed": 4}
+    The visitor who opened a session controls its clock (can_control); everyone
+    who joins it, here or through watch_url, watches read-only.
+    """
+    payload = request.get_json(silent=True) or {}
+    symbol = str(payload.get('symbol', '')).strip()
+    if not symbol:
+        return jsonify({'error': 'symbol is required'}), 400
+    resolved = symbol_index.canonical(symbol)
+    if resolved is None:
+        return unknown_symbol_response(symbol)
+    symbol = resolved
+
+    period = HISTORICAL_PERIODS.get(str(payload.get('period', '1d')).strip().lower())
+    if not period:
+        return jsonify({'error': 'period must be one of 1d, 1w, 1m, 3m, 1y'}), 400
+
+    try:
+        session = replay_manager.open(symbol, period, payload.get('start') or None, payload.get('speed', 1),
+                                      owner=sim_user_id())
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(replay_state(session, status='success'))
+
+def replay_state(session, **extra):
+    """Session state plus what this visitor may do with it and where to watch it"""
+    state = session.state()
+    state.update(extra)
+    state['can_control'] = session.owned_by(sim_user_id())
+    state['stream_url'] = f"/api/replay/{session.session_id}/stream"
+    state['watch_url'] = url_for('simulator_sandbox', symbol=session.symbol, replay=session.session_id)
+    return state
+
+@app.route('/api/replay/<session_id>')
+def api_replay_state(session_id):
+    """
+    Returns the current clock position of a replay session; used to join it by id.
+    Example: /api/replay/3f2a9c1b7d4e
+    """
+    session = replay_manager.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Replay session not found'}), 404
+    return jsonify(replay_state(session))
+
+@app.route('/api/replay/<session_id>/stream')
+def api_replay_stream(session_id):
+    """
+    Server-Sent Events stream of a replay session's candles.
+    Example: /api/replay/3f2a9c1b7d4e/stream
+    """
+    session = replay_manager.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Replay session not found'}), 404
+    return market_streams.response(
+        session.stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/replay/<session_id>/control', methods=['POST'])
+def api_replay_control(session_id):
+    """
+    Pauses, resumes or seeks a replay session for every viewer. Only the
+    visitor who opened the session may control it.
+    Example body: {"action": "seek", "position": 120} or {"action": "seek", "date": "2024-02-01"}
+    """
+    session = replay_manager.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Replay session not found'}), 404
+    if not session.owned_by(sim_user_id()):
+        return jsonify({'error': 'Only the viewer who started this replay can control it'}), 403
+
+    payload = request.get_json(silent=True) or {}
+    action = payload.get('action')
+    if action == 'pause':
+        session.pause()
+    elif action == 'resume':
+        session.resume()
+    elif action == 'seek':
+        try:
+            if payload.get('date'):
+                session.seek_time(int(datetime.fromisoformat(str(payload['date'])).timestamp()))
+            else:
+                session.seek(int(payload.get('position', 0)))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'seek needs an integer position or an ISO date'}), 400
+    else:
+        return jsonify({'error': 'action must be pause, resume or seek'}), 400
+    return jsonify(session.state())
+
+@app.route('/api/orders', methods=['GET', 'POST'])
+def api_orders():
+    """
+    GET lists the user's open orders (optionally ?symbol=); POST places an order.
+    Example body: {"symbol": "RELIANCE", "side": "buy", "quantity": 5, "order_type": "limit", "limit_price": 2400}
+    Resting limit orders are filled server-side as quotes arrive, even with no tab open.
+    """
+    user_id = sim_user_id()
+    if request.method == 'GET':
+        return jsonify({'status': 'success', 'orders': order_engine.open_orders(user_id, request.args.get('symbol'))})
+
+    payload = request.get_json(silent=True) or {}
+    symbol = str(payload.get('symbol', '')).strip()
+    if not symbol:
+        return jsonify({'error': 'symbol is required'}), 400
+    resolved = symbol_index.canonical(symbol)
+    if resolved is None:
+        return unknown_symbol_response(symbol)
+    symbol = resolved
+    try:
+        quantity = int(payload.get('quantity', 0))
+        limit_price = payload.get('limit_price')
+        limit_price = float(limit_price) if limit_price not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'quantity and limit_price must be numbers'}), 400
+
+    quote = market_data_generator.get_current_price(symbol.upper())
+    side = str(payload.get('side', '')).lower()
+    order_type = str(payload.get('order_type', 'limit')).lower()
+    try:
+        order = order_engine.place(user_id, symbol, side, quantity, order_type, limit_price, quote)
+    except OrderError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'status': 'success', 'order': order})
+
+@app.route('/api/orders/<int:order_id>', methods=['DELETE'])
+def api_order_cancel(order_id):
+    """Cancels one of the user's open orders"""
+    order = order_engine.cancel(sim_user_id(), order_id)
+    if order is None:
+        return jsonify({'error': 'Open order not found'}), 404
+    return jsonify({'status': 'success', 'order': order})
+
+@app.route('/api/orders/fills')
+def api_order_fills():
+    """
+    Returns the user's fills newer than ?since=<fill_id>.
+    Example: /api/orders/fills?since=42
+    """
+    since = request.args.get('since', 0, type=int)
+    return jsonify({'status': 'success', 'fills': order_engine.fills(sim_user_id(), since)})
+
+@app.route('/api/orders/book/<symbol>')
+def api_order_book(symbol):
+    """Returns the resting order count and best bid/ask for a symbol"""
+    return jsonify(order_engine.book(symbol))
+
+@app.route('/api/portfolio/revalue')
+def api_portfolio_revalue():
+    """
+    Marks positions to market in one batch: the current user's by default, or
+    every user's summary with scope=all (operators only, X-Admin-Token header).
+    Example: /api/portfolio/revalue or /api/portfolio/revalue?scope=all
+    """
+    if request.args.get('scope') == 'all':
+        if not is_sim_admin():
+            return jsonify({'error': 'scope=all requires an admin token'}), 403
+        portfolios = revalue_sim_portfolios(include_positions=False)
+        return jsonify({'status': 'success', 'users': len(portfolios), 'portfolios': portfolios})
+
+    user_id = sim_user_id()
+    result = revalue_sim_portfolios(user_id)[user_id]
+    portfolio = SimPortfolio.query.filter_by(user_id=user_id).first()
+    # Cash not reserved by open buy orders
+    result['available_cash'] = round(result['cash'] - (portfolio.held_cash if portfolio else 0.0), 2)
+    result['status'] = 'success'
+    return jsonify(result)
+
+@app.route('/api/portfolio/trades')
+def api_portfolio_trades():
+    """Returns the user's most recent simulator trades"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    trades = (SimTrade.query.filter_by(user_id=sim_user_id())
+              .order_by(SimTrade.id.desc()).limit(limit).all())
+    return jsonify({'status': 'success', 'trades': [
+        {'symbol': t.symbol, 'side': t.side, 'quantity': t.quantity, 'price': t.price,
+         'order_id': t.order_id, 'created_at': t.created_at.isoformat()}
+        for t in trades
+    ]})
+
+@app.route('/api/portfolio/reset', methods=['POST'])
+def api_portfolio_reset():
+    """Cancels open orders and resets the user's simulator wallet to the starting cash"""
+    user_id = sim_user_id()
+    order_engine.ledger.cancel_all(user_id)
+    SimPosition.query.filter_by(user_id=user_id).delete()
+    portfolio = get_sim_portfolio(user_id)
+    portfolio.cash = SIM_STARTING_CASH
+    portfolio.held_cash = 0.0
+    db.session.commit()
+    return jsonify({'status': 'success'})
+
+# Upper bound on candles per backtest (a year of minute bars is about 94k); generated
+# educational history is also capped at MAX_BACKTEST_YEARS of its period's bars
+MAX_BACKTEST_CANDLES = 200000
+MAX_BACKTEST_YEARS = 20
+
+def max_backtest_candles(period):
+    minutes = FALLBACK_PERIOD_CONFIG[period]['interval_minutes']
+    return min(MAX_BACKTEST_CANDLES, int(MAX_BACKTEST_YEARS * 365 * 24 * 60 / minutes))
+
+@app.route('/api/backtest', methods=['POST'])
+def api_backtest():
+    """
+    Backtests a rule-based strategy over a symbol's candle history.
+    Example body: {"symbol": "TCS", "period": "1y", "strategy": "ma_crossover", "params": {"fast": 10, "slow": 30}}
+
+    Body fields:
+        strategy: ma_crossover (fast, slow), rsi (period, lower, upper) or buy_and_hold
+        params: one parameter set, or param_grid: a list of them run side by side
+        candles: number of candles when educational data is generated (default per period)
+        initial_cash, commission_bps: optional
+    """
+    payload = request.get_json(silent=True) or {}
+    symbol = str(payload.get('symbol', '')).strip()
+    if not symbol:
+        return jsonify({'error': 'symbol is required'}), 400
+
+    period = HISTORICAL_PERIODS.get(str(payload.get('period', '1y')).strip().lower())
+    if not period:
+        return jsonify({'error': 'period must be one of 1d, 1w, 1m, 3m, 1y'}), 400
+
+    try:
+        candles = int(payload['candles']) if payload.get('candles') else None
+        initial_cash = float(payload.get('initial_cash', 100000))
+        commission_bps = float(payload.get('commission_bps', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'candles, initial_cash and commission_bps must be numbers'}), 400
+    max_candles = max_backtest_candles(period)
+    if candles is not None and not 2 <= candles <= max_candles:
+        return jsonify({'error': f'candles must be between 2 and {max_candles} for period {period}'}), 400
+    if initial_cash <= 0 or commission_bps < 0:
+        return jsonify({'error': 'initial_cash must be positive and commission_bps non-negative'}), 400
+
+    param_sets = payload.get('param_grid') or [payload.get('params') or {}]
+    if not isinstance(param_sets, list) or not all(isinstance(p, dict) for p in param_sets):
+        return jsonify({'error': 'param_grid must be a list of parameter objects'}), 400
+
+    ohlcv = market_data_generator.generate_historical_ohlcv(symbol, period, candles)
+    try:
+        result = run_backtest(ohlcv, str(payload.get('strategy', '')), param_sets,
+                              initial_cash=initial_cash, commission_bps=commission_bps)
+    except BacktestError as e:
+        return jsonify({'error': str(e)}), 400
+
+    result.update({'status': 'success', 'symbol': symbol, 'period': period})
+    return jsonify(result)
+
+# Limits for the simulation endpoint: steps x symbols bounds the work per request
+MAX_SIMULATION_SYMBOLS = 10000
+MAX_SIMULATION_STEPS = 2000
+MAX_SIMULATION_SYMBOL_STEPS = 5000000
+
+@app.route('/api/market/simulate')
+def api_market_simulate():
+    """
+    Runs the correlated multi-asset simulator and returns a summary of the run.
+    Example: /api/market/simulate?symbols=RELIANCE,TCS,INFY&steps=75
+    Example (load test): /api/market/simulate?universe=5000&steps=200
+
+    Query params:
+        symbols: comma-separated symbols (default: all reference symbols)
+        universe: simulate this many random synthetic symbols instead
+        steps: number of intervals to advance (default 75, one trading day of 5m bars)
+        interval: seconds per step (default 300)
+        seed: optional seed for a reproducible run
+    """
+    symbols = [s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()]
+    universe = request.args.get('universe', type=int)
+    steps = request.args.get('steps', 75, type=int)
+    interval = request.args.get('interval', 300, type=int)
+    seed = request.args.get('seed', type=int)
+
+    count = universe or len(symbols) or len(market_data_generator.BASE_PRICES)
+    if not 1 <= count <= MAX_SIMULATION_SYMBOLS:
+        return jsonify({'error': f'universe must be between 1 and {MAX_SIMULATION_SYMBOLS}'}), 400
+    if not 1 <= steps <= MAX_SIMULATION_STEPS:
+        return jsonify({'error': f'steps must be between 1 and {MAX_SIMULATION_STEPS}'}), 400
+    if count * steps > MAX_SIMULATION_SYMBOL_STEPS:
+        return jsonify({'error': f'symbols x steps must not exceed {MAX_SIMULATION_SYMBOL_STEPS}'}), 400
+    if interval <= 0:
+        return jsonify({'error': 'interval must be positive'}), 400
+
+    result = simulate_market(symbols or None, universe_size=universe, steps=steps,
+                             interval_seconds=interval, seed=seed)
+    result['status'] = 'success'
+    return jsonify(result)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Vectorized backtesting of simple long-only strategies over candle history.
+
+Every stage is an array operation over the whole series: indicators,
+signals, positions, fills, equity and drawdown. Several parameter sets
+run together as rows of one 2-D position matrix, so a parameter sweep
+costs about the same as a single run.
+
+Positions are decided on a bar's close and held from that close onward, so
+a signal never uses a price it could not have seen.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from indicators import rsi, sma
+
+STRATEGIES = ('ma_crossover', 'rsi', 'buy_and_hold')
+STRATEGY_DEFAULTS = {
+    'ma_crossover': {'fast': 20, 'slow': 50},
+    'rsi': {'period': 14, 'lower': 30, 'upper': 70},
+    'buy_and_hold': {},
+}
+MAX_PARAMETER_SETS = 50
+
+
+class BacktestError(ValueError):
+    """Raised for an unknown strategy or invalid strategy parameters"""
+
+
+def _hold_between(enter: np.ndarray, exit_: np.ndarray) -> np.ndarray:
+    """
+    Turn entry/exit event masks into a 0/1 position by forward-filling the
+    last event. Works row-wise on 2-D masks.
+    """
+    events = np.where(enter, 1.0, np.where(exit_, 0.0, np.nan))
+    idx = np.where(np.isnan(events), 0, np.arange(events.shape[-1]))
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    filled = np.take_along_axis(events, idx, axis=-1)
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def strategy_positions(close: np.ndarray, strategy: str, param_sets: List[Dict[str, Any]]) -> np.ndarray:
+    """Return a (len(param_sets), len(close)) matrix of target positions (0 or 1)"""
+    if strategy == 'buy_and_hold':
+        return np.ones((len(param_sets), len(close)))
+
+    if strategy == 'ma_crossover':
+        windows = {}
+        for params in param_sets:
+            for key in ('fast', 'slow'):
+                windows.setdefault(params[key], None)
+        # Each distinct window is computed once and shared by every parameter set
+        smas = {w: sma(close, w) for w in windows}
+        fast = np.stack([smas[p['fast']] for p in param_sets])
+        slow = np.stack([smas[p['slow']] for p in param_sets])
+        with np.errstate(invalid='ignore'):
+            return (fast > slow).astype(np.float64)
+
+    if strategy == 'rsi':
+        rsis = {p['period']: rsi(close, p['period']) for p in param_sets}
+        rsi_values = np.stack([rsis[p['period']] for p in param_sets])
+        lower = np.array([[p['lower']] for p in param_sets], dtype=np.float64)
+        upper = np.array([[p['upper']] for p in param_sets], dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            return _hold_between(rsi_values < lower, rsi_values > upper)
+
+    raise BacktestError(f"strategy must be one of {', '.join(STRATEGIES)}")
+
+
+def validate_params(strategy: str, param_sets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in defaults and check each parameter set; raises BacktestError"""
+    if strategy not in STRATEGIES:
+        raise BacktestError(f"strategy must be one of {', '.join(STRATEGIES)}")
+    if not param_sets:
+        param_sets = [{}]
+    if len(param_sets) > MAX_PARAMETER_SETS:
+        raise BacktestError(f"At most {MAX_PARAMETER_SETS} parameter sets per backtest")
+
+    validated = []
+    for raw in param_sets:
+        params = dict(STRATEGY_DEFAULTS[strategy])
+        try:
+            params.update({k: int(v) if k in ('fast', 'slow', 'period') else float(v)
+                           for k, v in (raw or {}).items() if k in params})
+        except (TypeError, ValueError):
+            raise BacktestError('strategy parameters must be numbers')
+        if strategy == 'ma_crossover' and not 1 <= params['fast'] < params['slow']:
+            raise BacktestError('ma_crossover needs 1 <= fast < slow')
+        if strategy == 'rsi' and not (params['period'] >= 2 and 0 <= params['lower'] < params['upper'] <= 100):
+            raise BacktestError('rsi needs period >= 2 and 0 <= lower < upper <= 100')
+        validated.append(params)
+    return validated
+
+
+def _bars_per_year(times: np.ndarray) -> float:
+    if len(times) < 2:
+        return 252.0
+    step = float(np.median(np.diff(times)))
+    if step >= 2 * 86400:
+        # Weekly and monthly bars: one bar per calendar week or month (52, 12 a year)
+        return 365.25 * 86400 / step
+    if step >= 86400:
+        return 252.0
+    # Intraday bars: count trading-session bars rather than calendar seconds
+    return 252.0 * 6.25 * 3600 / step
+
+
+def run_backtest(ohlcv: Dict[str, np.ndarray], strategy: str, param_sets: List[Dict[str, Any]] = None,
+                 initial_cash: float = 100000.0, commission_bps: float = 0.0,
+                 curve_points: int = 500) -> Dict[str, Any]:
+    """
+    Backtest a strategy for one or more parameter sets over OHLCV arrays.
+
+    Returns per-set metrics (total return, annualized return and volatility,
+    Sharpe, max drawdown, trades, win rate) and, for the best set by total
+    return, an equity and drawdown curve sampled to about curve_points points.
+    """
+    param_sets = validate_params(strategy, param_sets)
+    close = np.asarray(ohlcv['close'], dtype=np.float64)
+    times = np.asarray(ohlcv['time'], dtype=np.int64)
+    if len(close) < 2:
+        raise BacktestError('Not enough candles to backtest')
+
+    positions = strategy_positions(close, strategy, param_sets)  # (sets, bars)
+    bar_returns = np.zeros_like(close)
+    bar_returns[1:] = close[1:] / close[:-1] - 1
+
+    # A position decided at bar t earns bar t+1's return
+    held = np.zeros_like(positions)
+    held[:, 1:] = positions[:, :-1]
+    turnover = np.abs(np.diff(positions, axis=1, prepend=0.0))
+    strategy_returns = held * bar_returns - turnover * commission_bps / 10000.0
+
+    equity = initial_cash * np.cumprod(1 + strategy_returns, axis=1)
+    peaks = np.maximum.accumulate(equity, axis=1)
+    drawdown = equity / peaks - 1
+
+    bars_per_year = _bars_per_year(times)
+    years = max(len(close) / bars_per_year, 1e-9)
+    total_return = equity[:, -1] / initial_cash - 1
+    volatility = strategy_returns.std(axis=1) * np.sqrt(bars_per_year)
+    mean_return = strategy_returns.mean(axis=1) * bars_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(volatility > 0, mean_return / volatility, 0.0)
+        annualized = np.sign(1 + total_return) * np.abs(1 + total_return) ** (1 / years) - 1
+
+    results = []
+    for i, params in enumerate(param_sets):
+        _, _, trade_returns = _round_trips(positions[i], close)
+        results.append({
+            'params': params,
+            'final_equity': round(float(equity[i, -1]), 2),
+            'total_return_percent': round(float(total_return[i]) * 100, 2),
+            'annualized_return_percent': round(float(annualized[i]) * 100, 2),
+            'annualized_volatility_percent': round(float(volatility[i]) * 100, 2),
+            'sharpe': round(float(sharpe[i]), 2),
+            'max_drawdown_percent': round(float(drawdown[i].min()) * 100, 2),
+            'exposure_percent': round(float(held[i].mean()) * 100, 2),
+            'trades': len(trade_returns),
+            'win_rate_percent': round(float((trade_returns > 0).mean()) * 100, 2) if len(trade_returns) else None,
+        })
+
+    best = int(np.argmax(total_return))
+    step = max(1, len(close) // max(1, curve_points))
+    sample = np.unique(np.append(np.arange(0, len(close), step), len(close) - 1))
+    return {
+        'strategy': strategy,
+        'candles': len(close),
+        'start': int(times[0]),
+        'end': int(times[-1]),
+        'initial_cash': initial_cash,
+        'commission_bps': commission_bps,
+        'benchmark_return_percent': round(float(close[-1] / close[0] - 1) * 100, 2),
+        'results': results,
+        'best': best,
+        'curve': {
+            'time': times[sample].tolist(),
+            'equity': np.round(equity[best, sample], 2).tolist(),
+            'drawdown_percent': np.round(drawdown[best, sample] * 100, 2).tolist(),
+        },
+        'fills': _trades(positions[best], close, times)[-100:],
+    }
+
+
+def _round_trips(position: np.ndarray, close: np.ndarray):
+    """Entry indices, exit indices and returns of each round trip in one position row"""
+    changes = np.diff(position, prepend=0.0)
+    entries = np.flatnonzero(changes > 0)
+    exits = np.flatnonzero(changes < 0)
+    if len(exits) < len(entries):
+        # Mark an open position to the last close
+        exits = np.append(exits, len(close) - 1)
+    return entries, exits, close[exits] / close[entries] - 1
+
+
+def _trades(position: np.ndarray, close: np.ndarray, times: np.ndarray) -> List[Dict[str, Any]]:
+    """Round trips for one position row; entries and exits fill at the signal bar's close"""
+    entries, exits, returns = _round_trips(position, close)
+    return [
+        {
+            'entry_time': int(times[e]), 'entry_price': round(float(close[e]), 2),
+            'exit_time': int(times[x]), 'exit_price': round(float(close[x]), 2),
+            'return_percent': round(float(r) * 100, 2),
+        }
+        for e, x, r in zip(entries.tolist(), exits.tolist(), returns.tolist())
+    ]
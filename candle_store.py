@@ -0,0 +1,175 @@
+"""
+Persistent on-disk store for historical candles.
+
+Each (symbol, resolution) series lives in its own append-only binary file
+of fixed-size little-endian records, sorted by time, next to a small JSON
+sidecar recording how far back the series is complete and when upstream
+was last asked for it. Reads memory-map the file and binary-search the
+requested range, so every worker and every restart shares one copy of the
+history instead of re-downloading it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+CANDLE_STORE_DIR = os.environ.get('CANDLE_STORE_DIR', os.path.join('instance', 'candles'))
+
+CANDLE_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8'),
+])
+
+
+def _empty_ohlcv() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=CANDLE_DTYPE[name]) for name in CANDLE_DTYPE.names}
+
+
+def _records_to_ohlcv(records: np.ndarray) -> Dict[str, np.ndarray]:
+    return {name: np.array(records[name]) for name in CANDLE_DTYPE.names}
+
+
+def _ohlcv_to_records(ohlcv: Dict[str, np.ndarray]) -> np.ndarray:
+    records = np.empty(len(ohlcv['time']), dtype=CANDLE_DTYPE)
+    for name in CANDLE_DTYPE.names:
+        records[name] = ohlcv[name]
+    return records
+
+
+class CandleStore:
+    """File-per-series candle store with incremental append and range reads"""
+
+    def __init__(self, root: str = CANDLE_STORE_DIR):
+        self.root = root
+
+    def _base_path(self, symbol: str, resolution: str) -> str:
+        safe = re.sub(r'[^A-Za-z0-9_-]', '_', symbol.upper())
+        digest = hashlib.sha1(symbol.upper().encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.root, f"{safe}-{digest}_{resolution}")
+
+    @contextmanager
+    def _locked(self, symbol: str, resolution: str):
+        """Exclusive lock across processes (gunicorn workers) for one series"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._base_path(symbol, resolution) + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, path: str) -> np.ndarray:
+        if not os.path.exists(path):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        count = os.path.getsize(path) // CANDLE_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        # Ignore a partially written trailing record, if any
+        return np.memmap(path, dtype=CANDLE_DTYPE, mode='r', shape=(count,))
+
+    def read(self, symbol: str, resolution: str, start: int = None, end: int = None) -> Dict[str, np.ndarray]:
+        """Return candles with start <= time <= end as parallel arrays"""
+        records = self._load(self._base_path(symbol, resolution) + '.bin')
+        if len(records) == 0:
+            return _empty_ohlcv()
+
+        times = records['time']
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(times, end, side='right'))
+        return _records_to_ohlcv(records[lo:hi])
+
+    def last_time(self, symbol: str, resolution: str) -> Optional[int]:
+        records = self._load(self._base_path(symbol, resolution) + '.bin')
+        return int(records['time'][-1]) if len(records) else None
+
+    def write(self, symbol: str, resolution: str, ohlcv: Dict[str, np.ndarray]) -> int:
+        """
+        Merge candles into the series and return how many records were added.
+
+        Candles newer than the stored tail are appended in place; a candle
+        sharing the tail's timestamp (e.g. today's still-forming bar)
+        overwrites it. Anything older triggers a full sorted rewrite.
+        """
+        incoming = _ohlcv_to_records(ohlcv)
+        if len(incoming) == 0:
+            return 0
+        incoming = incoming[np.argsort(incoming['time'], kind='stable')]
+        # Keep the last occurrence of any duplicated timestamp
+        _, last_idx = np.unique(incoming['time'][::-1], return_index=True)
+        incoming = incoming[len(incoming) - 1 - last_idx]
+
+        path = self._base_path(symbol, resolution) + '.bin'
+        with self._locked(symbol, resolution):
+            existing = self._load(path)
+            if len(existing) == 0:
+                self._replace(path, incoming)
+                return len(incoming)
+
+            tail = int(existing['time'][-1])
+            if incoming['time'][0] >= tail:
+                with open(path, 'r+b') as f:
+                    new_rows = incoming
+                    if incoming['time'][0] == tail:
+                        f.seek((len(existing) - 1) * CANDLE_DTYPE.itemsize)
+                        f.write(incoming[:1].tobytes())
+                        new_rows = incoming[1:]
+                    f.seek(len(existing) * CANDLE_DTYPE.itemsize)
+                    f.write(new_rows.tobytes())
+                return len(new_rows)
+
+            merged = np.concatenate([np.array(existing), incoming])
+            _, last_idx = np.unique(merged['time'][::-1], return_index=True)
+            merged = merged[len(merged) - 1 - last_idx]
+            added = len(merged) - len(existing)
+            self._replace(path, merged)
+            return added
+
+    def _replace(self, path: str, records: np.ndarray) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(records.tobytes())
+        os.replace(tmp_path, path)
+
+    def meta(self, symbol: str, resolution: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._base_path(symbol, resolution) + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update_meta(self, symbol: str, resolution: str, covered_from: int = None) -> Dict[str, Any]:
+        """Record a successful upstream check and widen the complete-history window"""
+        meta = self.meta(symbol, resolution) or {}
+        if covered_from is not None:
+            previous = meta.get('covered_from')
+            meta['covered_from'] = covered_from if previous is None else min(previous, covered_from)
+        meta['checked_at'] = int(time.time())
+
+        path = self._base_path(symbol, resolution) + '.json'
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(self.root, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+        return meta
+
+
+# Shared store instance
+candle_store = CandleStore()
@@ -0,0 +1,181 @@
+"""
+Candle format helpers shared by the market data endpoints.
+
+Candles travel through the app either as parallel NumPy arrays
+('time', 'open', 'high', 'low', 'close', 'volume') or as the list-of-dicts
+rows the simulator UI and chatbot have always used. The columnar wire
+format sends one array per field with a single time base, which is far
+smaller than repeating keys and three timestamps per candle.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+OHLCV_FIELDS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+# float32 keeps about 7 significant decimal digits
+FLOAT32_SIGNIFICANT_DIGITS = 7
+
+
+def iso_timestamps(times: np.ndarray) -> np.ndarray:
+    """Format unix seconds as local-time ISO strings, matching datetime.fromtimestamp().isoformat()"""
+    offset = datetime.now().astimezone().utcoffset()
+    offset_seconds = int(offset.total_seconds()) if offset else 0
+    local = (np.asarray(times, dtype=np.int64) + offset_seconds).astype('datetime64[s]')
+    return np.datetime_as_string(local, unit='s')
+
+
+def ohlcv_to_candles(ohlcv: Dict[str, np.ndarray], include_dates: bool = True, decimals: int = 2) -> List[Dict]:
+    """Convert parallel OHLCV arrays into the list-of-dicts candle format used by the API"""
+    times = np.asarray(ohlcv['time'], dtype=np.int64).tolist()
+    opens = np.round(ohlcv['open'], decimals).tolist()
+    highs = np.round(ohlcv['high'], decimals).tolist()
+    lows = np.round(ohlcv['low'], decimals).tolist()
+    closes = np.round(ohlcv['close'], decimals).tolist()
+    volumes = np.asarray(ohlcv['volume'], dtype=np.int64).tolist()
+
+    if not include_dates:
+        return [
+            {'time': t, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+            for t, o, h, l, c, v in zip(times, opens, highs, lows, closes, volumes)
+        ]
+
+    dates = iso_timestamps(ohlcv['time']).tolist()
+    return [
+        {'time': t, 'timestamp': t, 'date': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for t, d, o, h, l, c, v in zip(times, dates, opens, highs, lows, closes, volumes)
+    ]
+
+
+def candles_to_ohlcv(candles: List[Dict]) -> Dict[str, np.ndarray]:
+    """Convert list-of-dicts candles into parallel OHLCV arrays"""
+    return {
+        'time': np.fromiter((c['time'] for c in candles), dtype=np.int64, count=len(candles)),
+        'open': np.fromiter((c['open'] for c in candles), dtype=np.float64, count=len(candles)),
+        'high': np.fromiter((c['high'] for c in candles), dtype=np.float64, count=len(candles)),
+        'low': np.fromiter((c['low'] for c in candles), dtype=np.float64, count=len(candles)),
+        'close': np.fromiter((c['close'] for c in candles), dtype=np.float64, count=len(candles)),
+        'volume': np.fromiter((c.get('volume', 0) for c in candles), dtype=np.int64, count=len(candles)),
+    }
+
+
+def _round_significant(values: np.ndarray, digits: int) -> np.ndarray:
+    """Round each value to the given number of significant digits"""
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.floor(np.log10(np.abs(np.where(values == 0, 1, values))))
+    shift = (digits - 1 - magnitude).astype(np.int64)
+    out = values.copy()
+
+    # Scale by exact powers of ten so results land on the nearest double
+    up = shift >= 0
+    scale = 10.0 ** shift[up]
+    out[up] = np.round(values[up] * scale) / scale
+    down = ~up
+    step = 10.0 ** (-shift[down])
+    out[down] = np.round(values[down] / step) * step
+    return out
+
+
+def to_columnar(ohlcv: Dict[str, np.ndarray], float32: bool = False, decimals: int = 2) -> Dict[str, Any]:
+    """
+    Encode OHLCV arrays in the compact columnar wire format.
+
+    Times are sent once as a base: 't0' plus a fixed 'interval' when the
+    candles are evenly spaced, otherwise 't0' plus per-candle second offsets
+    in 't'. Prices go in the 'o', 'h', 'l', 'c' arrays and volumes in 'v'.
+    With float32=True prices are rounded to float32 precision (about 7
+    significant digits) instead of to a fixed number of decimals.
+    """
+    times = np.asarray(ohlcv['time'], dtype=np.int64)
+    count = len(times)
+    t0 = int(times[0]) if count else 0
+
+    result = {
+        'format': 'columnar',
+        'count': count,
+        'precision': 'float32' if float32 else 'float64',
+        't0': t0,
+    }
+
+    offsets = times - t0
+    steps = np.diff(offsets)
+    if count > 1 and np.all(steps == steps[0]):
+        result['interval'] = int(steps[0])
+    else:
+        result['t'] = offsets.tolist()
+
+    for key, field in (('o', 'open'), ('h', 'high'), ('l', 'low'), ('c', 'close')):
+        values = np.asarray(ohlcv[field], dtype=np.float64)
+        if float32:
+            values = _round_significant(values, FLOAT32_SIGNIFICANT_DIGITS)
+        else:
+            values = np.round(values, decimals)
+        result[key] = values.tolist()
+
+    result['v'] = np.asarray(ohlcv['volume'], dtype=np.int64).tolist()
+    return result
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Pick max_points indices with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    selected point and the average of the next bucket.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_lttb(ohlcv: Dict[str, np.ndarray], max_points: int) -> Dict[str, np.ndarray]:
+    """Keep the max_points candles that best preserve the shape of the close series"""
+    idx = lttb_indices(ohlcv['time'], ohlcv['close'], max_points)
+    return {field: np.asarray(ohlcv[field])[idx] for field in OHLCV_FIELDS}
+
+
+def downsample_ohlc(ohlcv: Dict[str, np.ndarray], max_points: int) -> Dict[str, np.ndarray]:
+    """
+    Merge consecutive candles into at most max_points buckets. Each bucket
+    keeps the first open and time, the last close, the extreme high and low
+    and the summed volume, so wicks and gaps survive downsampling.
+    """
+    n = len(ohlcv['time'])
+    if max_points >= n or max_points < 1:
+        return ohlcv
+
+    starts = np.unique(np.linspace(0, n, max_points, endpoint=False).astype(np.int64))
+    ends = np.append(starts[1:], n) - 1
+    return {
+        'time': np.asarray(ohlcv['time'])[starts],
+        'open': np.asarray(ohlcv['open'])[starts],
+        'high': np.maximum.reduceat(np.asarray(ohlcv['high']), starts),
+        'low': np.minimum.reduceat(np.asarray(ohlcv['low']), starts),
+        'close': np.asarray(ohlcv['close'])[ends],
+        'volume': np.add.reduceat(np.asarray(ohlcv['volume']), starts),
+    }
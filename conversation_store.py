@@ -0,0 +1,227 @@
+"""
+Server-side chatbot conversations keyed by session.
+
+The cookie session only carries a conversation id; the turns themselves
+live in a small SQLite database under instance/, shared by every gunicorn
+worker. Each conversation keeps its recent turns verbatim plus a rolling
+summary of everything older. When the verbatim turns exceed the token
+budget, the oldest are folded into the summary (by the summarizer the app
+supplies, or by truncation when it fails), so both the stored history and
+the prompt built from it stay bounded however long the chat runs.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+CONVERSATION_DB = os.environ.get('CONVERSATION_DB', os.path.join('instance', 'conversations.db'))
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get('CONVERSATION_TOKEN_BUDGET', 1500))  # verbatim turns in the prompt
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get('CONVERSATION_SUMMARY_TOKENS', 300))
+CONVERSATION_KEEP_TURNS = 2  # most recent exchanges never folded into the summary
+CONVERSATION_TTL = int(os.environ.get('CONVERSATION_TTL', 7 * 24 * 3600))  # idle conversations are dropped
+PRUNE_EVERY = 200  # turns recorded between sweeps for idle conversations
+CHARS_PER_TOKEN = 4  # rough estimate for English text; no tokenizer needed to bound a budget
+
+Summarizer = Callable[[str, str], Optional[str]]  # (previous summary, transcript) -> new summary
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """The tail of text within a token budget, cut at a word boundary"""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    tail = text[-limit:]
+    return '...' + tail[tail.find(' ') + 1:] if ' ' in tail else tail
+
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    return ''.join(f"{'User' if role == 'user' else 'Assistant'}: {content}\n" for role, content in turns)
+
+
+class ConversationStore:
+    """SQLite-backed conversation turns with token-budgeted compaction into a rolling summary"""
+
+    def __init__(self, path: str = CONVERSATION_DB, token_budget: int = CONVERSATION_TOKEN_BUDGET,
+                 summary_tokens: int = CONVERSATION_SUMMARY_TOKENS, summarizer: Optional[Summarizer] = None):
+        self.path = path
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conversation-compact')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._recorded = 0
+        self.compactions = 0
+        self.summarizer_failures = 0
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets the other worker read while this one writes"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        with self._conn() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS turns (
+                turn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS turns_by_conversation ON turns (conversation_id, turn_id)')
+
+    def record(self, conversation_id: str, query: str, response: str) -> None:
+        """Append one exchange and schedule compaction if the verbatim turns are over budget"""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute('INSERT INTO conversations (conversation_id, updated_at) VALUES (?, ?) '
+                         'ON CONFLICT(conversation_id) DO UPDATE SET updated_at = excluded.updated_at',
+                         (conversation_id, now))
+            conn.executemany('INSERT INTO turns (conversation_id, role, content, tokens) VALUES (?, ?, ?, ?)',
+                             [(conversation_id, 'user', query, estimate_tokens(query)),
+                              (conversation_id, 'assistant', response, estimate_tokens(response))])
+            total = conn.execute('SELECT COALESCE(SUM(tokens), 0) FROM turns WHERE conversation_id = ?',
+                                 (conversation_id,)).fetchone()[0]
+        with self._lock:
+            self._recorded += 1
+            prune = self._recorded % PRUNE_EVERY == 0
+            compact = total > self.token_budget and conversation_id not in self._pending
+            if compact:
+                self._pending.add(conversation_id)
+        if compact:
+            # The summarizer is a model call; keep it off the request thread
+            self._pool.submit(self._compact_safely, conversation_id)
+        if prune:
+            self.prune(now)
+
+    def history(self, conversation_id: Optional[str]) -> str:
+        """Prompt context: the rolling summary, then the newest turns that fit the token budget"""
+        if not conversation_id:
+            return ""
+        conn = self._conn()
+        row = conn.execute('SELECT summary FROM conversations WHERE conversation_id = ?',
+                           (conversation_id,)).fetchone()
+        if row is None:
+            return ""
+        turns = []
+        used = 0
+        # Newest first, so a compaction still in flight cannot push the prompt over budget
+        for role, content, tokens in conn.execute(
+                'SELECT role, content, tokens FROM turns WHERE conversation_id = ? ORDER BY turn_id DESC',
+                (conversation_id,)):
+            if used + tokens > self.token_budget and turns:
+                break
+            turns.append((role, truncate_to_tokens(content, self.token_budget)))
+            used += tokens
+        turns.reverse()
+        context = f"Summary of the earlier conversation: {row[0]}\n" if row[0] else ""
+        return context + format_turns(turns)
+
+    def compact(self, conversation_id: str) -> bool:
+        """Fold the oldest turns into the summary until the rest fit the budget; True if anything was folded"""
+        conn = self._conn()
+        row = conn.execute('SELECT summary, version FROM conversations WHERE conversation_id = ?',
+                           (conversation_id,)).fetchone()
+        if row is None:
+            return False
+        summary, version = row
+        turns = conn.execute('SELECT turn_id, role, content, tokens FROM turns WHERE conversation_id = ? '
+                             'ORDER BY turn_id', (conversation_id,)).fetchall()
+        keep = 2 * CONVERSATION_KEEP_TURNS
+        total = sum(t[3] for t in turns)
+        folded = []
+        for turn in turns[:max(0, len(turns) - keep)]:
+            if total <= self.token_budget:
+                break
+            folded.append(turn)
+            total -= turn[3]
+        # Fold whole exchanges so the kept history never opens with an orphaned answer
+        if folded and folded[-1][1] == 'user' and len(folded) < len(turns) - keep:
+            folded.append(turns[len(folded)])
+        if not folded:
+            return False
+
+        transcript = format_turns([(role, content) for _, role, content, _ in folded])
+        new_summary = None
+        if self.summarizer is not None:
+            try:
+                new_summary = self.summarizer(summary, transcript)
+            except Exception as e:
+                print(f"Conversation summarizer error: {e}")
+            if not new_summary:
+                self.summarizer_failures += 1
+        if not new_summary:
+            new_summary = f"{summary}\n{transcript}" if summary else transcript
+        new_summary = truncate_to_tokens(new_summary.strip(), self.summary_tokens)
+
+        with conn:
+            # Another worker may have compacted meanwhile; only the first writer wins
+            updated = conn.execute('UPDATE conversations SET summary = ?, version = version + 1 '
+                                   'WHERE conversation_id = ? AND version = ?',
+                                   (new_summary, conversation_id, version)).rowcount
+            if not updated:
+                return False
+            conn.execute('DELETE FROM turns WHERE conversation_id = ? AND turn_id <= ?',
+                         (conversation_id, folded[-1][0]))
+        self.compactions += 1
+        return True
+
+    def _compact_safely(self, conversation_id: str) -> None:
+        try:
+            self.compact(conversation_id)
+        except Exception as e:
+            print(f"Conversation compaction error: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(conversation_id)
+
+    def clear(self, conversation_id: str) -> None:
+        with self._conn() as conn:
+            conn.execute('DELETE FROM turns WHERE conversation_id = ?', (conversation_id,))
+            conn.execute('DELETE FROM conversations WHERE conversation_id = ?', (conversation_id,))
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drop conversations idle longer than the TTL; returns how many were removed"""
+        cutoff = (now or time.time()) - CONVERSATION_TTL
+        with self._conn() as conn:
+            conn.execute('DELETE FROM turns WHERE conversation_id IN '
+                         '(SELECT conversation_id FROM conversations WHERE updated_at < ?)', (cutoff,))
+            return conn.execute('DELETE FROM conversations WHERE updated_at < ?', (cutoff,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        conversations = conn.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+        turns, tokens = conn.execute('SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM turns').fetchone()
+        return {
+            'conversations': conversations,
+            'turns': turns,
+            'stored_tokens': tokens,
+            'token_budget': self.token_budget,
+            'summary_tokens': self.summary_tokens,
+            'compactions': self.compactions,
+            'pending_compactions': len(self._pending),
+            'summarizer_failures': self.summarizer_failures,
+        }
+
+
+# Global instance; the app installs its model-backed summarizer
+conversation_store = ConversationStore()
@@ -0,0 +1,495 @@
+"""
+Technical indicators over candle series, in two modes.
+
+Batch mode computes an indicator over a whole OHLCV history with array
+operations (rolling sums via cumsum, EMA/Wilder recursions via lfilter).
+Incremental mode keeps a small state per indicator and updates it in O(1)
+per candle, and can also preview the value for a still-forming candle
+without committing it. Both modes produce the same numbers for the same
+candles.
+
+Indicators are named by spec strings such as 'sma:20', 'ema:50', 'rsi:14',
+'macd:12:26:9', 'bollinger:20:2', 'atr:14' and 'vwap'.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.signal import lfilter
+
+from market_data_fallback import market_data_generator
+
+INDICATOR_DEFAULTS = {
+    'sma': (20,),
+    'ema': (20,),
+    'rsi': (14,),
+    'macd': (12, 26, 9),
+    'bollinger': (20, 2),
+    'atr': (14,),
+    'vwap': (),
+}
+DEFAULT_INDICATORS = 'sma:20,ema:20,rsi:14,macd:12:26:9,bollinger:20:2,atr:14,vwap'
+MAX_INDICATORS = 12
+MAX_INDICATOR_WINDOW = 1000
+SESSION_UTC_OFFSET = 19800  # VWAP resets at midnight IST
+MAX_TRACKED_SYMBOLS = 500
+
+
+# Spec parsing
+
+def parse_indicator_specs(specs: str) -> List[Tuple[str, str, Tuple[float, ...]]]:
+    """
+    Parse 'sma:20,rsi,macd:12:26:9' into (key, name, params) tuples.
+    Missing params take the defaults; raises ValueError on anything invalid.
+    """
+    parsed = []
+    for raw in (s.strip().lower() for s in specs.split(',')):
+        if not raw:
+            continue
+        name, *args = raw.split(':')
+        if name not in INDICATOR_DEFAULTS:
+            raise ValueError(f"Unknown indicator '{name}'; use one of {', '.join(INDICATOR_DEFAULTS)}")
+        defaults = INDICATOR_DEFAULTS[name]
+        if len(args) > len(defaults):
+            raise ValueError(f"Too many parameters for {name}")
+        try:
+            params = tuple(float(a) for a in args) + defaults[len(args):]
+        except ValueError:
+            raise ValueError(f"Parameters for {name} must be numbers")
+        windows = params if name != 'bollinger' else params[:1]
+        if any(not 1 <= w <= MAX_INDICATOR_WINDOW or w != int(w) for w in windows):
+            raise ValueError(f"{name} windows must be whole numbers between 1 and {MAX_INDICATOR_WINDOW}")
+        if name == 'macd' and not params[0] < params[1]:
+            raise ValueError('macd needs fast < slow')
+        key = '_'.join([name] + [f"{p:g}" for p in params])
+        parsed.append((key, name, params))
+    if len(parsed) > MAX_INDICATORS:
+        raise ValueError(f"At most {MAX_INDICATORS} indicators per request")
+    return parsed
+
+
+# Batch mode
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def ema(values: np.ndarray, span: int, alpha: float = None) -> np.ndarray:
+    """EMA seeded with the SMA of the first span values; alpha defaults to 2 / (span + 1)"""
+    values = np.asarray(values, dtype=np.float64)
+    alpha = 2.0 / (span + 1) if alpha is None else alpha
+    out = np.full(len(values), np.nan)
+    if span > len(values):
+        return out
+    seed = values[:span].mean()
+    out[span - 1] = seed
+    if span < len(values):
+        out[span:], _ = lfilter([alpha], [1, alpha - 1], values[span:], zi=[seed * (1 - alpha)])
+    return out
+
+
+def wilder(values: np.ndarray, period: int) -> np.ndarray:
+    """Wilder's smoothing, an EMA with alpha = 1 / period"""
+    return ema(values, period, alpha=1.0 / period)
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return out
+    delta = np.diff(close)
+    avg_gain = wilder(np.clip(delta, 0, None), period)[period - 1:]
+    avg_loss = wilder(np.clip(-delta, 0, None), period)[period - 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[period:] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    return out
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(len(line), np.nan)
+    start = slow - 1
+    if start < len(line):
+        signal_line[start:] = ema(line[start:], signal)
+    return {'macd': line, 'signal': signal_line, 'histogram': line - signal_line}
+
+
+def bollinger(close: np.ndarray, window: int = 20, width: float = 2.0) -> Dict[str, np.ndarray]:
+    close = np.asarray(close, dtype=np.float64)
+    middle = sma(close, window)
+    # Shift by the first close so the sum of squares stays well conditioned
+    shifted = close - (close[0] if len(close) else 0.0)
+    variance = np.clip(sma(shifted ** 2, window) - sma(shifted, window) ** 2, 0, None)
+    deviation = np.sqrt(variance)
+    return {'middle': middle, 'upper': middle + width * deviation, 'lower': middle - width * deviation}
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    prev_close = np.concatenate(([close[0]], close[:-1])) if len(close) else close
+    return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    return wilder(true_range(high, low, close), period)
+
+
+def vwap(ohlcv: Dict[str, np.ndarray]) -> np.ndarray:
+    """Session VWAP of the typical price, restarting each trading day"""
+    typical = (np.asarray(ohlcv['high']) + np.asarray(ohlcv['low']) + np.asarray(ohlcv['close'])) / 3
+    volume = np.asarray(ohlcv['volume'], dtype=np.float64)
+    n = len(typical)
+    if n == 0:
+        return np.empty(0)
+    day = (np.asarray(ohlcv['time'], dtype=np.int64) + SESSION_UTC_OFFSET) // 86400
+    cum_pv = np.cumsum(typical * volume)
+    cum_v = np.cumsum(volume)
+    # Subtract everything before each bar's session start
+    starts = np.flatnonzero(np.diff(day, prepend=day[0] - 1))
+    session_start = np.zeros(n, dtype=np.int64)
+    session_start[starts] = starts
+    np.maximum.accumulate(session_start, out=session_start)
+    before = session_start - 1
+    base_pv = np.where(before >= 0, cum_pv[np.maximum(before, 0)], 0.0)
+    base_v = np.where(before >= 0, cum_v[np.maximum(before, 0)], 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cum_v - base_v > 0, (cum_pv - base_pv) / (cum_v - base_v), typical)
+
+
+def compute_indicators(ohlcv: Dict[str, np.ndarray], specs: str = DEFAULT_INDICATORS) -> Dict[str, Any]:
+    """Compute every indicator in specs over the full series; values align with the candles"""
+    close = ohlcv['close']
+    results = {}
+    for key, name, params in parse_indicator_specs(specs):
+        p = [int(x) for x in params] if name != 'bollinger' else [int(params[0]), params[1]]
+        if name == 'sma':
+            results[key] = sma(close, *p)
+        elif name == 'ema':
+            results[key] = ema(close, *p)
+        elif name == 'rsi':
+            results[key] = rsi(close, *p)
+        elif name == 'macd':
+            results[key] = macd(close, *p)
+        elif name == 'bollinger':
+            results[key] = bollinger(close, *p)
+        elif name == 'atr':
+            results[key] = atr(ohlcv['high'], ohlcv['low'], close, *p)
+        elif name == 'vwap':
+            results[key] = vwap(ohlcv)
+    return results
+
+
+def select_indicators(indicators: Dict[str, Any], indices: np.ndarray) -> Dict[str, Any]:
+    """Pick the given candle positions from every indicator series (e.g. after downsampling)"""
+    return {
+        key: ({k: v[indices] for k, v in value.items()} if isinstance(value, dict) else value[indices])
+        for key, value in indicators.items()
+    }
+
+
+def indicators_to_json(indicators: Dict[str, Any], decimals: int = 2) -> Dict[str, Any]:
+    """Round indicator series and turn warm-up NaNs into nulls"""
+    def series(values):
+        rounded = np.round(values, decimals)
+        return [None if v != v else v for v in rounded.tolist()]
+
+    return {
+        key: ({k: series(v) for k, v in value.items()} if isinstance(value, dict) else series(value))
+        for key, value in indicators.items()
+    }
+
+
+# Incremental mode
+#
+# Each state's update(value, commit=True) returns the indicator after one
+# more candle. With commit=False the candle is treated as still forming:
+# the value is returned but the state is left untouched.
+
+class SMAState:
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def update(self, x: float, commit: bool = True) -> Optional[float]:
+        full = len(self.values) == self.window
+        total = self.total + x - (self.values[0] if full else 0.0)
+        count = len(self.values) + (0 if full else 1)
+        if commit:
+            self.values.append(x)
+            self.total = total
+            if len(self.values) > self.window:
+                self.values.popleft()
+        return total / self.window if count == self.window else None
+
+
+class EMAState:
+    def __init__(self, span: int, alpha: float = None):
+        self.span = span
+        self.alpha = 2.0 / (span + 1) if alpha is None else alpha
+        self.count = 0
+        self.seed_total = 0.0
+        self.value = None
+
+    def update(self, x: float, commit: bool = True) -> Optional[float]:
+        if self.value is not None:
+            value = self.value + self.alpha * (x - self.value)
+        elif self.count + 1 == self.span:
+            value = (self.seed_total + x) / self.span
+        else:
+            value = None
+        if commit:
+            self.count += 1
+            self.seed_total += x
+            self.value = value
+        return value
+
+
+class WilderState(EMAState):
+    def __init__(self, period: int):
+        super().__init__(period, alpha=1.0 / period)
+
+
+class RSIState:
+    def __init__(self, period: int = 14):
+        self.prev_close = None
+        self.gains = WilderState(period)
+        self.losses = WilderState(period)
+
+    def update(self, close: float, commit: bool = True) -> Optional[float]:
+        if self.prev_close is None:
+            if commit:
+                self.prev_close = close
+            return None
+        delta = close - self.prev_close
+        gain = self.gains.update(max(delta, 0.0), commit)
+        loss = self.losses.update(max(-delta, 0.0), commit)
+        if commit:
+            self.prev_close = close
+        if gain is None:
+            return None
+        return 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+
+
+class MACDState:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMAState(fast)
+        self.slow = EMAState(slow)
+        self.signal = EMAState(signal)
+
+    def update(self, close: float, commit: bool = True) -> Dict[str, Optional[float]]:
+        fast = self.fast.update(close, commit)
+        slow = self.slow.update(close, commit)
+        line = fast - slow if fast is not None and slow is not None else None
+        signal = self.signal.update(line, commit) if line is not None else None
+        return {
+            'macd': line,
+            'signal': signal,
+            'histogram': line - signal if signal is not None else None,
+        }
+
+
+class BollingerState:
+    def __init__(self, window: int = 20, width: float = 2.0):
+        self.width = width
+        self.mean = SMAState(window)
+        self.squares = SMAState(window)
+        self.origin = None
+
+    def update(self, close: float, commit: bool = True) -> Dict[str, Optional[float]]:
+        origin = close if self.origin is None else self.origin
+        if commit:
+            self.origin = origin
+        shifted = close - origin
+        mean = self.mean.update(shifted, commit)
+        mean_square = self.squares.update(shifted * shifted, commit)
+        if mean is None:
+            return {'middle': None, 'upper': None, 'lower': None}
+        deviation = max(mean_square - mean * mean, 0.0) ** 0.5
+        middle = mean + origin
+        return {'middle': middle, 'upper': middle + self.width * deviation, 'lower': middle - self.width * deviation}
+
+
+class ATRState:
+    def __init__(self, period: int = 14):
+        self.prev_close = None
+        self.smoothed = WilderState(period)
+
+    def update(self, high: float, low: float, close: float, commit: bool = True) -> Optional[float]:
+        prev = close if self.prev_close is None else self.prev_close
+        tr = max(high - low, abs(high - prev), abs(low - prev))
+        if commit:
+            self.prev_close = close
+        return self.smoothed.update(tr, commit)
+
+
+class VWAPState:
+    def __init__(self):
+        self.day = None
+        self.pv = 0.0
+        self.volume = 0.0
+
+    def update(self, time_: int, high: float, low: float, close: float, volume: float,
+               commit: bool = True) -> float:
+        day = (int(time_) + SESSION_UTC_OFFSET) // 86400
+        typical = (high + low + close) / 3
+        pv, vol = (self.pv, self.volume) if day == self.day else (0.0, 0.0)
+        pv += typical * volume
+        vol += volume
+        if commit:
+            self.day, self.pv, self.volume = day, pv, vol
+        return pv / vol if vol > 0 else typical
+
+
+class IndicatorSet:
+    """Incremental state for a list of indicator specs over one candle stream"""
+
+    def __init__(self, specs: str = DEFAULT_INDICATORS):
+        self.states = {}
+        for key, name, params in parse_indicator_specs(specs):
+            if name == 'sma':
+                self.states[key] = SMAState(int(params[0]))
+            elif name == 'ema':
+                self.states[key] = EMAState(int(params[0]))
+            elif name == 'rsi':
+                self.states[key] = RSIState(int(params[0]))
+            elif name == 'macd':
+                self.states[key] = MACDState(*(int(p) for p in params))
+            elif name == 'bollinger':
+                self.states[key] = BollingerState(int(params[0]), params[1])
+            elif name == 'atr':
+                self.states[key] = ATRState(int(params[0]))
+            elif name == 'vwap':
+                self.states[key] = VWAPState()
+
+    def update(self, candle: Dict[str, float], commit: bool = True) -> Dict[str, Any]:
+        """Feed one candle (time, open, high, low, close, volume) and return the latest values"""
+        values = {}
+        for key, state in self.states.items():
+            if isinstance(state, ATRState):
+                values[key] = state.update(candle['high'], candle['low'], candle['close'], commit)
+            elif isinstance(state, VWAPState):
+                values[key] = state.update(candle['time'], candle['high'], candle['low'], candle['close'],
+                                           candle.get('volume', 0), commit)
+            else:
+                values[key] = state.update(candle['close'], commit)
+        return values
+
+
+class IndicatorTracker:
+    """
+    Live per-symbol indicators fed by quotes.
+
+    A symbol is tracked once someone asks for its indicators: its recent
+    history warms the state up, then each quote MarketDataGenerator serves
+    updates the forming bar and previews the indicators in O(1). When a
+    quote lands in a new bar, the previous bar is committed.
+    """
+
+    def __init__(self, load_history: Callable[[str, str], Dict[str, np.ndarray]],
+                 specs: str = DEFAULT_INDICATORS, max_symbols: int = MAX_TRACKED_SYMBOLS):
+        self.load_history = load_history
+        self.specs = specs
+        self.max_symbols = max_symbols
+        self._symbols = OrderedDict()  # symbol -> tracking state
+        self._lock = threading.Lock()
+
+    def track(self, symbol: str) -> Dict[str, Any]:
+        """Start tracking a symbol (warming up from history) and return its latest values"""
+        key = symbol.strip().upper()
+        with self._lock:
+            entry = self._symbols.get(key)
+            if entry is not None:
+                self._symbols.move_to_end(key)
+                return self._snapshot(key, entry)
+
+        history = self.load_history(key, '1d')
+        times = np.asarray(history['time'], dtype=np.int64)
+        bar_seconds = int(np.median(np.diff(times))) if len(times) > 1 else 300
+        indicator_set = IndicatorSet(self.specs)
+        bar = None
+        for i in range(len(times)):
+            if bar is not None:
+                indicator_set.update(bar)
+            bar = {field: history[field][i].item() for field in ('time', 'open', 'high', 'low', 'close', 'volume')}
+        entry = {
+            'set': indicator_set,
+            'bar_seconds': max(bar_seconds, 1),
+            'bar': bar,
+            'values': indicator_set.update(bar, commit=False) if bar else {},
+            'day_volume': None,
+        }
+        with self._lock:
+            entry = self._symbols.setdefault(key, entry)
+            while len(self._symbols) > self.max_symbols:
+                self._symbols.popitem(last=False)
+            return self._snapshot(key, entry)
+
+    def on_quote(self, symbol: str, quote: Dict[str, Any]) -> None:
+        """Quote listener: fold the quote into the symbol's forming bar"""
+        key = symbol.strip().upper()
+        try:
+            price = float(quote.get('price') or quote.get('current_price') or 0)
+        except (TypeError, ValueError):
+            return
+        if price <= 0:
+            return
+        with self._lock:
+            entry = self._symbols.get(key)
+            if entry is None:
+                return
+            now = int(time.time())
+            bucket = now - now % entry['bar_seconds']
+
+            # Quotes carry the day's cumulative volume; the bar gets the increase
+            day_volume = quote.get('volume')
+            added = 0
+            if isinstance(day_volume, (int, float)) and entry['day_volume'] is not None:
+                added = max(0, day_volume - entry['day_volume'])
+            if isinstance(day_volume, (int, float)):
+                entry['day_volume'] = day_volume
+
+            bar = entry['bar']
+            if bar is None or bucket > bar['time']:
+                if bar is not None:
+                    entry['set'].update(bar)
+                bar = {'time': bucket, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': added}
+            else:
+                bar['high'] = max(bar['high'], price)
+                bar['low'] = min(bar['low'], price)
+                bar['close'] = price
+                bar['volume'] += added
+            entry['bar'] = bar
+            entry['values'] = entry['set'].update(bar, commit=False)
+
+    def _snapshot(self, key: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'symbol': key,
+            'bar_seconds': entry['bar_seconds'],
+            'bar': dict(entry['bar']) if entry['bar'] else None,
+            'values': {k: _round_values(v) for k, v in entry['values'].items()},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'tracked_symbols': len(self._symbols)}
+
+
+def _round_values(value):
+    if isinstance(value, dict):
+        return {k: _round_values(v) for k, v in value.items()}
+    return None if value is None else round(value, 4)
+
+
+# Global instance; every quote MarketDataGenerator serves updates tracked symbols
+indicator_tracker = IndicatorTracker(market_data_generator.generate_historical_ohlcv)
+market_data_generator.add_quote_listener(indicator_tracker.on_quote)
@@ -0,0 +1,292 @@
+"""
+Local intent and slot classifier in front of the orchestrator LLM.
+
+Most chat questions ("What is compound interest?") need no market data, yet
+asking gemini whether they do costs a full model round trip before the
+answer can even start. The classifier decides locally when it can:
+
+1. Keyword rules catch the unambiguous cases: conceptual questions with no
+   live-data wording, named market listings (IPOs, trending, most active,
+   news), and a price or history request for a stock the symbol master
+   finds in the text.
+2. A TF-IDF + logistic regression model, trained on the orchestrator's own
+   examples plus every decision the LLM orchestrator has logged, handles
+   the rest when its probability clears INTENT_CONFIDENCE.
+
+Anything else returns None and goes to the LLM orchestrator, whose decision
+is logged and folded into the next retrain.
+
+Decisions use the orchestrator's format: {"needs_api", "function", "params"}.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from symbols import symbol_index
+
+INTENT_CONFIDENCE = float(os.environ.get('INTENT_CONFIDENCE', 0.75))
+INTENT_DRAFT_LEAN = float(os.environ.get('INTENT_DRAFT_LEAN', 0.5))  # no-API probability worth drafting an answer for
+INTENT_LOG_FILE = os.environ.get('INTENT_LOG_FILE', 'data/orchestrator_decisions.jsonl')
+INTENT_RETRAIN_EVERY = 25  # logged decisions between retrains
+MAX_LOGGED_DECISIONS = 5000  # most recent logged decisions used for training
+
+NO_API = 'none'
+FUNCTIONS = ('get_stock_details', 'get_trending_stocks', 'get_market_news', 'get_mutual_funds',
+             'get_ipo_data', 'get_bse_most_active', 'get_nse_most_active', 'get_historical_data')
+STOCK_FUNCTIONS = ('get_stock_details', 'get_historical_data')
+
+# The orchestrator prompt's examples, widened to cover every function
+SEED_EXAMPLES = [
+    ("Show me the most active stocks on NSE today", 'get_nse_most_active'),
+    ("Which shares are most traded on NSE right now?", 'get_nse_most_active'),
+    ("Most active stocks on BSE", 'get_bse_most_active'),
+    ("Which BSE stocks have the highest volume today?", 'get_bse_most_active'),
+    ("What is the current price of Reliance?", 'get_stock_details'),
+    ("How is TCS trading today?", 'get_stock_details'),
+    ("Give me the share price of Infosys", 'get_stock_details'),
+    ("What's HDFC Bank's stock price now?", 'get_stock_details'),
+    ("Show me Tata Motors price history for the last year", 'get_historical_data'),
+    ("How has Wipro performed over the past month?", 'get_historical_data'),
+    ("Show the chart of ITC for 6 months", 'get_historical_data'),
+    ("Tell me about trending stocks", 'get_trending_stocks'),
+    ("Which stocks are trending today?", 'get_trending_stocks'),
+    ("What are today's top gainers and losers?", 'get_trending_stocks'),
+    ("What are the latest IPOs?", 'get_ipo_data'),
+    ("Any upcoming IPOs this week?", 'get_ipo_data'),
+    ("Which IPOs are open for subscription now?", 'get_ipo_data'),
+    ("What is the latest stock market news?", 'get_market_news'),
+    ("Show me today's market headlines", 'get_market_news'),
+    ("What happened in the market today?", 'get_market_news'),
+    ("Show me the top performing mutual funds", 'get_mutual_funds'),
+    ("List the best mutual funds right now", 'get_mutual_funds'),
+    ("What are the current NAVs of equity mutual funds?", 'get_mutual_funds'),
+    ("What is compound interest?", NO_API),
+    ("How should I start investing?", NO_API),
+    ("What are the tax benefits of PPF?", NO_API),
+    ("Explain mutual funds to me", NO_API),
+    ("What is an IPO?", NO_API),
+    ("How does the stock market work?", NO_API),
+    ("What is the difference between NSE and BSE?", NO_API),
+    ("Should I invest in FDs or debt funds?", NO_API),
+    ("What is a SIP and how does it work?", NO_API),
+    ("How can I save tax under section 80C?", NO_API),
+    ("What is diversification?", NO_API),
+    ("Explain the P/E ratio", NO_API),
+    ("How do I open a demat account?", NO_API),
+    ("What are index funds?", NO_API),
+    ("Why do stock prices go up and down?", NO_API),
+    ("How much should I save for retirement?", NO_API),
+    ("What is the rule of 72?", NO_API),
+    ("Tips for building an emergency fund", NO_API),
+    ("Is gold a good investment?", NO_API),
+]
+
+_CONCEPT = re.compile(r"^\s*(what\s+(is|are|does|do)|what's|explain|define|how\s+(do|does|can|should|to|much|is)|"
+                      r"why|difference\s+between|meaning\s+of|tips|should\s+i|is\s+it|can\s+you\s+explain)\b")
+# Wording that asks for data as of now; a conceptual question without it needs no API
+_FRESH = re.compile(r"\b(latest|current(ly)?|today('s)?|now|live|recent(ly)?|upcoming|this\s+(week|month)|"
+                    r"right\s+now|at\s+the\s+moment|headlines|top|best|show|list|price|trending|most\s+active)\b")
+_PRICE = re.compile(r"\b(price|prices|quote|trading|trade|worth|cost|ltp|market\s+cap|doing|performing|"
+                    r"up|down|today|now|current(ly)?|live|share|stock)\b")
+_HISTORY = re.compile(r"\b(history|historical|chart|past|over\s+the\s+last|last\s+\d*\s*(day|week|month|year)s?|"
+                      r"since|(\d+|one|six|three)\s+(day|week|month|year)s?|performed)\b")
+
+# (pattern, function, needs fresh-data wording)
+_FUNCTION_RULES = [
+    (re.compile(r"\bmost\s+(active|traded)\b.*\bbse\b|\bbse\b.*\bmost\s+(active|traded)\b"), 'get_bse_most_active', False),
+    (re.compile(r"\bmost\s+(active|traded)\b"), 'get_nse_most_active', False),
+    (re.compile(r"\btrending\b|\btop\s+(gainers|losers)\b|\bgainers\b|\blosers\b"), 'get_trending_stocks', False),
+    (re.compile(r"\bipos?\b"), 'get_ipo_data', True),
+    (re.compile(r"\b(market\s+news|news|headlines)\b"), 'get_market_news', True),
+    (re.compile(r"\bmutual\s+funds?\b|\bnavs?\b"), 'get_mutual_funds', True),
+]
+
+_PERIOD_WORDS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+_NUMBER_WORDS = {'one': 1, 'two': 2, 'three': 3, 'six': 6}
+
+
+def _history_period(query: str) -> str:
+    """Map look-back wording to the upstream /historical_data period (1m, 6m or 1yr)"""
+    match = re.search(r"\b(\d+|one|two|three|six)?\s*(day|week|month|year)s?\b", query)
+    if not match:
+        return '1m'
+    count = match.group(1) or '1'
+    count = _NUMBER_WORDS.get(count) or int(count)
+    days = count * _PERIOD_WORDS[match.group(2)]
+    if days <= 31:
+        return '1m'
+    return '6m' if days <= 183 else '1yr'
+
+
+def _decision(function: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    if function == NO_API:
+        return {'needs_api': False}
+    return {'needs_api': True, 'function': function, 'params': params or {}}
+
+
+def _label(decision: Dict[str, Any]) -> str:
+    """Training label for an orchestrator decision"""
+    if decision.get('needs_api') and decision.get('function') in FUNCTIONS:
+        return decision['function']
+    return NO_API
+
+
+class IntentClassifier:
+    """
+    Routes /ask queries without the orchestrator LLM when confident.
+
+    Args:
+        log_file: JSONL file of LLM orchestrator decisions; read for training
+            and appended to by record()
+        confidence: Minimum model probability to answer without the LLM
+    """
+
+    def __init__(self, log_file: str = INTENT_LOG_FILE, confidence: float = INTENT_CONFIDENCE):
+        self.log_file = log_file
+        self.confidence = confidence
+        self._model = None
+        self._lock = threading.Lock()
+        self._retraining = False
+        self._since_train = 0
+        self.trained_examples = 0
+        self.counts = {'rules': 0, 'model': 0, 'llm': 0}
+        self.train()
+
+    def _logged_examples(self) -> List[Tuple[str, str]]:
+        if not self.log_file or not os.path.exists(self.log_file):
+            return []
+        examples = []
+        try:
+            with open(self.log_file, encoding='utf-8') as f:
+                lines = f.readlines()[-MAX_LOGGED_DECISIONS:]
+        except OSError as e:
+            print(f"Could not read intent log {self.log_file}: {e}")
+            return []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                examples.append((entry['query'], _label(entry['decision'])))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return examples
+
+    def train(self) -> None:
+        """Fit the model on the seed examples plus logged LLM decisions"""
+        examples = SEED_EXAMPLES + self._logged_examples()
+        queries = [q for q, _ in examples]
+        labels = [label for _, label in examples]
+        model = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, lowercase=True),
+            LogisticRegression(C=10.0, max_iter=1000, class_weight='balanced'),
+        )
+        model.fit(queries, labels)
+        with self._lock:
+            self._model = model
+            self.trained_examples = len(examples)
+            self._since_train = 0
+
+    def _rules(self, query: str) -> Optional[Dict[str, Any]]:
+        q = query.lower()
+        fresh = _FRESH.search(q)
+        for pattern, function, needs_fresh in _FUNCTION_RULES:
+            if pattern.search(q) and (fresh or not needs_fresh):
+                return _decision(function)
+
+        symbols = symbol_index.find_in_text(query)
+        if len(symbols) == 1:
+            if _HISTORY.search(q):
+                return _decision('get_historical_data', {'stock_name': symbols[0], 'period': _history_period(q)})
+            if _PRICE.search(q):
+                return _decision('get_stock_details', {'stock_name': symbols[0]})
+        if not symbols and not fresh and _CONCEPT.search(q):
+            return _decision(NO_API)
+        return None
+
+    def _predict(self, query: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        with self._lock:
+            model = self._model
+        probabilities = model.predict_proba([query])[0]
+        best = probabilities.argmax()
+        function, confidence = str(model.classes_[best]), float(probabilities[best])
+        if function not in STOCK_FUNCTIONS:
+            return _decision(function), confidence
+        # A stock intent is only usable with exactly one stock slot filled
+        symbols = symbol_index.find_in_text(query)
+        if len(symbols) != 1:
+            return None, confidence
+        params = {'stock_name': symbols[0]}
+        if function == 'get_historical_data':
+            params['period'] = _history_period(query.lower())
+        return _decision(function, params), confidence
+
+    def classify(self, query: str) -> Optional[Dict[str, Any]]:
+        """The orchestrator decision for a query, or None to defer to the LLM"""
+        decision = self._rules(query)
+        source, confidence = 'rules', 1.0
+        if decision is None:
+            decision, confidence = self._predict(query)
+            source = 'model'
+            if decision is None or confidence < self.confidence:
+                return None
+        self.counts[source] += 1
+        decision['source'] = source
+        decision['confidence'] = round(confidence, 3)
+        return decision
+
+    def leans_no_api(self, query: str) -> bool:
+        """Whether the model, though not confident enough to route, expects no market data"""
+        with self._lock:
+            model = self._model
+        classes = list(model.classes_)
+        if NO_API not in classes:
+            return False
+        return float(model.predict_proba([query])[0][classes.index(NO_API)]) >= INTENT_DRAFT_LEAN
+
+    def record(self, query: str, decision: Dict[str, Any]) -> None:
+        """Log an LLM orchestrator decision and retrain every INTENT_RETRAIN_EVERY records"""
+        self.counts['llm'] += 1
+        if not self.log_file:
+            return
+        entry = {'query': query, 'decision': decision, 'time': time.time()}
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"Could not write intent log {self.log_file}: {e}")
+            return
+        with self._lock:
+            self._since_train += 1
+            if self._since_train < INTENT_RETRAIN_EVERY or self._retraining:
+                return
+            self._retraining = True
+        threading.Thread(target=self._retrain, name='intent-retrain', daemon=True).start()
+
+    def _retrain(self) -> None:
+        try:
+            self.train()
+        except Exception as e:
+            print(f"Intent classifier retrain error: {e}")
+        finally:
+            self._retraining = False
+
+    def stats(self) -> Dict[str, Any]:
+        routed = sum(self.counts.values())
+        local = self.counts['rules'] + self.counts['model']
+        return {
+            'decisions': dict(self.counts),
+            'local_rate': round(local / routed, 3) if routed else None,
+            'trained_examples': self.trained_examples,
+            'confidence_threshold': self.confidence,
+        }
+
+
+# Global instance
+intent_classifier = IntentClassifier()
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Freshness window (seconds) per upstream endpoint. Quotes go stale quickly,
+# news and IPO listings change a few times a day, history barely changes.
+CACHE_TTL_POLICIES = {
+    '/stock': 60,
+    '/trending': 120,
+    '/NSE_most_active': 120,
+    '/BSE_most_active': 120,
+    '/news': 900,
+    '/ipo': 1800,
+    '/mutual_funds': 1800,
+    '/historical_data': 3600,
+}
+DEFAULT_TTL = 300
+
+# How long (seconds) past its TTL an entry may still be served while it is
+# revalidated in the background (stale-while-revalidate).
+CACHE_STALE_POLICIES = {
+    '/stock': 300,
+    '/trending': 300,
+    '/NSE_most_active': 300,
+    '/BSE_most_active': 300,
+    '/news': 1800,
+    '/ipo': 3600,
+    '/mutual_funds': 3600,
+    '/historical_data': 6 * 3600,
+}
+DEFAULT_STALE_TTL = 0
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('MARKET_CACHE_MAX_ENTRIES', 2048))
+DEFAULT_MAX_BYTES = int(os.environ.get('MARKET_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+
+def make_cache_key(endpoint: str, params: Optional[dict] = None) -> str:
+    """
+    Build a canonical cache key for an endpoint and its query params.
+    Params are sorted so {"a": 1, "b": 2} and {"b": 2, "a": 1} share one entry.
+    """
+    if not params:
+        return endpoint
+    items = sorted((str(k), str(v)) for k, v in params.items() if v is not None)
+    return endpoint + '?' + '&'.join(f"{k}={v}" for k, v in items)
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate the memory held by a cached payload via its JSON length"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+class MarketDataCache:
+    """
+    Thread-safe TTL + LRU cache for upstream market data responses.
+
+    Entries are fresh for the per-endpoint TTL, then stale (still servable
+    through lookup() while a refresh happens) for the per-endpoint stale
+    window, then expired. The least recently used entries are evicted once
+    either the entry cap or the byte cap is exceeded.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_policies: Dict[str, int] = None, default_ttl: int = DEFAULT_TTL,
+                 stale_policies: Dict[str, int] = None, default_stale_ttl: int = DEFAULT_STALE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_policies = dict(CACHE_TTL_POLICIES if ttl_policies is None else ttl_policies)
+        self.default_ttl = default_ttl
+        self.stale_policies = dict(CACHE_STALE_POLICIES if stale_policies is None else stale_policies)
+        self.default_stale_ttl = default_stale_ttl
+        self._entries = OrderedDict()  # key -> (value, fresh_until, stale_until, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def ttl_for(self, endpoint: str) -> int:
+        return self.ttl_policies.get(endpoint, self.default_ttl)
+
+    def stale_ttl_for(self, endpoint: str) -> int:
+        return self.stale_policies.get(endpoint, self.default_stale_ttl)
+
+    def get(self, endpoint: str, params: dict = None) -> Optional[Any]:
+        """Return the cached payload, or None on a miss or a stale/expired entry"""
+        value, stale = self.lookup(endpoint, params)
+        return None if stale else value
+
+    def lookup(self, endpoint: str, params: dict = None) -> Tuple[Optional[Any], bool]:
+        """
+        Return (payload, is_stale). A stale payload is past its TTL but still
+        inside its stale window; callers should serve it and refresh it.
+        Returns (None, False) on a miss.
+        """
+        key = make_cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            value, fresh_until, stale_until, _ = entry
+            if now >= stale_until:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+            if now >= fresh_until:
+                self.stale_hits += 1
+                return value, True
+
+            self.hits += 1
+            return value, False
+
+    def expires_in(self, endpoint: str, params: dict = None) -> Optional[float]:
+        """Seconds until the entry goes stale (negative once stale), or None if absent"""
+        key = make_cache_key(endpoint, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[1] - time.time()
+
+    def set(self, endpoint: str, params: dict, value: Any, ttl: int = None) -> None:
+        key = make_cache_key(endpoint, params)
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            # Never let a single oversized payload flush the whole cache
+            return
+
+        fresh_until = time.time() + (self.ttl_for(endpoint) if ttl is None else ttl)
+        stale_until = fresh_until + self.stale_ttl_for(endpoint)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, fresh_until, stale_until, size)
+            self._bytes += size
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _remove(self, key: str) -> None:
+        size = self._entries.pop(key)[-1]
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until both caps are respected"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
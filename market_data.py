@@ -2,7 +2,11 @@ import random
 import time
 from datetime import datetime, timedelta
 import json
+import numpy as np
 from market_data_fallback import market_data_generator, get_bulk_market_data
+from synthetic_market import generate_ohlcv
+from candles import ohlcv_to_candles
+from movers import market_movers
 
 # Educational fallback data for learning purposes
 FALLBACK_STOCKS = {
@@ -57,6 +61,9 @@ FALLBACK_STOCKS = {
     }
 }
 
+# Educational stocks are part of the movers universe too
+market_movers.add_symbols(list(FALLBACK_STOCKS))
+
 def generate_realistic_candlesticks(symbol, period='1d', days=120):
     """
     Generate educational candlestick data for learning purposes
@@ -71,7 +78,6 @@ def generate_realistic_candlesticks(symbol, period='1d', days=120):
     else:
         volatility = 0.025  # 2.5% daily volatility for stocks
     
-    candles = []
     current_price = base_price * (0.9 + random.random() * 0.2)  # Start within ±10%
     
     # Time intervals based on period
@@ -96,41 +102,23 @@ def generate_realistic_candlesticks(symbol, period='1d', days=120):
         total_points = 252  # Trading days in a year
         start_time = datetime.now() - timedelta(days=365)
     
-    for i in range(total_points):
-        timestamp = start_time + timedelta(seconds=i * interval)
-        
-        # Generate realistic price movement
-        daily_return = random.gauss(0, volatility)  # Normal distribution
-        trend_factor = 0.0001 * i  # Slight upward trend for educational purpose
-        
-        open_price = current_price
-        close_price = open_price * (1 + daily_return + trend_factor)
-        
-        # Ensure positive prices
-        close_price = max(close_price, open_price * 0.95)
-        
-        # Generate high and low
-        intraday_volatility = volatility * 0.5
-        high_price = max(open_price, close_price) * (1 + random.uniform(0, intraday_volatility))
-        low_price = min(open_price, close_price) * (1 - random.uniform(0, intraday_volatility))
-        
-        # Ensure OHLC consistency
-        high_price = max(high_price, open_price, close_price)
-        low_price = min(low_price, open_price, close_price)
-        
-        candle = {
-            'time': int(timestamp.timestamp()),
-            'open': round(open_price, 2),
-            'high': round(high_price, 2), 
-            'low': round(low_price, 2),
-            'close': round(close_price, 2),
-            'volume': random.randint(100000, 1000000)
-        }
-        
-        candles.append(candle)
-        current_price = close_price
+    # Whole series in one vectorized pass: normal returns with a slight
+    # upward trend for educational purpose, closes never more than 5% below
+    # their open, wicks up to half the volatility beyond the body
+    ohlcv = generate_ohlcv(
+        total_points,
+        start_price=current_price,
+        interval_seconds=interval,
+        interval_vol=volatility,
+        start_time=start_time.timestamp(),
+        trend=0.0001 * np.arange(total_points),
+        max_drop=0.05,
+        wick_model='range',
+        intraday_vol=volatility * 0.5,
+        volume_range=(100000, 1000000)
+    )
     
-    return candles
+    return ohlcv_to_candles(ohlcv, include_dates=False)
 
 # New: Bulk data fetcher for multiple symbols
 def get_bulk_market_data_endpoint(symbols):
@@ -203,29 +191,16 @@ def get_stock_quote(symbol):
         'timestamp': int(time.time())
     }
 
-def get_market_movers():
+def get_market_movers(count=5):
     """
-    Get top gainers and losers for educational purposes
+    Get top gainers and losers for educational purposes.
+    Reads the shared movers service, which refreshes quotes in the background,
+    so this never fetches quotes itself.
     """
-    gainers = []
-    losers = []
-    
-    for symbol, data in FALLBACK_STOCKS.items():
-        variation = random.uniform(-5, 5)
-        quote = get_stock_quote(symbol)
-        quote['change_percent'] = variation
-        
-        if variation > 0:
-            gainers.append(quote)
-        else:
-            losers.append(quote)
-    
-    gainers.sort(key=lambda x: x['change_percent'], reverse=True)
-    losers.sort(key=lambda x: x['change_percent'])
-    
+    movers = market_movers.top(count)
     return {
-        'gainers': gainers[:5],
-        'losers': losers[:5]
+        'gainers': movers['gainers'],
+        'losers': movers['losers']
     }
 
 # Educational trading scenarios for different age groups
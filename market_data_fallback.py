@@ -1,13 +1,209 @@
+import os
 import random
+import re
+import threading
 import time
-import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
+import numpy as np
+from market_cache import MarketDataCache, make_cache_key
+from synthetic_market import generate_ohlcv, seeded_price, seeded_volume, CorrelatedMarketSimulator
+from candles import ohlcv_to_candles, to_columnar
+from candle_store import candle_store
+from upstream import upstream_flight, upstream_breakers, http_client, UpstreamError
+from symbols import symbol_index
 
 # API Configuration
 INDIAN_STOCK_API_BASE = "https://stock.indianapi.in"
 INDIAN_STOCK_API_KEY = "sk-live-HyFaz0NXK0RNIiShqwEgPMFdimnNrlVHfcOkxdJ2"
 
+# Cap on symbols per bulk request so one client can't fan out unbounded upstream calls
+MAX_BULK_SYMBOLS = 50
+# One thread per task of the largest bulk call (its quotes plus trending and news),
+# so a full request runs in a single wave; threads are only started as needed
+BULK_MAX_WORKERS = MAX_BULK_SYMBOLS + 2
+
+# Background refresh configuration
+BACKGROUND_REFRESH_ENABLED = os.environ.get('MARKET_BACKGROUND_REFRESH', '1') != '0'
+HOT_SYMBOL_REFRESH_INTERVAL = float(os.environ.get('MARKET_REFRESH_INTERVAL', 30))  # seconds between scheduler passes
+HOT_SYMBOL_COUNT = int(os.environ.get('MARKET_HOT_SYMBOLS', 20))
+REFRESH_WORKERS = int(os.environ.get('MARKET_REFRESH_WORKERS', 4))
+
+# Candle count and bar length of the educational history generated per chart period
+FALLBACK_PERIOD_CONFIG = {
+    '1d': {'candles': 78, 'interval_minutes': 5},
+    '1w': {'candles': 35, 'interval_minutes': 60 * 3},
+    '1m': {'candles': 30, 'interval_minutes': 60 * 24},
+    '3m': {'candles': 90, 'interval_minutes': 60 * 24},
+    '1y': {'candles': 52, 'interval_minutes': 60 * 24 * 7}
+}
+
+class BackgroundRefresher:
+    """
+    Refreshes market data off the request path.
+
+    Stale cache entries are revalidated on a small worker pool while callers
+    are served the stale value (stale-while-revalidate), and a scheduler
+    thread keeps the most frequently requested symbols fresh before they
+    expire. Access counts decay every pass so the hot set follows demand.
+    """
+
+    def __init__(self, generator, interval: float = HOT_SYMBOL_REFRESH_INTERVAL,
+                 hot_count: int = HOT_SYMBOL_COUNT, workers: int = REFRESH_WORKERS,
+                 enabled: bool = BACKGROUND_REFRESH_ENABLED):
+        self.generator = generator
+        self.interval = interval
+        self.hot_count = hot_count
+        self.enabled = enabled
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='market-refresh')
+        self._pending = set()
+        self._frequency = Counter()
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def record_access(self, symbol: str) -> None:
+        with self._lock:
+            self._frequency[symbol] += 1
+        self._ensure_scheduler()
+
+    def revalidate(self, endpoint: str, params: dict = None) -> None:
+        """Queue a background refresh unless one is already pending for this key"""
+        if not self.enabled:
+            return
+        key = make_cache_key(endpoint, params)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._pool.submit(self._refresh, key, endpoint, params)
+
+    def _refresh(self, key: str, endpoint: str, params: dict) -> None:
+        try:
+            self.generator._fetch_upstream(endpoint, params)
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"Background refresh error for {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def hot_symbols(self) -> List[str]:
+        with self._lock:
+            return [symbol for symbol, _ in self._frequency.most_common(self.hot_count)]
+
+    def refresh_hot_symbols(self) -> None:
+        """Refresh hot symbols whose quotes would go stale before the next pass"""
+        hot = self.hot_symbols()
+        with self._lock:
+            for symbol in list(self._frequency):
+                self._frequency[symbol] *= 0.5
+                if self._frequency[symbol] < 0.1:
+                    del self._frequency[symbol]
+
+        for symbol in hot:
+            params = {"name": symbol}
+            remaining = self.generator.api_cache.expires_in("/stock", params)
+            if remaining is None or remaining < self.interval:
+                self.revalidate("/stock", params)
+
+    def _ensure_scheduler(self) -> None:
+        if not self.enabled or (self._scheduler is not None and self._scheduler.is_alive()):
+            return
+        with self._lock:
+            if self._scheduler is not None and self._scheduler.is_alive():
+                return
+            self._scheduler = threading.Thread(target=self._run, name='market-hot-refresh', daemon=True)
+            self._scheduler.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh_hot_symbols()
+            except Exception as e:
+                print(f"Hot symbol refresh error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'interval_seconds': self.interval,
+            'hot_symbols': self.hot_symbols(),
+            'pending': pending,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+        }
+
+
+# Historical candles: upstream /historical_data serves daily candles, kept in the local store
+HISTORY_RESOLUTION = '1d'
+HISTORY_REFRESH_SECONDS = int(os.environ.get('HISTORY_REFRESH_SECONDS', 300))
+# Calendar days covered by each upstream /historical_data period
+API_HISTORY_SPANS = {'1m': 31, '6m': 183, '1yr': 366}
+
+def _smallest_history_period(seconds: int) -> str:
+    """Pick the shortest upstream period that covers the given look-back"""
+    for api_period, days in sorted(API_HISTORY_SPANS.items(), key=lambda item: item[1]):
+        if days * 86400 >= seconds:
+            return api_period
+    return max(API_HISTORY_SPANS, key=API_HISTORY_SPANS.get)
+
+_TZ_SUFFIX = re.compile(r'[+-]\d{2}:?\d{2}$')
+
+def _parse_timestamps(raw_times: List[Any]) -> np.ndarray:
+    """
+    Convert API timestamps (unix numbers or ISO strings) to unix seconds.
+    Plain ISO strings are parsed in one vectorized call; only strings with a
+    UTC offset go through datetime.fromisoformat one by one.
+    """
+    if all(isinstance(t, (int, float)) for t in raw_times):
+        return np.asarray(raw_times, dtype=np.int64)
+    
+    strings = [str(t) for t in raw_times]
+    if not any(_TZ_SUFFIX.search(t) for t in strings):
+        try:
+            cleaned = [t[:-1] if t.endswith('Z') else t for t in strings]
+            return np.array(cleaned, dtype='datetime64[s]').astype(np.int64)
+        except ValueError:
+            pass
+    
+    parsed = []
+    for t in raw_times:
+        if isinstance(t, (int, float)):
+            parsed.append(int(t))
+            continue
+        try:
+            parsed.append(int(datetime.fromisoformat(str(t).replace('Z', '+00:00')).timestamp()))
+        except ValueError:
+            parsed.append(int(time.time()))
+    return np.asarray(parsed, dtype=np.int64)
+
+def _parse_historical_rows(historical_data: List[Any]) -> Optional[Dict[str, Any]]:
+    """Parse API historical rows into time-sorted OHLCV arrays"""
+    rows = [
+        item for item in historical_data
+        if isinstance(item, dict) and (item.get('timestamp') or item.get('date') or item.get('time'))
+    ]
+    if not rows:
+        return None
+    
+    times = _parse_timestamps([item.get('timestamp') or item.get('date') or item.get('time') for item in rows])
+    order = np.argsort(times, kind='stable')
+    return {
+        'time': times[order],
+        'open': np.array([float(item.get('open', 0)) for item in rows])[order],
+        'high': np.array([float(item.get('high', 0)) for item in rows])[order],
+        'low': np.array([float(item.get('low', 0)) for item in rows])[order],
+        'close': np.array([float(item.get('close', 0)) for item in rows])[order],
+        'volume': np.array([int(item.get('volume', 0)) for item in rows], dtype=np.int64)[order]
+    }
+
 class MarketDataGenerator:
     """
     Enhanced market data generator with real API integration and fallback.
@@ -52,39 +248,100 @@ class MarketDataGenerator:
         'MARUTI': 0.26
     }
 
+    # Sector and instrument kind, used to correlate simulated returns
+    SECTORS = {
+        'NIFTY': ('broad_market', 'index'),
+        'SENSEX': ('broad_market', 'index'),
+        'BANKNIFTY': ('banking', 'sector_index'),
+        'RELIANCE': ('energy', 'stock'),
+        'TCS': ('it', 'stock'),
+        'HDFC': ('banking', 'stock'),
+        'INFY': ('it', 'stock'),
+        'ICICIBANK': ('banking', 'stock'),
+        'HDFCBANK': ('banking', 'stock'),
+        'WIPRO': ('it', 'stock'),
+        'BHARTIARTL': ('telecom', 'stock'),
+        'ITC': ('fmcg', 'stock'),
+        'KOTAKBANK': ('banking', 'stock'),
+        'LT': ('infrastructure', 'stock'),
+        'MARUTI': ('auto', 'stock')
+    }
+
     def __init__(self):
-        self.price_cache = {}
-        self.last_update = {}
-        # New: API data cache
-        self.api_cache = {}
-        self.api_cache_time = {}
+        # Bounded TTL + LRU cache for API responses
+        self.api_cache = MarketDataCache()
+        self.refresher = BackgroundRefresher(self)
         self.api_headers = {'X-Api-Key': INDIAN_STOCK_API_KEY}
+        self.quote_listeners = []
 
-    def _fetch_from_api(self, endpoint: str, params: dict = None) -> Optional[Dict]:
-        """Fetch data from Indian Stock Exchange API with caching"""
-        cache_key = f"{endpoint}_{str(params)}"
-        current_time = time.time()
+    def fetch_api(self, endpoint: str, params: dict = None) -> Any:
+        """
+        Fetch data from Indian Stock Exchange API with caching.
+        Stale entries are returned immediately and refreshed in the background.
+        Concurrent misses for the same endpoint+params share a single upstream request,
+        and a per-endpoint circuit breaker fails fast while the API is down.
+        Raises an exception if the API call fails or the circuit is open.
+        """
+        cached, stale = self.api_cache.lookup(endpoint, params)
+        if cached is not None:
+            if stale:
+                self.refresher.revalidate(endpoint, params)
+            return cached
         
-        # Return cached data if available and fresh (5 minutes)
-        if cache_key in self.api_cache and (current_time - self.api_cache_time.get(cache_key, 0)) < 300:
-            return self.api_cache[cache_key]
+        return self._fetch_upstream(endpoint, params)
+
+    def _fetch_upstream(self, endpoint: str, params: dict = None) -> Any:
+        """Coalesced, circuit-broken upstream fetch that bypasses the cache lookup"""
+        key = make_cache_key(endpoint, params)
+        breaker = upstream_breakers.get(endpoint)
+        return upstream_flight.do(key, lambda: breaker.call(lambda: self._request_api(endpoint, params)))
+
+    def _request_api(self, endpoint: str, params: dict = None) -> Any:
+        """Perform the upstream request and cache a successful response"""
+        url = f"{INDIAN_STOCK_API_BASE}{endpoint}"
+        response = http_client.get(url, headers=self.api_headers, params=params)
         
+        if response.status_code != 200:
+            if endpoint == '/stock' and response.status_code == 404:
+                symbol_index.mark_unknown(params['name'])
+            raise UpstreamError(f"API returned status code: {response.status_code}", response.status_code)
+        
+        data = response.json()
+        if endpoint == '/stock' and _is_stock_miss(data):
+            symbol_index.mark_unknown(params['name'])
+        self.api_cache.set(endpoint, params, data)
+        return data
+
+    def _fetch_from_api(self, endpoint: str, params: dict = None) -> Optional[Dict]:
+        """Fetch data from Indian Stock Exchange API, returning None on failure"""
         try:
-            url = f"{INDIAN_STOCK_API_BASE}{endpoint}"
-            response = requests.get(url, headers=self.api_headers, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.api_cache[cache_key] = data
-                self.api_cache_time[cache_key] = current_time
-                return data
+            return self.fetch_api(endpoint, params)
         except Exception as e:
             print(f"API fetch error for {endpoint}: {e}")
         
         return None
 
-    def get_current_price(self, symbol: str) -> Dict[str, Any]:
-        """Get current price with API integration"""
+    def add_quote_listener(self, listener) -> None:
+        """Register a callback(symbol, quote) run for every quote served"""
+        self.quote_listeners.append(listener)
+
+    def get_current_price(self, symbol: str, count_access: bool = True) -> Dict[str, Any]:
+        """
+        Get current price with API integration, then pass it to the quote listeners.
+        Background loops pass count_access=False so only user requests make a symbol hot.
+        """
+        quote = self._current_price(symbol, count_access)
+        for listener in self.quote_listeners:
+            try:
+                listener(symbol, quote)
+            except Exception as e:
+                print(f"Quote listener error for {symbol}: {e}")
+        return quote
+
+    def _current_price(self, symbol: str, count_access: bool = True) -> Dict[str, Any]:
+        if count_access:
+            self.refresher.record_access(symbol)
+        
         # Try API first
         api_data = self._fetch_from_api("/stock", {"name": symbol})
         
@@ -135,30 +392,18 @@ class MarketDataGenerator:
         return fallback_data
 
     def _generate_fallback_price(self, symbol: str) -> Dict[str, Any]:
-        """Generate fallback educational data"""
+        """
+        Generate fallback educational data.
+        Prices are a deterministic function of symbol and time bucket, so every
+        worker serves the same price for the same moment and restarts don't reset it.
+        """
         base_price = self.BASE_PRICES.get(symbol, 1000)
         volatility = self.VOLATILITY.get(symbol, 0.25)
         
-        # Add some randomness but keep it realistic
-        current_time = time.time()
-        if symbol not in self.last_update or (current_time - self.last_update[symbol]) > 300:  # 5 minutes
-            # Generate new price with some drift
-            if symbol in self.price_cache:
-                last_price = self.price_cache[symbol]
-                # Small random walk
-                change_pct = random.gauss(0, volatility * 0.01)  # Daily vol / 100 for minute changes
-                new_price = last_price * (1 + change_pct)
-                # Keep within reasonable bounds (±20% from base)
-                new_price = max(base_price * 0.8, min(base_price * 1.2, new_price))
-            else:
-                # Start near base price with small random variation
-                new_price = base_price * (1 + random.gauss(0, 0.02))
-            
-            self.price_cache[symbol] = new_price
-            self.last_update[symbol] = current_time
-        
-        current_price = self.price_cache[symbol]
-        base_price = self.BASE_PRICES.get(symbol, current_price)
+        now = time.time()
+        current_price = seeded_price(symbol, base_price, volatility, now)
+        # Today's open is the price at the start of the (UTC) day
+        open_price = seeded_price(symbol, base_price, volatility, now - now % 86400)
         
         # Calculate change percentage from base
         change_pct = ((current_price - base_price) / base_price) * 100
@@ -172,10 +417,10 @@ class MarketDataGenerator:
             'change_percent': round(change_pct, 2),
             'chgPct': round(change_pct, 2),
             'change': round(current_price - base_price, 2),
-            'volume': random.randint(10000, 1000000),
+            'volume': seeded_volume(symbol, now),
             'high': round(current_price * 1.02, 2),
             'low': round(current_price * 0.98, 2),
-            'open': round(current_price * (1 + random.gauss(0, 0.005)), 2),
+            'open': round(open_price, 2),
             'prev_close': round(base_price, 2),
             'data': {
                 'ltp': round(current_price, 2),
@@ -234,12 +479,63 @@ class MarketDataGenerator:
 
     def generate_historical_data(self, symbol: str, period: str = '1d', num_candles: int = None) -> List[Dict]:
         """Generate historical data with API integration"""
-        # Try API historical data
+        return ohlcv_to_candles(self.generate_historical_ohlcv(symbol, period, num_candles))
+
+    def generate_historical_ohlcv(self, symbol: str, period: str = '1d', num_candles: int = None) -> Dict[str, Any]:
+        """
+        Generate historical data as parallel arrays ('time', 'open', 'high',
+        'low', 'close', 'volume'), from the API with educational fallback
+        """
+        api_ohlcv = self._fetch_historical_ohlcv(symbol, period)
+        if api_ohlcv is not None:
+            return api_ohlcv
+        
+        # Fallback to educational data
+        return self._generate_fallback_ohlcv(symbol, period, num_candles)
+
+    def _fetch_historical_ohlcv(self, symbol: str, period: str = '1d') -> Optional[Dict[str, Any]]:
+        """
+        Get API historical data through the local candle store, returning None if unavailable.
+        Only the missing tail is downloaded once a symbol's history is on disk.
+        """
         period_map = {
             '1d': '1m', '1w': '1m', '1m': '1m', '3m': '6m', '1y': '1yr'
         }
         api_period = period_map.get(period, '1m')
         
+        try:
+            return self._historical_from_store(symbol, api_period)
+        except OSError as e:
+            print(f"Candle store error for {symbol}: {e}")
+            return self._download_historical_ohlcv(symbol, api_period)
+
+    def _historical_from_store(self, symbol: str, api_period: str) -> Optional[Dict[str, Any]]:
+        """Serve the API period's window from disk, topping the store up from the API when due"""
+        now = int(time.time())
+        window_start = now - API_HISTORY_SPANS[api_period] * 86400
+        meta = candle_store.meta(symbol, HISTORY_RESOLUTION)
+        covered = meta is not None and meta.get('covered_from', now) <= window_start
+        
+        if not covered or now - meta.get('checked_at', 0) >= HISTORY_REFRESH_SECONDS:
+            fetch_from = window_start
+            if covered:
+                # Earlier history is already on disk; only the tail is missing
+                last_time = candle_store.last_time(symbol, HISTORY_RESOLUTION)
+                if last_time is not None:
+                    fetch_from = last_time
+            fetch_period = _smallest_history_period(now - fetch_from)
+            
+            ohlcv = self._download_historical_ohlcv(symbol, fetch_period)
+            if ohlcv is not None:
+                candle_store.write(symbol, HISTORY_RESOLUTION, ohlcv)
+                candle_store.update_meta(symbol, HISTORY_RESOLUTION,
+                                         covered_from=now - API_HISTORY_SPANS[fetch_period] * 86400)
+        
+        stored = candle_store.read(symbol, HISTORY_RESOLUTION, start=window_start)
+        return stored if len(stored['time']) else None
+
+    def _download_historical_ohlcv(self, symbol: str, api_period: str) -> Optional[Dict[str, Any]]:
+        """Fetch one API historical period and parse it into arrays"""
         api_data = self._fetch_from_api("/historical_data", {
             "stock_name": symbol,
             "period": api_period,
@@ -248,95 +544,36 @@ class MarketDataGenerator:
         
         if api_data and isinstance(api_data, (list, dict)):
             historical_data = api_data if isinstance(api_data, list) else api_data.get('data', [])
-            
             if historical_data:
-                candles = []
-                for item in historical_data:
-                    if isinstance(item, dict):
-                        # Handle different timestamp formats
-                        timestamp = item.get('timestamp') or item.get('date') or item.get('time')
-                        if timestamp:
-                            if isinstance(timestamp, str):
-                                try:
-                                    timestamp = int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp())
-                                except:
-                                    timestamp = int(time.time())
-                            
-                            candle = {
-                                'time': timestamp,
-                                'timestamp': timestamp,
-                                'date': datetime.fromtimestamp(timestamp).isoformat(),
-                                'open': float(item.get('open', 0)),
-                                'high': float(item.get('high', 0)),
-                                'low': float(item.get('low', 0)),
-                                'close': float(item.get('close', 0)),
-                                'volume': int(item.get('volume', 0))
-                            }
-                            candles.append(candle)
-                
-                if candles:
-                    return sorted(candles, key=lambda x: x['time'])
+                return _parse_historical_rows(historical_data)
         
-        # Fallback to educational data
-        return self._generate_fallback_historical(symbol, period, num_candles)
+        return None
 
     def _generate_fallback_historical(self, symbol: str, period: str = '1d', num_candles: int = None) -> List[Dict]:
         """Generate fallback historical data"""
+        return ohlcv_to_candles(self._generate_fallback_ohlcv(symbol, period, num_candles))
+
+    def _generate_fallback_ohlcv(self, symbol: str, period: str = '1d', num_candles: int = None) -> Dict[str, Any]:
+        """Generate fallback historical data as parallel NumPy arrays in one vectorized pass"""
         base_price = self.BASE_PRICES.get(symbol, 1000)
         volatility = self.VOLATILITY.get(symbol, 0.25)
         
-        period_config = {
-            '1d': {'candles': 78, 'interval_minutes': 5},
-            '1w': {'candles': 35, 'interval_minutes': 60 * 3},
-            '1m': {'candles': 30, 'interval_minutes': 60 * 24},
-            '3m': {'candles': 90, 'interval_minutes': 60 * 24},
-            '1y': {'candles': 52, 'interval_minutes': 60 * 24 * 7}
-        }
-        
-        config = period_config.get(period, period_config['1d'])
-        if num_candles:
-            config['candles'] = num_candles
-            
-        candles = []
-        current_price = base_price
-        end_time = datetime.now()
+        config = FALLBACK_PERIOD_CONFIG.get(period, FALLBACK_PERIOD_CONFIG['1d'])
+        candle_count = num_candles or config['candles']
         
-        for i in range(config['candles']):
-            candle_time = end_time - timedelta(minutes=config['interval_minutes'] * (config['candles'] - i - 1))
-            timestamp = int(candle_time.timestamp())
-            
-            daily_vol = volatility / (252 ** 0.5)
-            interval_vol = daily_vol * ((config['interval_minutes'] / (60 * 24)) ** 0.5)
-            
-            price_change_pct = random.gauss(0, interval_vol)
-            new_price = current_price * (1 + price_change_pct)
-            new_price = max(1, new_price)
-            
-            open_price = current_price
-            close_price = new_price
-            
-            high_extra = random.uniform(0, 0.01) * abs(close_price - open_price) + random.uniform(0, 0.005) * open_price
-            low_extra = random.uniform(0, 0.01) * abs(close_price - open_price) + random.uniform(0, 0.005) * open_price
-            
-            high_price = max(open_price, close_price) + high_extra
-            low_price = min(open_price, close_price) - low_extra
-            low_price = max(low_price, new_price * 0.95)
-            
-            candle = {
-                'time': timestamp,
-                'timestamp': timestamp,
-                'date': candle_time.isoformat(),
-                'open': round(open_price, 2),
-                'high': round(high_price, 2),
-                'low': round(low_price, 2),
-                'close': round(close_price, 2),
-                'volume': random.randint(1000, 100000)
-            }
-            
-            candles.append(candle)
-            current_price = new_price
+        daily_vol = volatility / (252 ** 0.5)
+        interval_vol = daily_vol * ((config['interval_minutes'] / (60 * 24)) ** 0.5)
         
-        return candles
+        return generate_ohlcv(
+            candle_count,
+            start_price=base_price,
+            interval_seconds=config['interval_minutes'] * 60,
+            interval_vol=interval_vol,
+            end_time=time.time(),
+            floor=1,
+            wick_model='body',
+            volume_range=(1000, 100000)
+        )
 
     def get_market_news(self) -> Dict[str, Any]:
         """Get market news from API with fallback"""
@@ -386,15 +623,57 @@ class MarketDataGenerator:
             'source': 'educational_fallback'
         }
 
+    def build_simulator(self, symbols: List[str] = None, interval_seconds: int = 300,
+                        seed: Optional[int] = None) -> CorrelatedMarketSimulator:
+        """
+        Build a correlated simulator over the reference symbols, starting from
+        their current fallback prices. Unknown symbols get the default base
+        price and volatility and a sector of their own.
+        """
+        symbols = [s.upper() for s in (symbols or self.BASE_PRICES)]
+        start_prices = [
+            seeded_price(s, self.BASE_PRICES.get(s, 1000), self.VOLATILITY.get(s, 0.25)) for s in symbols
+        ]
+        volatilities = [self.VOLATILITY.get(s, 0.25) for s in symbols]
+        sectors = [self.SECTORS.get(s, (s.lower(), 'stock'))[0] for s in symbols]
+        kinds = [self.SECTORS.get(s, (s.lower(), 'stock'))[1] for s in symbols]
+        return CorrelatedMarketSimulator(symbols, start_prices, volatilities, sectors, kinds,
+                                         interval_seconds=interval_seconds, seed=seed)
+
 # Global instance
 market_data_generator = MarketDataGenerator()
 
-def get_fallback_quote(symbol: str) -> Dict[str, Any]:
+def _is_stock_miss(data: Any) -> bool:
+    """A /stock answer that is only an error, i.e. upstream does not know the name"""
+    return isinstance(data, dict) and 'error' in data and not any(
+        key in data for key in ('current_price', 'price', 'ltp', 'currentPrice'))
+
+def fetch_indian_api(endpoint: str, params: dict = None) -> Any:
+    """
+    Cached, coalesced call to the Indian Stock API for a user request; raises on failure.
+    A /stock lookup counts as demand for the symbol, like a quote from get_current_price.
+    """
+    if endpoint == '/stock' and params and params.get('name'):
+        market_data_generator.refresher.record_access(params['name'])
+    return market_data_generator.fetch_api(endpoint, params)
+
+def get_fallback_quote(symbol: str, count_access: bool = True) -> Dict[str, Any]:
     """Get fallback quote data for a symbol"""
-    return market_data_generator.get_current_price(symbol)
+    return market_data_generator.get_current_price(symbol, count_access)
 
-def get_fallback_historical(symbol: str, period: str = '1d') -> Dict[str, Any]:
-    """Get fallback historical data for a symbol"""
+def get_fallback_historical(symbol: str, period: str = '1d', columnar: bool = False, float32: bool = False) -> Dict[str, Any]:
+    """
+    Get fallback historical data for a symbol.
+    With columnar=True the candles are returned in the compact columnar
+    format (see candles.to_columnar), optionally at float32 precision.
+    """
+    if columnar:
+        ohlcv = market_data_generator.generate_historical_ohlcv(symbol, period)
+        return {
+            'status': 'success',
+            'data': to_columnar(ohlcv, float32=float32)
+        }
+    
     data = market_data_generator.generate_historical_data(symbol, period)
     return {
         'status': 'success',
@@ -407,22 +686,114 @@ def get_fallback_trending() -> Dict[str, Any]:
     """Get fallback trending stocks data"""
     return market_data_generator.get_trending_stocks()
 
+def get_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss/eviction counters for the market data cache"""
+    return market_data_generator.api_cache.stats()
+
+def get_refresher_stats() -> Dict[str, Any]:
+    """Get background refresh counters and the current hot symbol set"""
+    return market_data_generator.refresher.stats()
+
+def simulate_market(symbols: List[str] = None, universe_size: int = None, steps: int = 100,
+                    interval_seconds: int = 300, seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run the correlated simulator for a number of steps and summarize the run.
+    With universe_size set, a random synthetic universe of that many symbols is
+    simulated instead of the reference symbols (used for load testing).
+    """
+    started = time.perf_counter()
+    if universe_size:
+        simulator = CorrelatedMarketSimulator.synthetic_universe(universe_size, interval_seconds=interval_seconds,
+                                                                 seed=seed)
+    else:
+        simulator = market_data_generator.build_simulator(symbols, interval_seconds=interval_seconds, seed=seed)
+    start_prices = simulator.prices.copy()
+    path = simulator.step(steps)
+    elapsed = time.perf_counter() - started
+
+    change_percent = (simulator.prices / start_prices - 1) * 100
+    shown = slice(0, 50)
+    return {
+        'symbols': len(simulator.symbols),
+        'steps': steps,
+        'interval_seconds': interval_seconds,
+        'method': simulator.method,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'symbol_steps_per_second': int(len(simulator.symbols) * steps / elapsed) if elapsed > 0 else None,
+        'quotes': {
+            symbol: {
+                'start_price': round(float(start_prices[i]), 2),
+                'price': round(float(simulator.prices[i]), 2),
+                'change_percent': round(float(change_percent[i]), 2),
+                'high': round(float(path[:, i].max()), 2),
+                'low': round(float(path[:, i].min()), 2),
+            }
+            for i, symbol in list(enumerate(simulator.symbols))[shown]
+        },
+    }
+
+def _quote_or_fallback(symbol: str, count_access: bool = True) -> Dict[str, Any]:
+    """Get a quote, degrading to educational data if anything goes wrong"""
+    try:
+        return market_data_generator.get_current_price(symbol, count_access)
+    except Exception as e:
+        print(f"Bulk quote error for {symbol}: {e}")
+        fallback_data = market_data_generator._generate_fallback_price(symbol)
+        fallback_data['source'] = 'educational_fallback'
+        return fallback_data
+
+# Shared by every bulk call in the process instead of a pool per request
+bulk_pool = ThreadPoolExecutor(max_workers=BULK_MAX_WORKERS, thread_name_prefix='market-bulk')
+
+def get_bulk_quotes(symbols: List[str], count_access: bool = True) -> Dict[str, Dict[str, Any]]:
+    """Fetch quotes for many symbols concurrently on the shared bulk pool"""
+    unique_symbols = list(dict.fromkeys(symbols))
+    if not unique_symbols:
+        return {}
+    quotes = bulk_pool.map(lambda symbol: _quote_or_fallback(symbol, count_access), unique_symbols)
+    return dict(zip(unique_symbols, quotes))
+
+def get_background_quotes(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Bulk quotes for background loops; these don't count towards the hot symbol set"""
+    return get_bulk_quotes(symbols, count_access=False)
+
 # New: Bulk data fetcher for efficient API usage
 def get_bulk_market_data(symbols: List[str]) -> Dict[str, Any]:
-    """Fetch data for multiple symbols efficiently"""
+    """
+    Fetch quotes, trending and news for multiple symbols concurrently.
+
+    Every upstream call is submitted to the shared bulk pool at once, so the
+    whole bulk call takes roughly as long as the slowest single request
+    instead of the sum of all of them.
+    """
+    # Drop duplicates while keeping the caller's order
+    unique_symbols = list(dict.fromkeys(symbols))
+
     result = {
         'quotes': {},
         'trending': None,
         'news': None,
         'timestamp': time.time()
     }
-    
-    # Get quotes for all symbols
-    for symbol in symbols:
-        result['quotes'][symbol] = market_data_generator.get_current_price(symbol)
-    
-    # Get trending and news once
-    result['trending'] = market_data_generator.get_trending_stocks()
-    result['news'] = market_data_generator.get_market_news()
-    
+
+    quote_futures = {
+        symbol: bulk_pool.submit(_quote_or_fallback, symbol)
+        for symbol in unique_symbols
+    }
+    trending_future = bulk_pool.submit(market_data_generator.get_trending_stocks)
+    news_future = bulk_pool.submit(market_data_generator.get_market_news)
+
+    for symbol, future in quote_futures.items():
+        result['quotes'][symbol] = future.result()
+
+    try:
+        result['trending'] = trending_future.result()
+    except Exception as e:
+        print(f"Bulk trending error: {e}")
+
+    try:
+        result['news'] = news_future.result()
+    except Exception as e:
+        print(f"Bulk news error: {e}")
+
     return result
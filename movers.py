@@ -0,0 +1,299 @@
+"""
+Top gainers and losers over the whole symbol universe.
+
+The service keeps change_percent and price for every symbol in flat NumPy
+arrays. Each quote MarketDataGenerator serves updates them in O(1), and a
+background loop refreshes the universe in fixed-size batches through the
+bulk quote fetcher. Requests only read the arrays and pick the top k with
+argpartition (O(n + k log k)); they never trigger upstream calls
+themselves, and never wait for the loop: a cold service answers with
+what it has priced so far. Only real quotes for symbols in the symbol
+master are ranked; educational fallback prices and arbitrary user-typed
+symbols never enter the universe.
+
+The loop only runs while someone has asked for movers recently, and only
+in one gunicorn worker at a time: the worker holding an exclusive file
+lock refreshes the universe and publishes a snapshot, which the other
+workers load when they answer a request. Requests from any worker mark
+demand by touching a shared file, so an idle site polls nothing.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from market_data_fallback import get_background_quotes, market_data_generator
+from symbols import symbol_index
+
+MOVERS_REFRESH_INTERVAL = float(os.environ.get('MOVERS_REFRESH_INTERVAL', 30))  # seconds between batches
+MOVERS_BATCH_SIZE = int(os.environ.get('MOVERS_BATCH_SIZE', 50))
+MOVERS_IDLE_AFTER = float(os.environ.get('MOVERS_IDLE_AFTER', 300))  # seconds without a request before the loop stops
+MOVERS_DIR = os.environ.get('MOVERS_DIR', os.path.join('instance', 'movers'))
+DEMAND_TOUCH_INTERVAL = 5  # seconds between demand marks from one worker
+MAX_MOVERS_UNIVERSE = 20000
+DEFAULT_MOVERS_COUNT = 5
+
+
+class MoversService:
+    """Keeps change_percent for a symbol universe and answers top-k queries"""
+
+    def __init__(self, fetch_quotes: Callable[[List[str]], Dict[str, Dict[str, Any]]], universe: List[str] = (),
+                 interval: float = MOVERS_REFRESH_INTERVAL, batch_size: int = MOVERS_BATCH_SIZE,
+                 root: str = MOVERS_DIR, idle_after: float = MOVERS_IDLE_AFTER,
+                 listed: Callable[[str], bool] = symbol_index.is_listed):
+        self.fetch_quotes = fetch_quotes
+        self.listed = listed
+        self.interval = interval
+        self.batch_size = batch_size
+        self.root = root
+        self.idle_after = idle_after
+        self._symbols = []
+        self._index = {}
+        self._change = np.empty(0)
+        self._price = np.empty(0)
+        self._updated = np.empty(0)
+        self._quotes = []
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._leader_file = None  # open lock file while this worker runs the shared loop
+        self._demand_marked = 0.0
+        self._snapshot_loaded = 0.0
+        self.batches = 0
+        for symbol in universe:
+            self._slot(symbol)
+
+    def _slot(self, symbol: str) -> int:
+        """Index of a symbol's array slot, growing the arrays (amortized doubling) if it is new"""
+        i = self._index.get(symbol)
+        if i is not None:
+            return i
+        i = len(self._symbols)
+        if i >= len(self._change):
+            capacity = max(64, 2 * len(self._change))
+            self._change = np.concatenate([self._change, np.full(capacity - len(self._change), np.nan)])
+            self._price = np.concatenate([self._price, np.full(capacity - len(self._price), np.nan)])
+            self._updated = np.concatenate([self._updated, np.zeros(capacity - len(self._updated))])
+        self._symbols.append(symbol)
+        self._quotes.append(None)
+        self._index[symbol] = i
+        return i
+
+    def add_symbols(self, symbols: List[str]) -> None:
+        with self._lock:
+            for symbol in symbols:
+                if len(self._symbols) >= MAX_MOVERS_UNIVERSE:
+                    break
+                key = symbol.strip().upper()
+                if self.listed(key):
+                    self._slot(key)
+
+    def on_quote(self, symbol: str, quote: Dict[str, Any]) -> None:
+        """Quote listener: record the latest change_percent for a listed symbol's real quote"""
+        # Synthetic prices swing up to 20% around an arbitrary base and would crowd the lists
+        if quote.get('source') == 'educational_fallback':
+            return
+        try:
+            change = float(quote.get('change_percent'))
+            price = float(quote.get('price') or quote.get('current_price'))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._record(symbol.strip().upper(), quote, change, price, time.time())
+
+    def _record(self, key: str, quote: Dict[str, Any], change: float, price: float, updated: float) -> None:
+        if key not in self._index and (len(self._symbols) >= MAX_MOVERS_UNIVERSE or not self.listed(key)):
+            return
+        i = self._slot(key)
+        if updated < self._updated[i]:
+            return
+        self._change[i] = change
+        self._price[i] = price
+        self._updated[i] = updated
+        self._quotes[i] = quote
+
+    def refresh_batch(self) -> int:
+        """Quote the next batch of the universe (round robin); returns the batch size"""
+        with self._lock:
+            n = len(self._symbols)
+            if n == 0:
+                return 0
+            start = self._cursor % n
+            batch = [self._symbols[(start + j) % n] for j in range(min(self.batch_size, n))]
+            self._cursor = start + len(batch)
+        # Quotes come back through on_quote via the generator's listener
+        self.fetch_quotes(batch)
+        self.batches += 1
+        return len(batch)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _mark_demand(self) -> None:
+        """Record a request in the file every worker's loop checks before polling"""
+        now = time.time()
+        if now - self._demand_marked < DEMAND_TOUCH_INTERVAL:
+            return
+        self._demand_marked = now
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self._path('demand'), 'a'):
+                pass
+            os.utime(self._path('demand'), (now, now))
+        except OSError as e:
+            print(f"Movers demand mark error: {e}")
+
+    def _in_demand(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self._path('demand')) < self.idle_after
+        except OSError:
+            return False
+
+    def _lead(self) -> bool:
+        """Take the cross-worker loop lock if no other worker holds it; True while held"""
+        if self._leader_file is not None:
+            return True
+        if fcntl is None:
+            self._leader_file = True
+            return True
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(self._path('loop.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._leader_file = lock_file
+        return True
+
+    def _step_down(self) -> None:
+        if self._leader_file is not None and self._leader_file is not True:
+            self._leader_file.close()  # closing releases the flock
+        self._leader_file = None
+
+    def _publish(self) -> None:
+        """Write the priced part of the arrays where the other workers load it"""
+        with self._lock:
+            n = len(self._symbols)
+            priced = np.flatnonzero(np.isfinite(self._change[:n]))
+            rows = [[self._symbols[i], self._quotes[i], float(self._change[i]), float(self._price[i]),
+                     float(self._updated[i])] for i in priced]
+        tmp = self._path(f'snapshot.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(rows, f)
+        os.replace(tmp, self._path('snapshot.json'))
+
+    def _load_snapshot(self) -> None:
+        """Merge the leader's latest snapshot, if it changed since the last load"""
+        if self._leader_file is not None:
+            return
+        path = self._path('snapshot.json')
+        try:
+            modified = os.path.getmtime(path)
+            if modified <= self._snapshot_loaded:
+                return
+            with open(path) as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for symbol, quote, change, price, updated in rows:
+                self._record(symbol, quote, change, price, updated)
+            self._snapshot_loaded = modified
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='market-movers', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Refresh while there is demand and this worker leads; stop once every worker has gone quiet"""
+        try:
+            while self._in_demand():
+                try:
+                    if self._lead():
+                        self.refresh_batch()
+                        self._publish()
+                except Exception as e:
+                    print(f"Movers refresh error: {e}")
+                time.sleep(self.interval)
+        finally:
+            self._step_down()
+
+    def top(self, k: int = DEFAULT_MOVERS_COUNT) -> Dict[str, Any]:
+        """
+        Top k gainers (largest positive change) and losers (largest negative change).
+        Never waits for the loop; 'priced' says how much of the universe the answer covers.
+        """
+        self._mark_demand()
+        self._ensure_running()
+        self._load_snapshot()
+        with self._lock:
+            n = len(self._symbols)
+            change = self._change[:n].copy()
+            quotes = list(self._quotes)
+            symbols = list(self._symbols)
+            priced = int(np.isfinite(change).sum())
+
+        known = np.isfinite(change)
+        gainers = _select(change, known & (change > 0), k, largest=True)
+        losers = _select(change, known & (change < 0), k, largest=False)
+        return {
+            'gainers': [_mover(symbols[i], quotes[i], change[i]) for i in gainers],
+            'losers': [_mover(symbols[i], quotes[i], change[i]) for i in losers],
+            'universe': n,
+            'priced': priced,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self._symbols)
+            # A symbol is fresh if it was quoted within one full round-robin cycle
+            cycle = self.interval * max(1, -(-n // self.batch_size))
+            fresh = int((self._updated[:n] > time.time() - cycle).sum())
+            priced = int(np.isfinite(self._change[:n]).sum())
+        return {
+            'universe': n,
+            'priced': priced,
+            'fresh': fresh,
+            'batches': self.batches,
+            'batch_size': self.batch_size,
+            'interval_seconds': self.interval,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'leader': self._leader_file is not None,
+        }
+
+
+def _select(values: np.ndarray, mask: np.ndarray, k: int, largest: bool) -> List[int]:
+    """Indices of the k largest (or smallest) masked values, best first"""
+    candidates = np.flatnonzero(mask)
+    if len(candidates) == 0 or k <= 0:
+        return []
+    keys = -values[candidates] if largest else values[candidates]
+    if len(candidates) > k:
+        part = np.argpartition(keys, k - 1)[:k]
+        candidates, keys = candidates[part], keys[part]
+    return candidates[np.argsort(keys, kind='stable')].tolist()
+
+
+def _mover(symbol: str, quote: Dict[str, Any], change: float) -> Dict[str, Any]:
+    mover = dict(quote or {})
+    mover['symbol'] = symbol
+    mover['change_percent'] = round(float(change), 2)
+    return mover
+
+
+# Global instance; quotes served anywhere in the app keep the arrays current
+market_movers = MoversService(get_background_quotes, list(market_data_generator.BASE_PRICES))
+market_data_generator.add_quote_listener(market_movers.on_quote)
@@ -0,0 +1,237 @@
+"""
+Server-side limit-order matching for the trading simulator.
+
+Orders are persisted by an order ledger the app supplies (the simulator
+tables in the database), so every gunicorn worker sees the same books and
+resting orders survive restarts. The ledger books each fill in the same
+transaction that marks the order filled, so an order reported as filled
+is always in the wallet and the other way round.
+
+Quotes from MarketDataGenerator drive matching: a quote at price p fills
+every open bid at or above p and every open ask at or below p, in
+price-time order, at the quote price. To keep that check cheap on every
+quote, each worker caches the best bid, best ask and open-order count per
+symbol and only asks the ledger to match when a quote crosses them. The
+cache is reloaded after local changes and at least once per sweep
+interval, which picks up orders placed through other workers. Two workers
+matching the same quote is safe: a fill claims its order with a
+conditional update, so only one of them books it.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from market_data_fallback import get_background_quotes, market_data_generator
+
+ORDER_MATCH_INTERVAL = float(os.environ.get('ORDER_MATCH_INTERVAL', 15))  # seconds between quote sweeps
+MAX_OPEN_ORDERS_PER_USER = int(os.environ.get('MAX_OPEN_ORDERS_PER_USER', 500))
+FILL_LOG_SIZE = 500  # most recent fills returned per request
+
+
+class OrderError(ValueError):
+    """Raised for an order the engine or ledger will not accept"""
+
+
+class RestingBook(NamedTuple):
+    """Best resting prices for one symbol, as cached by each worker"""
+    best_bid: Optional[float]
+    best_ask: Optional[float]
+    open_orders: int
+
+    def crossed_by(self, price: float) -> bool:
+        return ((self.best_bid is not None and self.best_bid >= price)
+                or (self.best_ask is not None and self.best_ask <= price))
+
+
+class OrderMatchingEngine:
+    """
+    Validates orders and fills resting ones from quotes.
+
+    Args:
+        fetch_quotes: Bulk quote fetcher used by the background sweep; the
+            quotes it produces reach on_quote() through the quote listener
+        interval: Seconds between sweeps over symbols with resting orders
+
+    The ledger attached with attach() provides:
+        place(user_id, symbol, side, quantity, order_type, limit_price, fill_price) -> order dict
+            (fills at once when fill_price is given; raises OrderError if the wallet can't cover it)
+        cancel(user_id, order_id) -> order dict or None
+        fill_crossing(symbol, price) -> order dicts filled at price
+        open_orders(user_id, symbol) / fills(user_id, since, limit) -> order dicts
+        count_open(user_id) -> int
+        resting(symbol=None) -> {symbol: RestingBook}
+    """
+
+    def __init__(self, fetch_quotes: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+                 interval: float = ORDER_MATCH_INTERVAL):
+        self.fetch_quotes = fetch_quotes
+        self.interval = interval
+        self.ledger = None
+        self._books = {}  # symbol -> RestingBook
+        self._books_loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.fills_total = 0
+        self.sweeps = 0
+
+    def attach(self, ledger) -> None:
+        """Install the order ledger and start sweeping its resting orders"""
+        self.ledger = ledger
+        self._ensure_running()
+
+    def place(self, user_id: str, symbol: str, side: str, quantity: int, order_type: str = 'limit',
+              limit_price: float = None, quote: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Accept an order. A market order, or a limit order the current quote
+        already crosses, fills immediately at the quote price; any other
+        limit order rests in the symbol's book.
+        Raises OrderError for invalid input or an order the wallet can't cover.
+        """
+        symbol = symbol.strip().upper()
+        if side not in ('buy', 'sell'):
+            raise OrderError('side must be buy or sell')
+        if order_type not in ('market', 'limit'):
+            raise OrderError('order_type must be market or limit')
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise OrderError('quantity must be a positive integer')
+        if order_type == 'limit' and (limit_price is None or limit_price <= 0):
+            raise OrderError('limit orders need a positive limit_price')
+
+        price = _quote_price(quote)
+        if order_type == 'market' and price is None:
+            raise OrderError(f'No quote available for {symbol}')
+        limit_price = round(float(limit_price), 2) if order_type == 'limit' else None
+        crosses = price is not None and (
+            order_type == 'market'
+            or (side == 'buy' and limit_price >= price)
+            or (side == 'sell' and limit_price <= price)
+        )
+        if not crosses and self.ledger.count_open(user_id) >= MAX_OPEN_ORDERS_PER_USER:
+            raise OrderError(f'At most {MAX_OPEN_ORDERS_PER_USER} open orders per user')
+
+        order = self.ledger.place(user_id, symbol, side, quantity, order_type, limit_price,
+                                  round(price, 2) if crosses else None)
+        if crosses:
+            with self._lock:
+                self.fills_total += 1
+        else:
+            self._reload(symbol)
+        return order
+
+    def cancel(self, user_id: str, order_id: int) -> Optional[Dict[str, Any]]:
+        """Cancel an open order; returns None if the user has no such open order"""
+        order = self.ledger.cancel(user_id, order_id)
+        if order is not None:
+            self._reload(order['symbol'])
+        return order
+
+    def on_quote(self, symbol: str, quote: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Fill resting orders crossed by a new quote"""
+        price = _quote_price(quote)
+        if price is None or self.ledger is None:
+            return []
+        symbol = symbol.strip().upper()
+        try:
+            self._reload_if_stale()
+            book = self._books.get(symbol)
+            if book is None or not book.crossed_by(price):
+                return []
+            filled = self.ledger.fill_crossing(symbol, price)
+            self._reload(symbol)
+        except Exception as e:
+            # Quote listeners run inside quote generation and must never fail it
+            print(f"Order matching error for {symbol}: {e}")
+            return []
+        with self._lock:
+            self.fills_total += len(filled)
+        return filled
+
+    def _reload(self, symbol: Optional[str] = None) -> None:
+        """Refresh the cached best prices for one symbol, or for every book"""
+        books = self.ledger.resting(symbol)
+        with self._lock:
+            if symbol is None:
+                self._books = books
+                self._books_loaded_at = time.time()
+            elif symbol in books:
+                self._books[symbol] = books[symbol]
+            else:
+                self._books.pop(symbol, None)
+
+    def _reload_if_stale(self) -> None:
+        with self._lock:
+            if time.time() - self._books_loaded_at < self.interval:
+                return
+            # Claim the reload so concurrent quotes don't all query the ledger
+            self._books_loaded_at = time.time()
+        self._reload()
+
+    def open_orders(self, user_id: str, symbol: str = None) -> List[Dict[str, Any]]:
+        return self.ledger.open_orders(user_id, symbol.strip().upper() if symbol else None)
+
+    def fills(self, user_id: str, since: int = 0) -> List[Dict[str, Any]]:
+        """Fills for a user with fill_id greater than since, oldest first"""
+        return self.ledger.fills(user_id, since, FILL_LOG_SIZE)
+
+    def book(self, symbol: str) -> Dict[str, Any]:
+        symbol = symbol.strip().upper()
+        book = self.ledger.resting(symbol).get(symbol, RestingBook(None, None, 0))
+        return {
+            'symbol': symbol,
+            'open_orders': book.open_orders,
+            'best_bid': book.best_bid,
+            'best_ask': book.best_ask,
+        }
+
+    def resting_symbols(self) -> List[str]:
+        with self._lock:
+            return [symbol for symbol, book in self._books.items() if book.open_orders > 0]
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='order-matching', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Keep fetching quotes for symbols with resting orders so they fill with no tab open"""
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._reload()
+                symbols = self.resting_symbols()
+                if symbols:
+                    self.fetch_quotes(symbols)
+                    self.sweeps += 1
+            except Exception as e:
+                print(f"Order matching sweep error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'books': len(self._books),
+                'open_orders': sum(book.open_orders for book in self._books.values()),
+                'fills': self.fills_total,
+                'sweeps': self.sweeps,
+                'interval_seconds': self.interval,
+            }
+
+
+def _quote_price(quote: Optional[Dict[str, Any]]) -> Optional[float]:
+    if not quote:
+        return None
+    price = quote.get('price') or quote.get('current_price') or quote.get('ltp')
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+# Global instance; every quote MarketDataGenerator serves is checked against the books.
+# The app attaches the database-backed order ledger.
+order_engine = OrderMatchingEngine(get_background_quotes)
+market_data_generator.add_quote_listener(order_engine.on_quote)
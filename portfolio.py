@@ -0,0 +1,108 @@
+"""
+Batched mark-to-market for the trading simulator ledger.
+
+Positions for one user or every user are revalued together: each distinct
+symbol is quoted once through the quote cache, then prices, market values
+and P/L for all positions are computed as NumPy arrays and rolled up per
+user with bincount, instead of one quote call and one Python loop per
+holding.
+"""
+
+import os
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+from market_data_fallback import get_bulk_quotes
+
+SIM_STARTING_CASH = float(os.environ.get('SIM_STARTING_CASH', 100000))
+
+
+def _quote_price(quote: Dict[str, Any]) -> float:
+    price = quote.get('price') or quote.get('current_price') or quote.get('ltp')
+    try:
+        return float(price)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def revalue_positions(user_ids: Sequence[str], symbols: Sequence[str], quantities: Sequence[float],
+                      avg_prices: Sequence[float], cash: Dict[str, float],
+                      include_positions: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Revalue positions given as parallel sequences, one entry per holding.
+
+    Args:
+        cash: Cash balance per user; users with cash but no positions are included
+        include_positions: Add per-position rows to each user's result
+
+    Returns:
+        {user_id: {'cash', 'market_value', 'cost_basis', 'equity', 'pnl',
+                   'pnl_percent', 'unpriced', 'positions'?}}
+    """
+    user_ids = np.asarray(user_ids, dtype=object)
+    symbols = np.asarray(symbols, dtype=object)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    avg_prices = np.asarray(avg_prices, dtype=np.float64)
+
+    all_users = sorted(set(cash) | set(user_ids.tolist()))
+    user_index = {user: i for i, user in enumerate(all_users)}
+    user_idx = np.fromiter((user_index[u] for u in user_ids), dtype=np.int64, count=len(user_ids))
+
+    unique_symbols, symbol_idx = np.unique(symbols.astype(str), return_inverse=True) if len(symbols) else ([], [])
+    quotes = get_bulk_quotes(list(unique_symbols)) if len(unique_symbols) else {}
+    symbol_prices = np.array([_quote_price(quotes.get(s, {})) for s in unique_symbols], dtype=np.float64)
+
+    ltp = symbol_prices[symbol_idx] if len(symbols) else np.empty(0)
+    priced = np.isfinite(ltp)
+    cost = quantities * avg_prices
+    # Unpriced holdings are carried at cost rather than dropped from equity
+    value = np.where(priced, quantities * np.where(priced, ltp, 0), cost)
+    pnl = value - cost
+
+    n_users = len(all_users)
+    market_value = np.bincount(user_idx, weights=value, minlength=n_users)
+    cost_basis = np.bincount(user_idx, weights=cost, minlength=n_users)
+    unpriced = np.bincount(user_idx, weights=~priced, minlength=n_users)
+    cash_balances = np.array([cash.get(user, 0.0) for user in all_users], dtype=np.float64)
+    equity = cash_balances + market_value
+    total_pnl = market_value - cost_basis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_percent = np.where(cost_basis > 0, total_pnl / cost_basis * 100, 0.0)
+
+    results = {}
+    for i, user in enumerate(all_users):
+        results[user] = {
+            'cash': round(float(cash_balances[i]), 2),
+            'market_value': round(float(market_value[i]), 2),
+            'cost_basis': round(float(cost_basis[i]), 2),
+            'equity': round(float(equity[i]), 2),
+            'pnl': round(float(total_pnl[i]), 2),
+            'pnl_percent': round(float(pnl_percent[i]), 2),
+            'unpriced': int(unpriced[i]),
+        }
+        if include_positions:
+            results[user]['positions'] = []
+
+    if include_positions and len(symbols):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            position_pnl_percent = np.where(avg_prices > 0, (ltp / avg_prices - 1) * 100, np.nan)
+        for j in range(len(symbols)):
+            results[user_ids[j]]['positions'].append(_position_row(
+                symbols[j], quantities[j], avg_prices[j], ltp[j], value[j], pnl[j], position_pnl_percent[j]
+            ))
+    return results
+
+
+def _position_row(symbol, quantity, avg_price, ltp, value, pnl, pnl_percent) -> Dict[str, Any]:
+    priced = bool(np.isfinite(ltp))
+    return {
+        'symbol': symbol,
+        'quantity': int(quantity),
+        'avg_price': round(float(avg_price), 2),
+        'ltp': round(float(ltp), 2) if priced else None,
+        'market_value': round(float(value), 2),
+        'pnl': round(float(pnl), 2) if priced else None,
+        'pnl_percent': round(float(pnl_percent), 2) + 0.0 if priced else None,  # no -0.0
+    }
+
@@ -0,0 +1,157 @@
+"""
+Server-pushed quote updates for the trading simulator.
+
+One refresh loop per worker process polls the quote cache for the union
+of all symbols any client is subscribed to and fans changed quotes out to
+per-client queues. Upstream load therefore depends on the number of
+distinct symbols being watched, not on the number of open tabs.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from market_data_fallback import get_background_quotes
+
+QUOTE_STREAM_INTERVAL = float(os.environ.get('QUOTE_STREAM_INTERVAL', 15))  # seconds between refreshes
+QUOTE_STREAM_HEARTBEAT = 20  # seconds between keep-alive comments
+QUOTE_STREAM_MAX_DURATION = 600  # seconds before the client is asked to reconnect
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A single client's interest in a set of symbols"""
+
+    def __init__(self, symbols: List[str]):
+        self.symbols = set(symbols)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, event: Dict[str, Any]) -> None:
+        """Queue an event, dropping the oldest one if the client is falling behind"""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class QuoteStreamHub:
+    """Shared refresh loop that publishes quote changes to subscribers"""
+
+    def __init__(self, fetch_quotes: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+                 interval: float = QUOTE_STREAM_INTERVAL):
+        self.fetch_quotes = fetch_quotes
+        self.interval = interval
+        self._subscriptions = set()
+        self._latest = {}  # symbol -> last published quote
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.refresh_cycles = 0
+
+    def subscribe(self, symbols: List[str]) -> Subscription:
+        subscription = Subscription(symbols)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            snapshot = {s: self._latest[s] for s in subscription.symbols if s in self._latest}
+        # New subscribers get the last known quotes straight away
+        for symbol, quote in snapshot.items():
+            subscription.push({'symbol': symbol, 'quote': quote})
+        if len(snapshot) < len(subscription.symbols):
+            self._wakeup.set()
+        self._ensure_running()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def watched_symbols(self) -> List[str]:
+        with self._lock:
+            symbols = set()
+            for subscription in self._subscriptions:
+                symbols |= subscription.symbols
+            return sorted(symbols)
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='quote-stream', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            symbols = self.watched_symbols()
+            if symbols:
+                try:
+                    self.publish(self.fetch_quotes(symbols))
+                    self.refresh_cycles += 1
+                except Exception as e:
+                    print(f"Quote stream refresh error: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def publish(self, quotes: Dict[str, Dict[str, Any]]) -> None:
+        """Send quotes that changed since the last publish to interested subscribers"""
+        with self._lock:
+            changed = {}
+            for symbol, quote in quotes.items():
+                previous = self._latest.get(symbol)
+                if previous is None or _quote_changed(previous, quote):
+                    changed[symbol] = quote
+                self._latest[symbol] = quote
+            subscriptions = list(self._subscriptions)
+
+        for symbol, quote in changed.items():
+            event = {'symbol': symbol, 'quote': quote}
+            for subscription in subscriptions:
+                if symbol in subscription.symbols:
+                    subscription.push(event)
+
+    def stream(self, symbols: List[str], labels: Optional[Dict[str, List[str]]] = None) -> Iterator[str]:
+        """
+        Yield Server-Sent Events for the given symbols until the client disconnects.
+        labels maps a symbol to the names the client knows it by; each name gets its own event.
+        """
+        subscription = self.subscribe(symbols)
+        started = time.time()
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            while time.time() - started < QUOTE_STREAM_MAX_DURATION:
+                try:
+                    event = subscription.queue.get(timeout=QUOTE_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                for name in (labels or {}).get(event['symbol'], [event['symbol']]):
+                    yield f"event: quote\ndata: {json.dumps(dict(event, symbol=name))}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscribers = len(self._subscriptions)
+        return {
+            'subscribers': subscribers,
+            'symbols': self.watched_symbols(),
+            'interval_seconds': self.interval,
+            'refresh_cycles': self.refresh_cycles,
+        }
+
+
+def _quote_changed(previous: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    return (previous.get('price') != current.get('price')
+            or previous.get('change_percent') != current.get('change_percent')
+            or previous.get('source') != current.get('source'))
+
+
+# Global instance
+quote_hub = QuoteStreamHub(get_background_quotes)
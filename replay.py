@@ -0,0 +1,381 @@
+"""
+Server-side accelerated replay of historical candles.
+
+A replay session is one scenario (symbol, period, start date, speed) with
+a fixed series of candles and a single clock. The clock is anchored to
+wall time, so the replay position is a pure function of "now" and every
+viewer of the session sees the same candle at the same moment without a
+timer thread.
+
+Sessions live in a small SQLite database under instance/ shared by every
+gunicorn worker: the candles are stored once when the session opens, and
+the clock is just its anchor (position, time, paused, generation). Each
+worker keeps the candles of sessions it serves in memory and re-reads the
+clock every REPLAY_SYNC_INTERVAL seconds while streaming, so a pause or
+seek made through any worker reaches every viewer.
+
+Sessions are shared per scenario: opening a scenario that already has a
+live, unfinished session joins that session instead of starting a new
+clock, so everyone replaying the same symbol, period, start and speed
+watches the same candles. A session can also be joined by id (the
+sandbox's ?replay= link). Control is owned: only the visitor who opened
+a session may pause, resume or seek it; everyone else watches read-only.
+A visitor reopening their own scenario gets a session they control.
+"""
+
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from candles import ohlcv_to_candles
+from market_data_fallback import market_data_generator
+
+REPLAY_DB = os.environ.get('REPLAY_DB', os.path.join('instance', 'replay.db'))
+REPLAY_BASE_RATE = 5.0  # candles per second at 1x
+REPLAY_SPEEDS = (0.5, 1, 2, 4, 8, 16)
+REPLAY_MIN_TICK = 0.05  # seconds between stream ticks at the fastest speeds
+REPLAY_SYNC_INTERVAL = 0.5  # seconds between clock reads from the shared store while streaming
+REPLAY_HEARTBEAT = 20  # seconds between keep-alive comments while paused
+REPLAY_MAX_DURATION = 600  # seconds before the client is asked to reconnect
+REPLAY_IDLE_TTL = 900  # seconds a session nobody streams or controls is kept
+MAX_REPLAY_SESSIONS = 200
+REPLAY_CACHE_SIZE = 32  # sessions whose candles each worker keeps in memory
+
+
+def _pack_ohlcv(ohlcv: Dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **{name: np.asarray(values) for name, values in ohlcv.items()})
+    return buffer.getvalue()
+
+
+def _unpack_ohlcv(blob: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(blob)) as data:
+        return {name: data[name] for name in data.files}
+
+
+class ReplaySession:
+    """One replay clock over a fixed series of candles, backed by the shared store"""
+
+    def __init__(self, manager: 'ReplayManager', session_id: str, symbol: str, period: str,
+                 ohlcv: Dict[str, np.ndarray], start_index: int, speed: float, owner: str):
+        self.manager = manager
+        self.session_id = session_id
+        self.symbol = symbol
+        self.period = period
+        self.ohlcv = ohlcv
+        self.total = len(ohlcv['time'])
+        self.start_index = start_index
+        self.speed = speed
+        self.rate = REPLAY_BASE_RATE * speed
+        self.owner = owner
+        self.generation = 0  # bumped on every seek so viewers know to resync
+        self._anchor_position = start_index
+        self._anchor_time = time.time()
+        self._paused = False
+        self._synced_at = 0.0
+
+    def owned_by(self, owner: str) -> bool:
+        return bool(owner) and owner == self.owner
+
+    def sync(self) -> bool:
+        """Re-read the clock from the shared store; False if the session has expired"""
+        row = self.manager.clock(self.session_id)
+        if row is None:
+            return False
+        self._anchor_position, self._anchor_time, paused, self.generation = row
+        self._paused = bool(paused)
+        self._synced_at = time.time()
+        return True
+
+    def position(self, now: float = None) -> int:
+        """Number of candles revealed so far"""
+        now = time.time() if now is None else now
+        if self._paused:
+            return self._anchor_position
+        elapsed = int((now - self._anchor_time) * self.rate)
+        return min(self.total, self._anchor_position + elapsed)
+
+    def pause(self) -> None:
+        def paused(position, anchor_time, was_paused, now):
+            if was_paused:
+                return position, anchor_time, True, False
+            return self._position_at(position, anchor_time, now), now, True, False
+        self.manager.update_clock(self, paused)
+
+    def resume(self) -> None:
+        def resumed(position, anchor_time, was_paused, now):
+            return position, now if was_paused else anchor_time, False, False
+        self.manager.update_clock(self, resumed)
+
+    def seek(self, position: int) -> None:
+        target = max(0, min(self.total, position))
+        self.manager.update_clock(self, lambda _, __, was_paused, now: (target, now, was_paused, True))
+
+    def seek_time(self, timestamp: int) -> None:
+        """Seek to the first candle at or after a unix timestamp"""
+        self.seek(int(np.searchsorted(self.ohlcv['time'], timestamp, side='left')))
+
+    def _position_at(self, anchor_position: int, anchor_time: float, now: float) -> int:
+        return min(self.total, anchor_position + int((now - anchor_time) * self.rate))
+
+    def candles(self, start: int, end: int) -> List[Dict[str, Any]]:
+        window = {name: values[start:end] for name, values in self.ohlcv.items()}
+        return ohlcv_to_candles(window, include_dates=False)
+
+    def state(self) -> Dict[str, Any]:
+        position = self.position()
+        return {
+            'session_id': self.session_id,
+            'symbol': self.symbol,
+            'period': self.period,
+            'speed': self.speed,
+            'candles_per_second': self.rate,
+            'total': self.total,
+            'start_index': self.start_index,
+            'position': position,
+            'current_time': int(self.ohlcv['time'][position - 1]) if position else None,
+            'paused': self._paused,
+            'finished': position >= self.total,
+        }
+
+    def stream(self) -> Iterator[str]:
+        """
+        Yield Server-Sent Events: a 'reset' with every candle revealed so far,
+        then 'candles' batches as the shared clock advances, and 'end' once
+        the series is exhausted. A seek by the owner triggers a new 'reset'.
+        """
+        self.manager.viewer_joined()
+        started = time.time()
+        tick = max(REPLAY_MIN_TICK, 1.0 / self.rate)
+        sent = None
+        generation = None
+        last_event = started
+        try:
+            yield "retry: 2000\n\n"
+            while time.time() - started < REPLAY_MAX_DURATION:
+                if time.time() - self._synced_at >= REPLAY_SYNC_INTERVAL:
+                    if not self.sync():
+                        yield f"event: end\ndata: {json.dumps({'expired': True})}\n\n"
+                        return
+                    self.manager.touch(self.session_id)
+                position = self.position()
+                if generation != self.generation or sent is None or position < sent:
+                    generation = self.generation
+                    sent = position
+                    payload = {'state': self.state(), 'candles': self.candles(0, position)}
+                    yield f"event: reset\ndata: {json.dumps(payload)}\n\n"
+                    last_event = time.time()
+                elif position > sent:
+                    payload = {'from': sent, 'position': position, 'candles': self.candles(sent, position)}
+                    sent = position
+                    yield f"event: candles\ndata: {json.dumps(payload)}\n\n"
+                    last_event = time.time()
+                elif time.time() - last_event >= REPLAY_HEARTBEAT:
+                    yield ": keep-alive\n\n"
+                    last_event = time.time()
+
+                if sent >= self.total:
+                    yield f"event: end\ndata: {json.dumps(self.state())}\n\n"
+                    return
+                time.sleep(tick)
+        finally:
+            self.manager.viewer_left()
+
+
+def _parse_start(start: Optional[str]) -> Optional[int]:
+    """Parse a YYYY-MM-DD (or full ISO) start date into unix seconds"""
+    if not start:
+        return None
+    return int(datetime.fromisoformat(start).timestamp())
+
+
+class ReplayManager:
+    """Opens replay sessions in the shared store and serves them from any worker"""
+
+    def __init__(self, load_history: Callable[[str, str], Dict[str, np.ndarray]], path: str = REPLAY_DB):
+        self.load_history = load_history
+        self.path = path
+        self._local = threading.local()
+        self._cache = OrderedDict()  # session_id -> ReplaySession
+        self._lock = threading.Lock()
+        self._viewers = 0
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets workers stream while another writes"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        with self._conn() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS replay_sessions (
+                session_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                period TEXT NOT NULL,
+                speed REAL NOT NULL,
+                start_index INTEGER NOT NULL,
+                candles BLOB NOT NULL,
+                anchor_position INTEGER NOT NULL,
+                anchor_time REAL NOT NULL,
+                paused INTEGER NOT NULL DEFAULT 0,
+                generation INTEGER NOT NULL DEFAULT 0,
+                last_active REAL NOT NULL,
+                scenario TEXT NOT NULL DEFAULT '')''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(replay_sessions)')}
+            if 'scenario' not in columns:
+                conn.execute("ALTER TABLE replay_sessions ADD COLUMN scenario TEXT NOT NULL DEFAULT ''")
+            conn.execute('CREATE INDEX IF NOT EXISTS replay_by_scenario ON replay_sessions (scenario, last_active)')
+
+    def open(self, symbol: str, period: str = '1d', start: str = None, speed: float = 1,
+             owner: str = '') -> ReplaySession:
+        """
+        Join the live session for this scenario, or start a new one owned by owner.
+        Raises ValueError for an unsupported speed or a malformed start date.
+        """
+        speed = float(speed)
+        if speed not in REPLAY_SPEEDS:
+            raise ValueError(f"speed must be one of {', '.join(str(s) for s in REPLAY_SPEEDS)}")
+        start_ts = _parse_start(start)
+        scenario = f"{symbol}|{period}|{start_ts or ''}|{speed:g}"
+
+        session = self._joinable(scenario, owner)
+        if session is not None:
+            return session
+
+        ohlcv = self.load_history(symbol, period)
+        if len(ohlcv['time']) == 0:
+            raise ValueError(f"No history available for {symbol}")
+        start_index = 0 if start_ts is None else int(np.searchsorted(ohlcv['time'], start_ts, side='left'))
+        start_index = min(start_index, len(ohlcv['time']) - 1)
+
+        session = ReplaySession(self, uuid.uuid4().hex[:16], symbol, period, ohlcv, start_index, speed, owner)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # Serialize opens so two workers can't start twin sessions for one scenario
+            conn.execute('BEGIN IMMEDIATE')
+            joined = self._joinable(scenario, owner)
+            if joined is not None:
+                return joined
+            self._expire(conn, now)
+            conn.execute('INSERT INTO replay_sessions (session_id, owner, symbol, period, speed, start_index, '
+                         'candles, anchor_position, anchor_time, last_active, scenario) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (session.session_id, owner, symbol, period, speed, start_index, _pack_ohlcv(ohlcv),
+                          start_index, session._anchor_time, now, scenario))
+        session.sync()
+        self._remember(session)
+        return session
+
+    def _joinable(self, scenario: str, owner: str) -> Optional[ReplaySession]:
+        """
+        Another visitor's live, unfinished session for the scenario, if any.
+        The owner's own earlier session is not rejoined: opening again restarts their replay.
+        """
+        rows = self._conn().execute('SELECT session_id FROM replay_sessions WHERE scenario = ? AND owner != ? '
+                                    'AND last_active >= ? ORDER BY last_active DESC LIMIT 5',
+                                    (scenario, owner, time.time() - REPLAY_IDLE_TTL)).fetchall()
+        for (session_id,) in rows:
+            session = self.get(session_id)
+            if session is not None and session.position() < session.total:
+                return session
+        return None
+
+    def get(self, session_id: str) -> Optional[ReplaySession]:
+        """The session with its clock freshly read, loading its candles if this worker hasn't yet"""
+        with self._lock:
+            session = self._cache.get(session_id)
+            if session is not None:
+                self._cache.move_to_end(session_id)
+        if session is None:
+            row = self._conn().execute('SELECT owner, symbol, period, speed, start_index, candles '
+                                       'FROM replay_sessions WHERE session_id = ?', (session_id,)).fetchone()
+            if row is None:
+                return None
+            owner, symbol, period, speed, start_index, blob = row
+            session = ReplaySession(self, session_id, symbol, period, _unpack_ohlcv(blob), start_index, speed, owner)
+            self._remember(session)
+        if not session.sync():
+            with self._lock:
+                self._cache.pop(session_id, None)
+            return None
+        return session
+
+    def _remember(self, session: ReplaySession) -> None:
+        with self._lock:
+            self._cache[session.session_id] = session
+            self._cache.move_to_end(session.session_id)
+            while len(self._cache) > REPLAY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def clock(self, session_id: str):
+        return self._conn().execute('SELECT anchor_position, anchor_time, paused, generation FROM replay_sessions '
+                                    'WHERE session_id = ?', (session_id,)).fetchone()
+
+    def update_clock(self, session: ReplaySession, change) -> None:
+        """
+        Apply change(anchor_position, anchor_time, paused, now) ->
+        (anchor_position, anchor_time, paused, bump_generation) atomically.
+        """
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT anchor_position, anchor_time, paused FROM replay_sessions '
+                               'WHERE session_id = ?', (session.session_id,)).fetchone()
+            if row is None:
+                return
+            position, anchor_time, paused, bump = change(row[0], row[1], bool(row[2]), now)
+            conn.execute('UPDATE replay_sessions SET anchor_position = ?, anchor_time = ?, paused = ?, '
+                         'generation = generation + ?, last_active = ? WHERE session_id = ?',
+                         (position, anchor_time, int(paused), int(bump), now, session.session_id))
+        session.sync()
+
+    def touch(self, session_id: str) -> None:
+        """Keep a watched session from expiring; written at most once a minute"""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute('UPDATE replay_sessions SET last_active = ? WHERE session_id = ? AND last_active < ?',
+                         (now, session_id, now - 60))
+
+    def _expire(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop idle sessions, then the least recently active ones over the cap"""
+        conn.execute('DELETE FROM replay_sessions WHERE last_active < ?', (now - REPLAY_IDLE_TTL,))
+        conn.execute('DELETE FROM replay_sessions WHERE session_id IN (SELECT session_id FROM replay_sessions '
+                     'ORDER BY last_active DESC LIMIT -1 OFFSET ?)', (MAX_REPLAY_SESSIONS - 1,))
+
+    def viewer_joined(self) -> None:
+        with self._lock:
+            self._viewers += 1
+
+    def viewer_left(self) -> None:
+        with self._lock:
+            self._viewers -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        sessions = self._conn().execute('SELECT COUNT(*) FROM replay_sessions').fetchone()[0]
+        with self._lock:
+            return {
+                'sessions': sessions,
+                'viewers': self._viewers,  # streams served by this worker
+                'cached': len(self._cache),
+            }
+
+
+# Global instance
+replay_manager = ReplayManager(market_data_generator.generate_historical_ohlcv)
@@ -6,4 +6,12 @@
 mkdir -p instance static/audio uploads data
 
 # Start the application with Gunicorn
-exec gunicorn --bind 0.0.0.0:$PORT --workers 2 --timeout 60 --max-requests 1000 app:app
+# Threaded workers: each open stream (quote and replay SSE, /ask/stream) holds one
+# thread. app.py gives market streams half of GUNICORN_THREADS and chat streams a
+# quarter, per worker (503 beyond that), so the last quarter always serves ordinary
+# routes. Streams mostly sleep between events, so threads are cheap; raise
+# GUNICORN_THREADS rather than the budgets to serve more open tabs.
+# GUNICORN_THREADS also sizes the speculative /ask pool in app.py (one pool thread
+# per request thread), so a worker runs at most twice this many request-side threads.
+export GUNICORN_THREADS=${GUNICORN_THREADS:-32}
+exec gunicorn --bind 0.0.0.0:$PORT --workers 2 --worker-class gthread --threads $GUNICORN_THREADS --timeout 60 --max-requests 1000 app:app
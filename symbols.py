@@ -0,0 +1,435 @@
+"""
+Local symbol master: resolve company names and tickers without an API call.
+
+Every listed symbol is indexed under its ticker, company name, aliases and
+the words of its name. Two structures answer queries:
+
+* a prefix trie whose nodes keep their best few completions, so an
+  autocomplete lookup costs O(len(prefix)) no matter how large the
+  universe is;
+* a bigram index over the same keys that narrows typo-tolerant (edit
+  distance) lookups to a handful of candidates before comparing them.
+
+Quote paths map user input through canonical() first, so a name the master
+knows shares the cache entry of its ticker. With a full exchange master
+loaded from SYMBOL_MASTER_FILE, anything else is rejected locally. The
+built-in master only covers part of the universe, so without one other
+input is passed on to the market API as typed, and a symbol the API does
+not know is remembered for UNKNOWN_SYMBOL_TTL so it costs at most one
+upstream call per TTL.
+"""
+
+import csv
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+SYMBOL_MASTER_FILE = os.environ.get('SYMBOL_MASTER_FILE')  # optional CSV, e.g. NSE's EQUITY_L.csv
+MAX_SUGGESTIONS = 10  # completions kept per trie node
+MIN_PREFIX_RESOLVE = 3  # shortest unique name prefix resolve() accepts
+UNKNOWN_SYMBOL_TTL = float(os.environ.get('UNKNOWN_SYMBOL_TTL', 6 * 3600))  # seconds an upstream miss is remembered
+MAX_UNKNOWN_SYMBOLS = 10000
+
+# Built-in universe: NIFTY 50 constituents, the reference symbols and the main indices
+# ticker -> (company name, aliases)
+SYMBOL_MASTER = {
+    'NIFTY': ('Nifty 50', ('NIFTY 50', 'NIFTY50')),
+    'BANKNIFTY': ('Nifty Bank', ('BANK NIFTY', 'NIFTYBANK')),
+    'SENSEX': ('BSE Sensex', ('S&P BSE SENSEX',)),
+    'ADANIENT': ('Adani Enterprises Ltd', ('ADANI',)),
+    'ADANIPORTS': ('Adani Ports and Special Economic Zone Ltd', ('ADANI PORTS',)),
+    'APOLLOHOSP': ('Apollo Hospitals Enterprise Ltd', ('APOLLO',)),
+    'ASIANPAINT': ('Asian Paints Ltd', ()),
+    'AXISBANK': ('Axis Bank Ltd', ()),
+    'BAJAJ-AUTO': ('Bajaj Auto Ltd', ()),
+    'BAJFINANCE': ('Bajaj Finance Ltd', ()),
+    'BAJAJFINSV': ('Bajaj Finserv Ltd', ()),
+    'BEL': ('Bharat Electronics Ltd', ()),
+    'BPCL': ('Bharat Petroleum Corporation Ltd', ()),
+    'BHARTIARTL': ('Bharti Airtel Ltd', ('AIRTEL',)),
+    'BRITANNIA': ('Britannia Industries Ltd', ()),
+    'CIPLA': ('Cipla Ltd', ()),
+    'COALINDIA': ('Coal India Ltd', ()),
+    'DIVISLAB': ("Divi's Laboratories Ltd", ('DIVIS LAB',)),
+    'DRREDDY': ("Dr. Reddy's Laboratories Ltd", ('DR REDDY', 'DR REDDYS')),
+    'EICHERMOT': ('Eicher Motors Ltd', ('ROYAL ENFIELD',)),
+    'GRASIM': ('Grasim Industries Ltd', ()),
+    'HCLTECH': ('HCL Technologies Ltd', ('HCL',)),
+    'HDFC': ('Housing Development Finance Corporation Ltd', ()),
+    'HDFCBANK': ('HDFC Bank Ltd', ()),
+    'HDFCLIFE': ('HDFC Life Insurance Company Ltd', ('HDFC LIFE',)),
+    'HEROMOTOCO': ('Hero MotoCorp Ltd', ('HERO HONDA',)),
+    'HINDALCO': ('Hindalco Industries Ltd', ()),
+    'HINDUNILVR': ('Hindustan Unilever Ltd', ('HUL',)),
+    'ICICIBANK': ('ICICI Bank Ltd', ()),
+    'INDUSINDBK': ('IndusInd Bank Ltd', ()),
+    'INFY': ('Infosys Ltd', ()),
+    'ITC': ('ITC Ltd', ()),
+    'JSWSTEEL': ('JSW Steel Ltd', ()),
+    'KOTAKBANK': ('Kotak Mahindra Bank Ltd', ('KOTAK',)),
+    'LT': ('Larsen & Toubro Ltd', ('L&T', 'L AND T')),
+    'LTIM': ('LTIMindtree Ltd', ('LTI MINDTREE', 'MINDTREE')),
+    'M&M': ('Mahindra & Mahindra Ltd', ('MAHINDRA', 'M AND M')),
+    'MARUTI': ('Maruti Suzuki India Ltd', ('MARUTI SUZUKI',)),
+    'NESTLEIND': ('Nestle India Ltd', ('NESTLE',)),
+    'NTPC': ('NTPC Ltd', ()),
+    'ONGC': ('Oil and Natural Gas Corporation Ltd', ()),
+    'POWERGRID': ('Power Grid Corporation of India Ltd', ('POWER GRID',)),
+    'RELIANCE': ('Reliance Industries Ltd', ('RIL',)),
+    'SBILIFE': ('SBI Life Insurance Company Ltd', ('SBI LIFE',)),
+    'SBIN': ('State Bank of India', ('SBI',)),
+    'SHRIRAMFIN': ('Shriram Finance Ltd', ()),
+    'SUNPHARMA': ('Sun Pharmaceutical Industries Ltd', ('SUN PHARMA',)),
+    'TATACONSUM': ('Tata Consumer Products Ltd', ('TATA CONSUMER',)),
+    'TATAMOTORS': ('Tata Motors Ltd', ()),
+    'TATASTEEL': ('Tata Steel Ltd', ()),
+    'TCS': ('Tata Consultancy Services Ltd', ()),
+    'TECHM': ('Tech Mahindra Ltd', ()),
+    'TITAN': ('Titan Company Ltd', ()),
+    'TRENT': ('Trent Ltd', ()),
+    'ULTRACEMCO': ('UltraTech Cement Ltd', ('ULTRATECH',)),
+    'WIPRO': ('Wipro Ltd', ()),
+}
+
+# Match ranks, best first
+RANK_TICKER, RANK_NAME, RANK_WORD = 0, 1, 2
+
+_EXCHANGE_SUFFIX = re.compile(r'\.(NS|BO|NSE|BSE)$')
+_NOISE_WORDS = {'LTD', 'LIMITED', 'THE'}
+
+
+def normalize_key(text: str) -> str:
+    """Upper-case, '&' spelled out, punctuation and legal suffixes dropped, spaces collapsed"""
+    text = _EXCHANGE_SUFFIX.sub('', str(text).strip().upper())
+    text = text.replace('&', ' AND ').replace("'", '')
+    words = [w for w in re.sub(r'[^A-Z0-9]+', ' ', text).split() if w not in _NOISE_WORDS]
+    return ' '.join(words)
+
+
+def edit_distance(a: str, b: str, limit: int = None) -> int:
+    """
+    Levenshtein distance. With limit set, gives up early and returns
+    limit + 1 once every alignment is known to exceed it.
+    """
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _max_typos(query: str) -> int:
+    if len(query) < 4:
+        return 0
+    return 1 if len(query) < 8 else 2
+
+
+class _TrieNode:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []  # (rank, name length, symbol), best first once finalized
+
+
+class _QGramIndex:
+    """
+    Inverted index of character bigrams for typo lookups. A key within k
+    edits of the query shares at least max(len) + 1 - 2k padded bigrams
+    with it, so only keys passing that count (and the length bound) are
+    checked with a real edit distance.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._ids = {}
+        self._postings = {}  # bigram -> [(key id, occurrences)]
+
+    @staticmethod
+    def _grams(key: str) -> Dict[str, int]:
+        padded = f'^{key}$'
+        grams = {}
+        for i in range(len(padded) - 1):
+            gram = padded[i:i + 2]
+            grams[gram] = grams.get(gram, 0) + 1
+        return grams
+
+    def add(self, key: str) -> None:
+        if key in self._ids:
+            return
+        key_id = self._ids[key] = len(self._keys)
+        self._keys.append(key)
+        for gram, count in self._grams(key).items():
+            self._postings.setdefault(gram, []).append((key_id, count))
+
+    def search(self, query: str, max_distance: int) -> List[Tuple[int, str]]:
+        shared = {}
+        for gram, count in self._grams(query).items():
+            for key_id, key_count in self._postings.get(gram, ()):
+                shared[key_id] = shared.get(key_id, 0) + min(count, key_count)
+        found = []
+        for key_id, common in shared.items():
+            key = self._keys[key_id]
+            if abs(len(key) - len(query)) > max_distance:
+                continue
+            if common < max(len(key), len(query)) + 1 - 2 * max_distance:
+                continue
+            d = edit_distance(query, key, limit=max_distance)
+            if d <= max_distance:
+                found.append((d, key))
+        return sorted(found)
+
+
+class SymbolIndex:
+    """
+    Ticker and company-name index with exact, prefix and fuzzy lookups.
+
+    Args:
+        master: ticker -> (company name, aliases)
+        exhaustive: Whether the master lists every tradable symbol, so input
+            it does not know can be rejected without asking upstream
+    """
+
+    def __init__(self, master: Dict[str, Tuple[str, Tuple[str, ...]]], exhaustive: bool = False):
+        self.exhaustive = exhaustive
+        self._unknown = OrderedDict()  # upstream misses: symbol -> expiry time
+        self._unknown_lock = threading.Lock()
+        self._names = {}  # ticker -> company name
+        self._exact = {}  # normalized key -> tickers it names outright
+        self._fuzzy_keys = {}  # normalized key -> tickers, for typo matching
+        self._root = _TrieNode()
+        self._typos = _QGramIndex()
+        for ticker, (name, aliases) in master.items():
+            self._add(ticker, name, aliases)
+        self._finalize(self._root)
+
+    def _add(self, ticker: str, name: str, aliases) -> None:
+        ticker = ticker.strip().upper()
+        if not ticker or ticker in self._names:
+            return
+        self._names[ticker] = name
+        name_key = normalize_key(name)
+        keys = [(normalize_key(ticker), RANK_TICKER), (name_key, RANK_NAME)]
+        keys += [(normalize_key(alias), RANK_NAME) for alias in aliases]
+        # Every word start of the name, so 'Bank' completes to the banks
+        words = name_key.split()
+        keys += [(' '.join(words[i:]), RANK_WORD) for i in range(1, len(words))]
+
+        for key, rank in keys:
+            if not key:
+                continue
+            if rank < RANK_WORD:
+                self._exact.setdefault(key, set()).add(ticker)
+                self._fuzzy_keys.setdefault(key, set()).add(ticker)
+                self._typos.add(key)
+            self._insert(key, (rank, len(name), ticker))
+        if words:
+            # The first word of the name ('INFOSYS', 'KOTAK') is a common shorthand with typos
+            self._fuzzy_keys.setdefault(words[0], set()).add(ticker)
+            self._typos.add(words[0])
+
+    def _insert(self, key: str, entry: Tuple[int, int, str]) -> None:
+        node = self._root
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+            node.entries.append(entry)
+
+    def _finalize(self, root: _TrieNode) -> None:
+        """Keep each node's best completion per ticker, truncated to MAX_SUGGESTIONS"""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            best = {}
+            for entry in sorted(node.entries):
+                best.setdefault(entry[2], entry)
+            node.entries = list(best.values())[:MAX_SUGGESTIONS]
+            stack.extend(node.children.values())
+
+    def __contains__(self, ticker: str) -> bool:
+        return str(ticker).strip().upper() in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def symbols(self) -> List[str]:
+        return list(self._names)
+
+    def name(self, ticker: str) -> Optional[str]:
+        return self._names.get(str(ticker).strip().upper())
+
+    def complete(self, prefix: str, limit: int = MAX_SUGGESTIONS) -> List[str]:
+        """Tickers whose ticker, name or a word of the name starts with prefix, best first"""
+        key = normalize_key(prefix)
+        node = self._root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        # A query that is a whole ticker or name ranks that company first
+        exact = sorted(self._exact.get(key, ()), key=lambda t: (t != key, t))
+        rest = [entry[2] for entry in node.entries if entry[2] not in exact]
+        return (exact + rest)[:limit]
+
+    def fuzzy(self, query: str, max_distance: int = None) -> List[Tuple[int, str]]:
+        """(distance, ticker) pairs for keys within max_distance edits of the query, closest first"""
+        key = normalize_key(query)
+        if max_distance is None:
+            max_distance = _max_typos(key)
+        if not key or max_distance <= 0:
+            return []
+        matches = {}
+        for distance, matched in self._typos.search(key, max_distance):
+            for ticker in self._fuzzy_keys.get(matched, ()):
+                matches.setdefault(ticker, distance)
+        return sorted((d, t) for t, d in matches.items())
+
+    def resolve(self, query: str, fuzzy: bool = True) -> Optional[str]:
+        """
+        Canonical ticker for a ticker or company name, or None.
+        Tries the exact ticker, then exact names and aliases, then a prefix
+        that fits only one company, then (unless fuzzy is False) a single
+        closest typo match.
+        """
+        if not query or not str(query).strip():
+            return None
+        raw = _EXCHANGE_SUFFIX.sub('', str(query).strip().upper())
+        if raw in self._names:
+            return raw
+
+        key = normalize_key(raw)
+        exact = self._exact.get(key)
+        if exact:
+            # A key both a ticker and a name (HDFC) resolves to the ticker
+            return raw if raw in exact else min(exact, key=lambda t: (t != key, t))
+
+        if len(key) >= MIN_PREFIX_RESOLVE:
+            candidates = self.complete(key, limit=2)
+            if len(candidates) == 1:
+                return candidates[0]
+
+        matches = self.fuzzy(key) if fuzzy else []
+        if matches and (len(matches) == 1 or matches[0][0] < matches[1][0]):
+            return matches[0][1]
+        return None
+
+    def canonical(self, query: str) -> Optional[str]:
+        """
+        Symbol to request upstream for user input, or None if it is known not
+        to exist: the master ticker when the master knows the company; else,
+        unless the master is exhaustive or upstream recently missed it, the
+        cleaned-up input itself. With a partial master a single word is never
+        typo-corrected: HPCL is a listed ticker of its own, not a misspelling
+        of BPCL.
+        """
+        if not query or not str(query).strip():
+            return None
+        raw = ' '.join(_EXCHANGE_SUFFIX.sub('', str(query).strip().upper()).split())
+        ticker = self.resolve(raw, fuzzy=self.exhaustive or ' ' in raw)
+        if ticker:
+            return ticker
+        if self.exhaustive or self.is_unknown(raw):
+            return None
+        return raw
+
+    def is_listed(self, ticker: str) -> bool:
+        """Whether the master lists this exact ticker"""
+        return ticker in self._names
+
+    def mark_unknown(self, symbol: str) -> None:
+        """Remember that upstream does not know a symbol outside the master"""
+        symbol = str(symbol).strip().upper()
+        if not symbol or symbol in self._names:
+            return
+        with self._unknown_lock:
+            self._unknown[symbol] = time.time() + UNKNOWN_SYMBOL_TTL
+            self._unknown.move_to_end(symbol)
+            while len(self._unknown) > MAX_UNKNOWN_SYMBOLS:
+                self._unknown.popitem(last=False)
+
+    def is_unknown(self, symbol: str) -> bool:
+        with self._unknown_lock:
+            expires = self._unknown.get(symbol)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self._unknown[symbol]
+                return False
+            return True
+
+    def find_in_text(self, text: str, max_words: int = 4) -> List[str]:
+        """
+        Tickers named outright in free text, longest mention first. Only exact
+        tickers, names and aliases count, so ordinary words never match by typo.
+        """
+        words = normalize_key(text).split()
+        found = []
+        i = 0
+        while i < len(words):
+            for n in range(min(max_words, len(words) - i), 0, -1):
+                tickers = self._exact.get(' '.join(words[i:i + n]))
+                if tickers:
+                    found.extend(t for t in sorted(tickers) if t not in found)
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+    def search(self, query: str, limit: int = MAX_SUGGESTIONS) -> List[Dict[str, Any]]:
+        """Autocomplete rows; falls back to typo matches when nothing starts with the query"""
+        tickers = self.complete(query, limit)
+        match = 'prefix'
+        if not tickers:
+            tickers = [ticker for _, ticker in self.fuzzy(query)][:limit]
+            match = 'fuzzy'
+        return [{'symbol': t, 'name': self._names[t], 'match': match} for t in tickers]
+
+    def suggestions(self, query: str, limit: int = 5) -> List[str]:
+        return [row['symbol'] for row in self.search(query, limit)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'symbols': len(self._names),
+            'keys': len(self._fuzzy_keys),
+            'exhaustive': self.exhaustive,
+            'unknown_cached': len(self._unknown),
+        }
+
+
+def load_symbol_master(path: str = None) -> Dict[str, Tuple[str, Tuple[str, ...]]]:
+    """
+    The built-in master, extended from a CSV when SYMBOL_MASTER_FILE is set.
+    Accepts NSE's EQUITY_L.csv ('SYMBOL', 'NAME OF COMPANY') or plain
+    'symbol,name' columns.
+    """
+    master = dict(SYMBOL_MASTER)
+    path = path or SYMBOL_MASTER_FILE
+    if not path:
+        return master
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                row = {str(k).strip().lower(): (v or '').strip() for k, v in row.items() if k}
+                ticker = row.get('symbol', '').upper()
+                name = row.get('name of company') or row.get('name') or ticker
+                if ticker and ticker not in master:
+                    master[ticker] = (name, ())
+    except (OSError, csv.Error) as e:
+        print(f"Could not load symbol master {path}: {e}")
+    return master
+
+
+# Global instance; the master is exhaustive only when a master file extended the built-in sample
+_master = load_symbol_master()
+symbol_index = SymbolIndex(_master, exhaustive=len(_master) > len(SYMBOL_MASTER))
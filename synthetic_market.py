@@ -0,0 +1,289 @@
+"""
+Vectorized synthetic market data for the educational simulator.
+
+Everything here is generated as whole NumPy arrays in a single pass, so
+long series (multi-year minute candles) cost milliseconds instead of one
+Python iteration per candle.
+"""
+
+import hashlib
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+def generate_ohlcv(num_candles: int, start_price: float, interval_seconds: int, interval_vol: float,
+                   end_time: float = None, start_time: float = None,
+                   trend: Union[float, np.ndarray] = 0.0, max_drop: float = None, floor: float = None,
+                   wick_model: str = 'body', intraday_vol: float = None,
+                   volume_range: Tuple[int, int] = (1000, 100000),
+                   seed: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Generate a random-walk OHLCV series as parallel NumPy arrays.
+
+    Args:
+        num_candles: Number of candles to generate
+        start_price: Open of the first candle
+        interval_seconds: Spacing between candles
+        interval_vol: Standard deviation of the per-candle return
+        end_time / start_time: Unix time of the last / first candle (end_time wins; defaults to now)
+        trend: Extra drift added to each return (scalar or per-candle array)
+        max_drop: Largest allowed fall per candle as a fraction of its open (e.g. 0.05)
+        floor: Minimum price for any close
+        wick_model: 'body' sizes wicks from the candle body and open price,
+                    'range' sizes them as a uniform fraction (up to intraday_vol) of the body
+        volume_range: Inclusive (low, high) range for uniformly drawn volumes
+        seed: Optional seed for reproducible series
+
+    Returns:
+        Dict with 'time' (int64 unix seconds) and 'open', 'high', 'low',
+        'close' (float64) and 'volume' (int64) arrays
+    """
+    rng = np.random.default_rng(seed)
+    n = int(num_candles)
+
+    # Timestamps
+    steps = np.arange(n, dtype=np.int64) * int(interval_seconds)
+    if end_time is not None or start_time is None:
+        end = int(time.time() if end_time is None else end_time)
+        times = end - steps[::-1]
+    else:
+        times = int(start_time) + steps
+
+    # Closes: compound the per-candle growth factors
+    returns = rng.normal(0.0, interval_vol, n) + trend
+    factors = 1.0 + returns
+    if max_drop is not None:
+        factors = np.maximum(factors, 1.0 - max_drop)
+    closes = start_price * np.cumprod(factors)
+    if floor is not None:
+        # A sequential walk would re-anchor after touching the floor; for the
+        # volatilities used here the floor is effectively never reached.
+        closes = np.maximum(closes, floor)
+
+    opens = np.empty(n)
+    if n:
+        opens[0] = start_price
+        opens[1:] = closes[:-1]
+
+    body_top = np.maximum(opens, closes)
+    body_bottom = np.minimum(opens, closes)
+
+    if wick_model == 'range':
+        wick_vol = interval_vol * 0.5 if intraday_vol is None else intraday_vol
+        highs = body_top * (1 + rng.uniform(0, wick_vol, n))
+        lows = body_bottom * (1 - rng.uniform(0, wick_vol, n))
+    else:
+        body = np.abs(closes - opens)
+        high_extra = rng.uniform(0, 0.01, n) * body + rng.uniform(0, 0.005, n) * opens
+        low_extra = rng.uniform(0, 0.01, n) * body + rng.uniform(0, 0.005, n) * opens
+        highs = body_top + high_extra
+        lows = np.maximum(body_bottom - low_extra, closes * 0.95)
+
+    volumes = rng.integers(volume_range[0], volume_range[1], n, endpoint=True)
+
+    return {
+        'time': times,
+        'open': opens,
+        'high': highs,
+        'low': lows,
+        'close': closes,
+        'volume': volumes,
+    }
+
+
+# Deterministic fallback prices
+#
+# A price is a pure function of (symbol, time bucket): every worker computes
+# the same value for the same instant without shared state, and nothing is
+# lost on restart. The path is a sum of smoothly interpolated, hash-seeded
+# noise layers at several time scales, so it moves like a bounded random walk.
+
+FALLBACK_PRICE_BUCKET = 300  # seconds a fallback price stays constant
+FALLBACK_PRICE_BAND = 0.2  # prices stay within ±20% of the base price
+
+# (layer period in seconds, relative weight)
+_NOISE_LAYERS = (
+    (300, 1.0),
+    (3600, 1.0),
+    (86400, 1.0),
+    (7 * 86400, 1.0),
+    (30 * 86400, 1.0),
+    (182 * 86400, 1.0),
+)
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: maps consecutive integers to well-mixed 64-bit values"""
+    with np.errstate(over='ignore'):
+        z = x + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _seed(*parts: object) -> np.uint64:
+    digest = hashlib.blake2b(':'.join(str(p) for p in parts).encode('utf-8'), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, 'little'))
+
+
+def seeded_uniform(seed: np.uint64, index) -> np.ndarray:
+    """Uniform (0, 1) values that depend only on seed and integer index"""
+    idx = np.asarray(index, dtype=np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        bits = _splitmix64(seed ^ (idx * _GOLDEN))
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) / float(1 << 53)
+
+
+def seeded_normal(seed: np.uint64, index) -> np.ndarray:
+    """Standard normal values that depend only on seed and integer index (Box-Muller)"""
+    idx = np.asarray(index, dtype=np.int64)
+    u1 = seeded_uniform(seed, idx * 2)
+    u2 = seeded_uniform(seed, idx * 2 + 1)
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def seeded_prices(symbol: str, base_price: float, volatility: float, timestamps) -> np.ndarray:
+    """
+    Deterministic fallback prices for a symbol at the given unix timestamps.
+
+    Each timestamp is snapped to its FALLBACK_PRICE_BUCKET, and the cost per
+    timestamp is constant (one lookup per noise layer), independent of how
+    far it is from any other evaluated instant.
+    """
+    t = np.asarray(timestamps, dtype=np.int64)
+    t = t - t % FALLBACK_PRICE_BUCKET
+    daily_vol = volatility / (252 ** 0.5)
+
+    log_move = np.zeros(t.shape)
+    for period, weight in _NOISE_LAYERS:
+        seed = _seed(symbol, period)
+        knot = t // period
+        frac = (t % period) / period
+        smooth = frac * frac * (3 - 2 * frac)
+        value = seeded_normal(seed, knot) * (1 - smooth) + seeded_normal(seed, knot + 1) * smooth
+        # Scale each layer like a random walk over its own horizon
+        log_move += weight * daily_vol * np.sqrt(period / 86400) * value
+
+    band = FALLBACK_PRICE_BAND
+    return base_price * (1 + band * np.tanh(log_move / band))
+
+
+def seeded_price(symbol: str, base_price: float, volatility: float, timestamp: float = None) -> float:
+    """Deterministic fallback price for a single instant (defaults to now)"""
+    timestamp = time.time() if timestamp is None else timestamp
+    return float(seeded_prices(symbol, base_price, volatility, [timestamp])[0])
+
+
+def seeded_volume(symbol: str, timestamp: float = None, low: int = 10000, high: int = 1000000) -> int:
+    """Deterministic volume for the time bucket containing timestamp"""
+    timestamp = time.time() if timestamp is None else timestamp
+    bucket = int(timestamp) // FALLBACK_PRICE_BUCKET
+    u = float(seeded_uniform(_seed(symbol, 'volume'), [bucket])[0])
+    return low + int(u * (high - low))
+
+
+# Correlated multi-asset simulation
+#
+# Returns follow a factor model: every symbol loads on a market factor and on
+# its sector factor, plus idiosyncratic noise. Small universes draw from the
+# full correlation matrix through its Cholesky factor; large ones draw the
+# factors directly, which is O(symbols x factors) per step and never builds
+# the symbols x symbols matrix.
+
+TRADING_SECONDS_PER_YEAR = 252 * 6.25 * 3600  # NSE session is 09:15-15:30
+CHOLESKY_MAX_SYMBOLS = 500
+
+# (market loading, sector loading) per kind of instrument
+FACTOR_LOADINGS = {
+    'index': (0.95, 0.0),
+    'sector_index': (0.85, 0.45),
+    'stock': (0.6, 0.5),
+}
+
+
+class CorrelatedMarketSimulator:
+    """
+    Steps a whole universe of synthetic symbols at once with correlated returns.
+
+    Args:
+        symbols: Symbol names
+        base_prices: Starting price per symbol
+        volatilities: Annualized volatility per symbol
+        sectors: Sector name per symbol (symbols sharing a sector co-move)
+        kinds: 'index', 'sector_index' or 'stock' per symbol (sets factor loadings)
+        interval_seconds: Simulated time per step
+        seed: Optional seed for reproducible runs
+    """
+
+    def __init__(self, symbols: List[str], base_prices, volatilities, sectors: List[str],
+                 kinds: List[str] = None, interval_seconds: int = 300, seed: Optional[int] = None):
+        self.symbols = list(symbols)
+        n = len(self.symbols)
+        self.prices = np.asarray(base_prices, dtype=np.float64).copy()
+        self.volatilities = np.asarray(volatilities, dtype=np.float64)
+        self.interval_seconds = interval_seconds
+        self.rng = np.random.default_rng(seed)
+        self.steps_taken = 0
+
+        kinds = kinds or ['stock'] * n
+        self.sector_names = sorted(set(sectors))
+        sector_index = {name: i for i, name in enumerate(self.sector_names)}
+
+        # Loadings matrix: column 0 is the market factor, then one column per sector
+        self.loadings = np.zeros((n, 1 + len(self.sector_names)))
+        for i, (sector, kind) in enumerate(zip(sectors, kinds)):
+            market, sector_loading = FACTOR_LOADINGS.get(kind, FACTOR_LOADINGS['stock'])
+            self.loadings[i, 0] = market
+            self.loadings[i, 1 + sector_index[sector]] = sector_loading
+        self.idiosyncratic = np.sqrt(np.clip(1.0 - (self.loadings ** 2).sum(axis=1), 0.0, None))
+
+        self._cholesky = None
+        self.method = 'factor'
+        if n <= CHOLESKY_MAX_SYMBOLS:
+            self._cholesky = np.linalg.cholesky(self.correlation())
+            self.method = 'cholesky'
+
+    def correlation(self) -> np.ndarray:
+        """Return the implied symbols x symbols correlation matrix"""
+        corr = self.loadings @ self.loadings.T
+        corr[np.diag_indices_from(corr)] += self.idiosyncratic ** 2
+        return corr
+
+    def _correlated_normals(self, n_steps: int) -> np.ndarray:
+        n = len(self.symbols)
+        if self._cholesky is not None:
+            return self.rng.standard_normal((n_steps, n)) @ self._cholesky.T
+        factors = self.rng.standard_normal((n_steps, self.loadings.shape[1]))
+        noise = self.rng.standard_normal((n_steps, n))
+        return factors @ self.loadings.T + noise * self.idiosyncratic
+
+    def step(self, n_steps: int = 1) -> np.ndarray:
+        """
+        Advance every symbol by n_steps intervals.
+        Returns the price path as an (n_steps, n_symbols) array.
+        """
+        step_vol = self.volatilities * np.sqrt(self.interval_seconds / TRADING_SECONDS_PER_YEAR)
+        log_returns = self._correlated_normals(n_steps) * step_vol - 0.5 * step_vol ** 2
+        path = self.prices * np.exp(np.cumsum(log_returns, axis=0))
+        self.prices = path[-1].copy()
+        self.steps_taken += n_steps
+        return path
+
+    def quotes(self) -> Dict[str, float]:
+        return dict(zip(self.symbols, np.round(self.prices, 2).tolist()))
+
+    @classmethod
+    def synthetic_universe(cls, n_symbols: int, n_sectors: int = 12, interval_seconds: int = 300,
+                           seed: Optional[int] = None) -> 'CorrelatedMarketSimulator':
+        """Build a large random universe for load-testing the simulator"""
+        rng = np.random.default_rng(seed)
+        symbols = [f"SYN{i:05d}" for i in range(n_symbols)]
+        base_prices = np.round(np.exp(rng.normal(np.log(800), 1.0, n_symbols)), 2)
+        volatilities = rng.uniform(0.15, 0.45, n_symbols)
+        sectors = [f"sector_{i}" for i in rng.integers(0, n_sectors, n_symbols)]
+        return cls(symbols, base_prices, volatilities, sectors,
+                   interval_seconds=interval_seconds, seed=seed)
@@ -0,0 +1,74 @@
+"""
+Shared fixtures. Every store the app writes to is pointed at a temporary
+directory before the app is imported, and upstream market API calls are
+replaced by a stub, so the suite runs offline.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_DIR = tempfile.mkdtemp(prefix='finbuddy-tests-')
+
+os.environ.setdefault('GROQ_API_KEY', 'test')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(STATE_DIR, 'app.db')}"
+os.environ['CONVERSATION_DB'] = os.path.join(STATE_DIR, 'conversations.db')
+os.environ['REPLAY_DB'] = os.path.join(STATE_DIR, 'replay.db')
+os.environ['MOVERS_DIR'] = os.path.join(STATE_DIR, 'movers')
+os.environ['CANDLE_STORE_DIR'] = os.path.join(STATE_DIR, 'candles')
+os.environ['INTENT_LOG_FILE'] = os.path.join(STATE_DIR, 'decisions.jsonl')
+os.environ['MARKET_BACKGROUND_REFRESH'] = '0'
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def flask_app():
+    from app import app, db
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+
+class FakeMarketAPI:
+    """Stands in for the Indian Stock API: /stock knows the names in prices, anything else is not found"""
+
+    def __init__(self):
+        self.prices = {}
+        self.calls = []
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        endpoint = '/' + url.rsplit('/', 1)[-1]
+        self.calls.append((endpoint, dict(params or {})))
+        name = (params or {}).get('name')
+        if endpoint == '/stock' and name in self.prices:
+            return FakeResponse({'current_price': self.prices[name], 'change_percent': 0.5})
+        return FakeResponse({'error': 'Stock not found'})
+
+    def stock_calls(self, name):
+        return sum(1 for endpoint, params in self.calls if endpoint == '/stock' and params.get('name') == name)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    from upstream import http_client
+    api = FakeMarketAPI()
+    monkeypatch.setattr(http_client, 'get', api.get)
+    return api
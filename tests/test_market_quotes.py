@@ -0,0 +1,17 @@
+from market_data_fallback import market_data_generator
+
+
+def test_quote_route_makes_symbol_hot(client, upstream):
+    upstream.prices['TESTHOT'] = 512.5
+
+    response = client.get('/api/market/quote?stock_name=TESTHOT')
+    assert response.status_code == 200
+    assert 'TESTHOT' in market_data_generator.refresher.hot_symbols()
+
+
+def test_background_quotes_do_not_make_symbol_hot(upstream):
+    from market_data_fallback import get_background_quotes
+    upstream.prices['TESTCOLD'] = 75.0
+
+    get_background_quotes(['TESTCOLD'])
+    assert 'TESTCOLD' not in market_data_generator.refresher.hot_symbols()
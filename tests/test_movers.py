@@ -0,0 +1,28 @@
+from movers import MoversService
+
+
+def quote(change, source='api'):
+    return {'price': 100.0, 'change_percent': change, 'source': source}
+
+
+def make_service(tmp_path):
+    return MoversService(lambda symbols: {}, ['RELIANCE', 'TCS'], root=str(tmp_path))
+
+
+def test_fallback_quotes_and_unlisted_symbols_are_not_ranked(tmp_path):
+    movers = make_service(tmp_path)
+    movers.on_quote('RELIANCE', quote(1.5))
+    movers.on_quote('TCS', quote(-0.8))
+    movers.on_quote('TCS', quote(19.0, source='educational_fallback'))
+    movers.on_quote('JUNKTICKER', quote(18.0))
+
+    top = movers.top(5)
+    assert [m['symbol'] for m in top['gainers']] == ['RELIANCE']
+    assert [m['symbol'] for m in top['losers']] == ['TCS']
+    assert top['universe'] == 2
+    assert top['priced'] == 2
+
+
+def test_cold_service_answers_without_waiting(tmp_path):
+    top = make_service(tmp_path).top(5)
+    assert top['gainers'] == [] and top['priced'] == 0
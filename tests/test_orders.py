@@ -0,0 +1,23 @@
+def test_market_order_returns_fill(client, upstream):
+    upstream.prices['TESTFILL'] = 4011.62
+
+    response = client.post('/api/orders', json={
+        'symbol': 'TESTFILL', 'side': 'buy', 'quantity': 2, 'order_type': 'market'})
+    assert response.status_code == 200
+    order = response.get_json()['order']
+    assert order['status'] == 'filled'
+    assert order['fill_price'] == 4011.62
+    assert order['filled_at'] is not None
+
+    fills = client.get('/api/orders/fills').get_json()['fills']
+    assert [f['fill_price'] for f in fills if f['order_id'] == order['order_id']] == [4011.62]
+
+
+def test_crossing_limit_order_returns_fill(client, upstream):
+    upstream.prices['TESTLIMIT'] = 250.0
+
+    order = client.post('/api/orders', json={
+        'symbol': 'TESTLIMIT', 'side': 'buy', 'quantity': 1, 'order_type': 'limit',
+        'limit_price': 260}).get_json()['order']
+    assert order['status'] == 'filled'
+    assert order['fill_price'] == 250.0
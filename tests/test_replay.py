@@ -0,0 +1,34 @@
+SCENARIO = {'symbol': 'TCS', 'period': '3m', 'speed': 2}
+
+
+def test_same_scenario_shares_one_session(flask_app, upstream):
+    owner, viewer = flask_app.test_client(), flask_app.test_client()
+
+    opened = owner.post('/api/replay', json=SCENARIO).get_json()
+    assert opened['can_control'] is True
+
+    joined = viewer.post('/api/replay', json=SCENARIO).get_json()
+    assert joined['session_id'] == opened['session_id']
+    assert joined['can_control'] is False
+
+    control = f"/api/replay/{opened['session_id']}/control"
+    assert viewer.post(control, json={'action': 'pause'}).status_code == 403
+    assert owner.post(control, json={'action': 'pause'}).get_json()['paused'] is True
+    assert viewer.get(f"/api/replay/{opened['session_id']}").get_json()['paused'] is True
+
+
+def test_session_can_be_joined_by_id(flask_app, upstream):
+    owner, viewer = flask_app.test_client(), flask_app.test_client()
+    opened = owner.post('/api/replay', json=dict(SCENARIO, speed=4)).get_json()
+
+    watched = viewer.get(f"/api/replay/{opened['session_id']}").get_json()
+    assert watched['can_control'] is False
+    assert opened['watch_url'].endswith(f"replay={opened['session_id']}")
+
+
+def test_different_scenario_gets_its_own_session(flask_app, upstream):
+    first, second = flask_app.test_client(), flask_app.test_client()
+    a = first.post('/api/replay', json=dict(SCENARIO, speed=8)).get_json()
+    b = second.post('/api/replay', json=dict(SCENARIO, speed=16)).get_json()
+    assert a['session_id'] != b['session_id']
+    assert b['can_control'] is True
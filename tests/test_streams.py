@@ -0,0 +1,27 @@
+import app as app_module
+from app import StreamBudget
+
+
+def test_market_streams_do_not_spend_the_chat_budget(flask_app, client, upstream, monkeypatch):
+    monkeypatch.setattr(app_module, 'market_streams', StreamBudget(1))
+    monkeypatch.setattr(app_module, 'chat_streams', StreamBudget(1))
+
+    first = client.get('/api/market/stream?symbols=TCS', buffered=False)
+    assert first.status_code == 200
+    second = client.get('/api/market/stream?symbols=INFY', buffered=False)
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == '10'
+
+    with flask_app.test_request_context():
+        chat = app_module.chat_streams.response(iter(['{}\n']), mimetype='application/x-ndjson')
+        assert chat.status_code == 200
+        chat.close()
+
+    first.close()
+    assert app_module.market_streams.stats()['open'] == 0
+    assert client.get('/api/market/stream?symbols=INFY', buffered=False).status_code == 200
+
+
+def test_budgets_follow_thread_count():
+    assert app_module.MARKET_STREAMS_PER_WORKER == app_module.GUNICORN_THREADS // 2
+    assert app_module.CHAT_STREAMS_PER_WORKER == app_module.GUNICORN_THREADS // 4
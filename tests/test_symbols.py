@@ -0,0 +1,33 @@
+from symbols import SYMBOL_MASTER, SymbolIndex, symbol_index
+
+
+def test_exhaustive_master_rejects_unknown_input():
+    index = SymbolIndex(SYMBOL_MASTER, exhaustive=True)
+    assert index.canonical('Reliance Industries') == 'RELIANCE'
+    assert index.canonical('NOTALISTEDCO') is None
+
+
+def test_partial_master_passes_unknown_tickers_through():
+    index = SymbolIndex(SYMBOL_MASTER)
+    assert index.canonical('irctc.ns') == 'IRCTC'
+    assert index.canonical('HPCL') == 'HPCL'
+
+
+def test_upstream_miss_is_remembered(client, upstream):
+    first = client.get('/api/market/quote?stock_name=TESTJUNK')
+    assert first.status_code == 200
+    assert upstream.stock_calls('TESTJUNK') == 1
+    assert symbol_index.canonical('TESTJUNK') is None
+
+    second = client.get('/api/market/quote?stock_name=TESTJUNK')
+    assert second.status_code == 404
+    assert client.get('/api/market/stream?symbols=TESTJUNK').status_code == 404
+    assert upstream.stock_calls('TESTJUNK') == 1
+
+
+def test_listed_symbol_outside_master_is_served(client, upstream):
+    upstream.prices['TESTLISTED'] = 310.0
+    response = client.get('/api/market/quote?stock_name=testlisted')
+    assert response.status_code == 200
+    assert response.get_json()['current_price'] == 310.0
+    assert symbol_index.canonical('TESTLISTED') == 'TESTLISTED'
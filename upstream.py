@@ -0,0 +1,326 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Pooled HTTP client configuration (overridable through the environment)
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))  # distinct hosts kept pooled
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))  # keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+
+# Per-host connection caps, keyed by URL prefix. Hosts not listed use HTTP_POOL_MAXSIZE.
+HTTP_PER_HOST_LIMITS = {
+    'https://stock.indianapi.in': int(os.environ.get('HTTP_MARKET_API_MAXSIZE', 16)),
+    'https://eutils.ncbi.nlm.nih.gov': 4,
+    'http://export.arxiv.org': 4,
+}
+
+# Circuit breaker configuration
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))  # consecutive failures before opening
+CIRCUIT_COOLDOWN_SECONDS = float(os.environ.get('CIRCUIT_COOLDOWN_SECONDS', 30))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get('CIRCUIT_HALF_OPEN_PROBES', 1))
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream API answers with a non-success status code"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while a circuit breaker is open"""
+
+
+class _Call:
+    """An in-flight upstream call that followers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running block until it finishes and receive the same result
+    (or the same exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+            }
+
+
+# Shared by every caller of the Indian Stock API in this process
+upstream_flight = SingleFlight()
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail immediately with CircuitOpenError for cooldown seconds. After the
+    cool-down a limited number of half-open probes are let through; a
+    successful probe closes the circuit, a failed one reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown: float = CIRCUIT_COOLDOWN_SECONDS, half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.short_circuited = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.cooldown:
+                    self.short_circuited += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+
+            if self.state == self.HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    self.short_circuited += 1
+                    return False
+                self.probes_in_flight += 1
+
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probes_in_flight = 0
+
+    def record_failure(self, error: Exception = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error else None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.probes_in_flight = 0
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit open for {self.name}")
+        try:
+            result = fn()
+        except Exception as e:
+            if _counts_as_failure(e):
+                self.record_failure(e)
+            else:
+                # The upstream answered; a bad request is not an outage
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.cooldown - (time.time() - self.opened_at))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'short_circuited': self.short_circuited,
+                'retry_in_seconds': round(retry_in, 1),
+                'last_error': self.last_error,
+            }
+
+
+def _counts_as_failure(error: Exception) -> bool:
+    """Timeouts, connection errors, 5xx and 429 trip the breaker; other 4xx do not"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        return True
+    return status_code >= 500 or status_code == 429
+
+
+class CircuitBreakerRegistry:
+    """Lazily creates one CircuitBreaker per upstream endpoint"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name)
+                self._breakers[name] = breaker
+            return breaker
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+    def any_open(self) -> bool:
+        return any(state['state'] != CircuitBreaker.CLOSED for state in self.states().values())
+
+
+upstream_breakers = CircuitBreakerRegistry()
+
+
+class _ConnectionStats:
+    """Counts new connections (TCP/TLS handshakes) against requests served"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def add(self, connections: int = 0, requests: int = 0) -> None:
+        with self._lock:
+            self.connections += connections
+            self.requests += requests
+
+
+def _counting_pool(base, stats: _ConnectionStats):
+    """Build a connection pool class that reports into stats"""
+
+    class CountingPool(base):
+        def _new_conn(self):
+            stats.add(connections=1)
+            return super()._new_conn()
+
+        def urlopen(self, *args, **kwargs):
+            stats.add(requests=1)
+            return super().urlopen(*args, **kwargs)
+
+    return CountingPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools record handshake and reuse counts"""
+
+    def __init__(self, stats: _ConnectionStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self.stats),
+            'https': _counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+
+class PooledHTTPClient:
+    """
+    Shared keep-alive HTTP client for all outbound market and research calls.
+
+    Connections are pooled per host and reused across requests and threads,
+    so repeated calls to the same API skip the TCP/TLS handshake. When a
+    host's pool is exhausted, callers wait for a free connection rather than
+    opening extra ones.
+    """
+
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 per_host_limits: Dict[str, int] = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.per_host_limits = dict(HTTP_PER_HOST_LIMITS if per_host_limits is None else per_host_limits)
+        self._stats = _ConnectionStats()
+
+        self.session = requests.Session()
+        default_adapter = _CountingAdapter(self._stats, pool_connections=pool_connections,
+                                           pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('https://', default_adapter)
+        self.session.mount('http://', default_adapter)
+        for prefix, limit in self.per_host_limits.items():
+            self.session.mount(prefix, _CountingAdapter(self._stats, pool_connections=1,
+                                                        pool_maxsize=limit, pool_block=True))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats._lock:
+            connections = self._stats.connections
+            requests_sent = self._stats.requests
+        return {
+            'requests': requests_sent,
+            'handshakes': connections,
+            'reused': max(0, requests_sent - connections),
+            'pool_maxsize': self.pool_maxsize,
+            'per_host_limits': self.per_host_limits,
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+        }
+
+
+# Shared pooled client used for every outbound HTTP call
+http_client = PooledHTTPClient()